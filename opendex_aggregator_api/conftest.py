@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+# modules read the Redis host at import, tests do not connect to it
+os.environ.setdefault('REDIS_HOST', 'localhost')
+
+
+@pytest.fixture
+def redis_store(monkeypatch) -> dict:
+    """
+    In-memory keys of the datastore (raw key -> JSON value), instead of Redis.
+    """
+    from opendex_aggregator_api.data import datastore
+
+    store = {}
+
+    def _get(raw_key, parse, default=None):
+        return parse(store[raw_key]) if raw_key in store else default
+
+    def _mget(raw_keys, parse, default=None):
+        return [_get(k, parse, default) for k in raw_keys]
+
+    def _set(raw_key, obj, cache_ttl):
+        store[raw_key] = obj.decode() if isinstance(obj, bytes) else obj
+
+    def _delete(raw_key):
+        store.pop(raw_key, None)
+
+    monkeypatch.setattr(datastore, 'redis_get', _get)
+    monkeypatch.setattr(datastore, 'redis_mget', _mget)
+    monkeypatch.setattr(datastore, 'redis_set', _set)
+    monkeypatch.setattr(datastore, 'redis_delete', _delete)
+
+    return store
@@ -1,15 +1,34 @@
 
 import base64
+import hashlib
+import heapq
+import json
 import pickle
 from datetime import timedelta
-from typing import List, Optional
+from time import time
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
 
 from cachetools import TTLCache, cached
 
-from opendex_aggregator_api.data.model import Esdt, ExchangeRate
+from opendex_aggregator_api.data.model import (Esdt, ExchangeRate,
+                                               TokensReachability)
 from opendex_aggregator_api.pools.model import SwapPool
-from opendex_aggregator_api.pools.pools import AbstractPool
-from opendex_aggregator_api.utils.redis_utils import redis_get, redis_set
+from opendex_aggregator_api.pools.pools import AbstractPool, PriceImpactCurve
+from opendex_aggregator_api.utils.redis_utils import (redis_delete, redis_get,
+                                                      redis_hget, redis_hkeys,
+                                                      redis_hmget,
+                                                      redis_hset_many,
+                                                      redis_mget, redis_set,
+                                                      redis_zincrby_many,
+                                                      redis_zscores_many)
+
+# pools, their price impact curves and their snapshot version expire together
+# if the sync stalls
+POOLS_TTL = timedelta(seconds=60)
+
+# route requests are counted per hour, over the last day
+ROUTE_REQUESTS_BUCKET_DURATION = 3600  # seconds
+ROUTE_REQUESTS_NB_BUCKETS = 24
 
 
 @cached(cache=TTLCache(maxsize=1, ttl=10))
@@ -31,12 +50,62 @@ def get_dex_aggregator_pool(sc_address: str, token_in: str, token_out: str) -> A
                      lambda serialized: pickle.loads(base64.b64decode(serialized)))
 
 
+def get_dex_aggregator_pools(keys: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], Optional[Tuple[AbstractPool, str]]]:
+    """
+    :return: pools with a digest of their serialized state
+    """
+    keys = list(keys)
+
+    pools = redis_mget([f'pool_{sc_address}_{token_in}_{token_out}'
+                        for sc_address, token_in, token_out in keys],
+                       lambda serialized: (pickle.loads(base64.b64decode(serialized)),
+                                           hashlib.blake2b(serialized.encode(),
+                                                           digest_size=8).hexdigest()))
+
+    return dict(zip(keys, pools))
+
+
 def set_dex_aggregator_pool(sc_address: str, token_in: str, token_out: str, pool: AbstractPool):
     key = f'pool_{sc_address}_{token_in}_{token_out}'
 
     redis_set(key,
               base64.b64encode(pickle.dumps(pool)),
-              timedelta(seconds=60))
+              POOLS_TTL)
+
+
+def delete_dex_aggregator_pool(sc_address: str, token_in: str, token_out: str):
+    redis_delete(f'pool_{sc_address}_{token_in}_{token_out}')
+
+
+def get_price_impact_curves(version: str,
+                            keys: Iterable[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], Optional[PriceImpactCurve]]:
+    keys = list(keys)
+
+    curves = redis_hmget(f'price_impact_curves_{version}',
+                         [f'{sc_address}_{token_in}_{token_out}'
+                          for sc_address, token_in, token_out in keys],
+                         lambda json_: PriceImpactCurve(*json_))
+
+    return dict(zip(keys, curves))
+
+
+def set_price_impact_curves(version: str,
+                            curves: Mapping[Tuple[str, str, str], PriceImpactCurve]):
+    redis_hset_many(f'price_impact_curves_{version}',
+                    {f'{sc_address}_{token_in}_{token_out}': curve
+                     for (sc_address, token_in, token_out), curve in curves.items()},
+                    POOLS_TTL)
+
+
+def get_pools_snapshot_version() -> Optional[str]:
+    return redis_get('pools_version',
+                     lambda json_: json_)
+
+
+def set_pools_snapshot_version(version: str):
+    redis_set('pools_version',
+              version,
+              POOLS_TTL)
 
 
 @cached(cache=TTLCache(maxsize=1, ttl=10))
@@ -51,6 +120,7 @@ def set_tokens(tokens: List[Esdt]):
               timedelta(hours=6))
 
 
+@cached(cache=TTLCache(maxsize=1, ttl=10))
 def get_exchange_rates() -> Optional[List[ExchangeRate]]:
     return redis_get('rates',
                      lambda json_: [ExchangeRate.model_validate(x) for x in json_])
@@ -60,3 +130,90 @@ def set_exchange_rates(rates: List[ExchangeRate]):
     redis_set('rates',
               rates,
               timedelta(hours=6))
+
+
+def get_route_table_routes(version: str,
+                           token_in: str,
+                           token_out: str) -> Optional[List[Tuple[int, ...]]]:
+    return redis_hget(f'route_table_{version}',
+                      _route_pair_member(token_in, token_out),
+                      lambda json_: [tuple(x) for x in json_])
+
+
+def get_route_table_pairs(version: str) -> List[Tuple[str, str]]:
+    pairs = (_parse_route_pair_member(x)
+             for x in redis_hkeys(f'route_table_{version}'))
+
+    return [p for p in pairs if p is not None]
+
+
+def set_route_table_routes(version: str,
+                           routes_by_pair: Mapping[Tuple[str, str], List[Tuple[int, ...]]]):
+    redis_hset_many(f'route_table_{version}',
+                    {_route_pair_member(token_in, token_out): routes
+                     for (token_in, token_out), routes in routes_by_pair.items()},
+                    timedelta(hours=1))
+
+
+def get_tokens_reachability(version: str) -> Optional[TokensReachability]:
+    return redis_get(f'reachability_{version}',
+                     lambda json_: TokensReachability.model_validate(json_))
+
+
+def set_tokens_reachability(version: str, reachability: TokensReachability):
+    redis_set(f'reachability_{version}',
+              reachability,
+              timedelta(hours=1))
+
+
+def increment_route_requests(counts: Mapping[Tuple[str, str], int]):
+    """
+    Add +counts+ of route requests per pair to the bucket of the current hour.
+    """
+    bucket = int(time()) // ROUTE_REQUESTS_BUCKET_DURATION
+    ttl = ROUTE_REQUESTS_BUCKET_DURATION * (ROUTE_REQUESTS_NB_BUCKETS + 1)
+
+    redis_zincrby_many(f'route_requests_{bucket}',
+                       {_route_pair_member(token_in, token_out): count
+                        for (token_in, token_out), count in counts.items()},
+                       timedelta(seconds=ttl))
+
+
+def get_most_requested_route_pairs(count: int) -> List[Tuple[str, str]]:
+    """
+    Most requested pairs over the last ROUTE_REQUESTS_NB_BUCKETS buckets
+    (older requests are forgotten, malformed members are ignored).
+    """
+    bucket = int(time()) // ROUTE_REQUESTS_BUCKET_DURATION
+
+    counts: Dict[Tuple[str, str], float] = {}
+
+    for scores in redis_zscores_many([f'route_requests_{bucket - i}'
+                                      for i in range(ROUTE_REQUESTS_NB_BUCKETS)]):
+        for member, score in scores.items():
+            pair = _parse_route_pair_member(member)
+
+            if pair is not None:
+                counts[pair] = counts.get(pair, 0) + score
+
+    return heapq.nlargest(count, counts, key=counts.get)
+
+
+def _route_pair_member(token_in: str, token_out: str) -> str:
+    return json.dumps([token_in, token_out])
+
+
+def _parse_route_pair_member(member: str) -> Optional[Tuple[str, str]]:
+    """
+    Token pair of a JSON member (None if malformed).
+    """
+    try:
+        pair = json.loads(member)
+    except ValueError:
+        return None
+
+    if not isinstance(pair, list) or len(pair) != 2 \
+            or not all((isinstance(t, str) for t in pair)):
+        return None
+
+    return tuple(pair)
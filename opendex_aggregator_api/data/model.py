@@ -1,5 +1,5 @@
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -159,6 +159,48 @@ class ExchangeRate(BaseModel):
         return hash(f'{self.base_token_id}::{self.quote_token_id}::{self.sc_address}')
 
 
+class TokensReachability(BaseModel):
+    """
+    Connected components and hop distances from/to hub tokens of a pool graph.
+    """
+
+    components: Dict[str, int]
+    distances_from_hubs: List[Dict[str, int]]
+    distances_to_hubs: List[Dict[str, int]]
+
+    def min_hops(self, token_in: str, token_out: str) -> Optional[int]:
+        """
+        Lower bound of the number of hops between two tokens.
+
+        :return: None if +token_out+ can not be reached from +token_in+
+        """
+        component = self.components.get(token_in)
+
+        if component is None or component != self.components.get(token_out):
+            return None
+
+        if token_in == token_out:
+            return 0
+
+        min_hops = 1
+
+        for distances in self.distances_from_hubs:
+            if token_in in distances:
+                if token_out not in distances:
+                    return None
+                min_hops = max(min_hops,
+                               distances[token_out] - distances[token_in])
+
+        for distances in self.distances_to_hubs:
+            if token_out in distances:
+                if token_in not in distances:
+                    return None
+                min_hops = max(min_hops,
+                               distances[token_in] - distances[token_out])
+
+        return min_hops
+
+
 class LpTokenComposition(BaseModel):
     lp_token_id: str
     lp_token_supply: int
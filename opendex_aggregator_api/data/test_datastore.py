@@ -0,0 +1,33 @@
+import json
+
+from opendex_aggregator_api.data import datastore
+
+
+def test_get_most_requested_route_pairs(monkeypatch):
+    increments = {}
+
+    def _zincrby_many(raw_key, members, cache_ttl):
+        increments.update(members)
+
+    monkeypatch.setattr(datastore, 'redis_zincrby_many', _zincrby_many)
+
+    datastore.increment_route_requests({('A-000000', 'B-000000'): 3,
+                                        ('FOO_BAR', 'B-000000'): 1,
+                                        ('C-000000', 'A-000000'): 2})
+
+    # token ids are stored as is, malformed members are ignored
+    scores = [increments,
+              {'FOO_BAR_B-000000': 10.0,
+               json.dumps(['FOO', 'BAR', 'B-000000']): 10.0,
+               json.dumps({'A-000000': 'B-000000'}): 10.0,
+               json.dumps(['A-000000', 1]): 10.0,
+               json.dumps(['C-000000', 'A-000000']): 2.0}]
+
+    monkeypatch.setattr(datastore, 'redis_zscores_many',
+                        lambda raw_keys: scores + [{}] * (len(raw_keys) - len(scores)))
+
+    assert datastore.get_most_requested_route_pairs(2) == [('C-000000', 'A-000000'),
+                                                           ('A-000000', 'B-000000')]
+    assert datastore.get_most_requested_route_pairs(5) == [('C-000000', 'A-000000'),
+                                                           ('A-000000', 'B-000000'),
+                                                           ('FOO_BAR', 'B-000000')]
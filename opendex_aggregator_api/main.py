@@ -7,6 +7,9 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from opendex_aggregator_api.routers import (evaluations, multi_eval, routes,
                                             tokens)
+from opendex_aggregator_api.services import evaluation_processes
+from opendex_aggregator_api.services.externals import (close_gateway_client,
+                                                       gateway_client)
 from opendex_aggregator_api.tasks import sync_ignored_tokens, sync_pools
 
 logging.basicConfig(level=logging.INFO,
@@ -22,11 +25,17 @@ async def lifespan(app: FastAPI):
 
         THREAD_SYNC_DEX_AGGREGATOR.start()
         THREAD_SYNC_IGNORED_TOKENS.start()
+
+    gateway_client()
+
     try:
         yield
     except:
         pass
 
+    await close_gateway_client()
+    evaluation_processes.shutdown()
+
     if not no_task:
         sync_pools.stop()
         sync_ignored_tokens.stop()
@@ -5,7 +5,7 @@ from typing import List, Tuple
 from typing_extensions import override
 
 from opendex_aggregator_api.data.model import Esdt
-from opendex_aggregator_api.pools.pools import ConstantProductPool, StableSwapPool, find
+from opendex_aggregator_api.pools.pools import ConstantProductPool, StableSwapPool
 
 A_MULTIPLIER = 10_000
 MIN_GAMMA = 10**10
@@ -18,6 +18,10 @@ MAX_ITERATIONS = 255
 @dataclass
 class AshSwapPoolV2(ConstantProductPool):
 
+    __slots__ = ('amp', 'd', 'fee_gamma', 'future_a_gamma_time', 'gamma',
+                 'mid_fee', 'out_fee', 'price_scale', 'reserves', 'tokens', 'xp',
+                 '_d', '_token_indexes')
+
     PRECISION = 10**18
 
     amp: int
@@ -73,6 +77,7 @@ class AshSwapPoolV2(ConstantProductPool):
         self.first_token_reserves = reserves[0]
         self.second_token = tokens[1]
         self.second_token_reserves = reserves[1]
+        self._reset_caches()
 
     @override
     def deep_copy(self):
@@ -103,20 +108,10 @@ class AshSwapPoolV2(ConstantProductPool):
 
         xp = self.reserves.copy()
 
-        d = self.d
-
-        if self.future_a_gamma_time > 0:
-            d = newton_d(
-                self.amp,
-                self.gamma,
-                self.xp.copy(),
-                self.reserves
-            )
+        d = self._invariant()
 
-        i_token_in, _ = find(lambda x: x.identifier ==
-                             token_in.identifier, self.tokens)
-        i_token_out, _ = find(lambda x: x.identifier ==
-                              token_out.identifier, self.tokens)
+        i_token_in = self._token_indexes.get(token_in.identifier, -1)
+        i_token_out = self._token_indexes.get(token_out.identifier, -1)
 
         xp[i_token_in] = xp[i_token_in] + amount_in
         xp = [
@@ -160,10 +155,8 @@ class AshSwapPoolV2(ConstantProductPool):
 
     @override
     def estimate_theorical_amount_out(self, token_in: Esdt, amount_in: int, token_out: Esdt) -> int:
-        i_token_in, _ = find(lambda x: x.identifier ==
-                             token_in.identifier, self.tokens)
-        i_token_out, _ = find(lambda x: x.identifier ==
-                              token_out.identifier, self.tokens)
+        i_token_in = self._token_indexes.get(token_in.identifier, -1)
+        i_token_out = self._token_indexes.get(token_out.identifier, -1)
 
         in_reserve = self.reserves[i_token_in]
         out_reserve = self.reserves[i_token_out]
@@ -183,13 +176,35 @@ class AshSwapPoolV2(ConstantProductPool):
                         token_out: Esdt,
                         amount_out: int):
 
-        i_token_in, _ = find(lambda x: x.identifier ==
-                             token_in.identifier, self.tokens)
-        i_token_out, _ = find(lambda x: x.identifier ==
-                              token_out.identifier, self.tokens)
+        i_token_in = self._token_indexes.get(token_in.identifier, -1)
+        i_token_out = self._token_indexes.get(token_out.identifier, -1)
 
         self.reserves[i_token_in] += amount_in
         self.reserves[i_token_out] -= amount_out
+        self._d = None
+
+    @override
+    def _reset_caches(self):
+        self._d = None
+        self._token_indexes = {t.identifier: i
+                               for i, t in enumerate(self.tokens)}
+
+    def _invariant(self) -> int:
+        """
+        Invariant (D) to use for swaps: the synced one, or the one computed
+        with the current A and gamma while they are ramping (computed once
+        per reserves state, reset by +update_reserves+).
+        """
+        if self.future_a_gamma_time <= 0:
+            return self.d
+
+        if self._d is None:
+            self._d = newton_d(self.amp,
+                               self.gamma,
+                               self.xp.copy(),
+                               self.reserves)
+
+        return self._d
 
     def _fee(self, xp: List[int]) -> int:
         n_coins = len(self.tokens)
@@ -222,6 +237,9 @@ class AshSwapPoolV2(ConstantProductPool):
 
 @dataclass
 class AshSwapStableSwapPool(StableSwapPool):
+
+    __slots__ = ()
+
     def __init__(self,
                  amp_factor: int,
                  swap_fee: int,
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 
 MAX_ITERS = 128
@@ -44,10 +44,22 @@ def D(amp: int, amounts: List[int]) -> int:
     raise DidNotConvergeException("D didn't converge")
 
 
-def y(amp: int, amounts: List[int], i_token_in: int, i_token_out: int, token_in_balance: int):
+def y(amp: int,
+      amounts: List[int],
+      i_token_in: int,
+      i_token_out: int,
+      token_in_balance: int,
+      d: Optional[int] = None,
+      y_start: Optional[int] = None):
     """
     Calculate x[j] if one makes x[i] = x
 
+    +d+ is the invariant of +amounts+ if already known (computed otherwise)
+
+    +y_start+ is the starting point of the iterations (d otherwise). It must not
+    be below the solution, e.g. the solution for a lower +token_in_balance+:
+    iterations then converge to the same value, in fewer steps.
+
     Done by solving quadratic equation iteratively.
     x_1**2 + x1 * (sum' - (A*n**n - 1) * D / (A * n**n)) = D ** (n + 1) / (n ** (2 * n) * prod' * A)
     x_1**2 + b*x_1 = c
@@ -57,7 +69,8 @@ def y(amp: int, amounts: List[int], i_token_in: int, i_token_out: int, token_in_
     Reference: https://github.com/curvefi/curve-contract/blob/7116b4a261580813ef057887c5009e22473ddb7d/tests/simulation.py#L55
     """
     n_coins = len(amounts)
-    d = D(amp, amounts)
+    if d is None:
+        d = D(amp, amounts)
     ann = amp * n_coins
 
     amounts[i_token_in] = token_in_balance
@@ -71,7 +84,8 @@ def y(amp: int, amounts: List[int], i_token_in: int, i_token_out: int, token_in_
     b = sum(amounts) + d // ann - d
 
     y_prev = 0
-    y = d
+    # iterations need a start above 1 (drained reserve otherwise)
+    y = d if y_start is None or y_start <= 1 else y_start
     i = 0
     while i < MAX_ITERS and abs(y - y_prev) > 1:
         i += 1
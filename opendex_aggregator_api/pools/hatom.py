@@ -12,6 +12,8 @@ from .pools import ConstantPricePool
 @dataclass
 class HatomConstantPricePool(ConstantPricePool):
 
+    __slots__ = ()
+
     @override
     def deep_copy(self):
         return HatomConstantPricePool(price=self.price,
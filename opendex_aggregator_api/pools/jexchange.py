@@ -1,14 +1,17 @@
 
+import bisect
 from dataclasses import dataclass
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 
 from typing_extensions import override
 
-from opendex_aggregator_api.data.model import Esdt
+from opendex_aggregator_api.data.model import (Esdt, ExchangeRate,
+                                               LpTokenComposition)
 from opendex_aggregator_api.pools import stableswap
-from opendex_aggregator_api.utils.math import ceildiv
+from opendex_aggregator_api.utils.math import ceildiv, interpolate
 
-from .pools import ConstantProductPool, StableSwapPool, find
+from .pools import (AbstractPool, ConstantProductPool, PriceImpactCurve,
+                    StableSwapPool)
 
 MAX_FEE = 10_000
 
@@ -19,6 +22,8 @@ class JexConstantProductPool(ConstantProductPool):
     JEX constant product pool with specific fees management.
     """
 
+    __slots__ = ('lp_fee', 'platform_fee')
+
     lp_fee: int
     platform_fee: int
 
@@ -118,6 +123,8 @@ class JexConstantProductDepositPool(JexConstantProductPool):
     Special pool for deposits in JEX constant product pools.
     """
 
+    __slots__ = ()
+
     def __init__(self,
                  first_token: Esdt,
                  first_token_reserves: int,
@@ -237,6 +244,8 @@ class JexStableSwapPool(StableSwapPool):
     Keep this type though because it's used as discriminant for aggregation fees.
     """
 
+    __slots__ = ()
+
     def __init__(self,
                  amp_factor: int,
                  swap_fee: int,
@@ -268,6 +277,8 @@ class JexStableSwapPool(StableSwapPool):
 @dataclass
 class JexStableSwapPoolDeposit(StableSwapPool):
 
+    __slots__ = ()
+
     def __init__(self,
                  amp_factor: int,
                  total_fees: int,
@@ -301,7 +312,8 @@ class JexStableSwapPoolDeposit(StableSwapPool):
                                                  max_fees=self.max_fee,
                                                  lp_total_supply=self.lp_token_supply,
                                                  reserves=self.normalized_reserves,
-                                                 underlying_prices=self.underlying_prices)
+                                                 underlying_prices=self.underlying_prices,
+                                                 d=self._invariant())
 
         admin_fee_out = amount_out * (liquidity_fees * 33) // 100
 
@@ -324,7 +336,125 @@ class JexStableSwapPoolDeposit(StableSwapPool):
                         amount_in: int,
                         token_out: Esdt,
                         amount_out: int):
-        i_token_in, _ = find(lambda x: x.identifier ==
-                             token_in.identifier, self.tokens)
+        i_token_in = self._token_index(token_in)
 
         self.reserves[i_token_in] += amount_in
+
+
+@dataclass
+class JexOrderbookPool(AbstractPool):
+    """
+    JEX orderbook (one direction), described by its depth: cumulative
+    amounts in and amounts out when walking the price levels.
+
+    Amounts between two points are interpolated (same price until the
+    next point), which never overestimates the fill of a real book.
+    """
+
+    __slots__ = ('token_in', 'token_out', 'amounts_in', 'amounts_out')
+
+    token_in: Esdt
+    token_out: Esdt
+    amounts_in: List[int]
+    """ Cumulative amounts in (increasing, first one is 0) """
+    amounts_out: List[int]
+    """ Cumulative amounts out (increasing, first one is 0) """
+
+    @override
+    def deep_copy(self):
+        return JexOrderbookPool(token_in=self.token_in.model_copy(),
+                                token_out=self.token_out.model_copy(),
+                                amounts_in=self.amounts_in.copy(),
+                                amounts_out=self.amounts_out.copy())
+
+    @override
+    def estimate_amount_out(self, token_in: Esdt, amount_in: int, token_out: Esdt) -> Tuple[int, int, int]:
+        if token_in.identifier != self.token_in.identifier:
+            raise ValueError(f'Invalid token in: {token_in.identifier}')
+        if token_out.identifier != self.token_out.identifier:
+            raise ValueError(f'Invalid token out: {token_out.identifier}')
+
+        return self._fill(amount_in), 0, 0
+
+    @override
+    def estimate_theorical_amount_out(self, token_in: Esdt, amount_in: int, token_out: Esdt) -> int:
+        if len(self.amounts_in) < 2:
+            return 0
+
+        # best price level
+        return (amount_in * self.amounts_out[1]) // self.amounts_in[1]
+
+    @override
+    def estimated_gas(self) -> int:
+        return 100_000_000
+
+    @override
+    def exchange_rates(self, sc_address: str) -> List[ExchangeRate]:
+        if len(self.amounts_in) < 2 or self.amounts_out[1] == 0:
+            return []
+
+        rate = (self.amounts_out[1] * 10**self.token_in.decimals) \
+            / (self.amounts_in[1] * 10**self.token_out.decimals)
+
+        return [ExchangeRate(base_token_id=self.token_in.identifier,
+                             base_token_liquidity=self.amounts_in[-1],
+                             quote_token_id=self.token_out.identifier,
+                             quote_token_liquidity=self.amounts_out[-1],
+                             sc_address=sc_address,
+                             source=self._source(),
+                             rate=rate,
+                             rate2=1 / rate)]
+
+    @override
+    def screening_curve(self, token_in: Esdt, token_out: Esdt) -> Optional[Tuple[float, float]]:
+        if token_in.identifier != self.token_in.identifier \
+                or token_out.identifier != self.token_out.identifier \
+                or len(self.amounts_in) < 2 or self.amounts_out[1] == 0:
+            return None
+
+        # best price, saturating at the output of the whole book
+        rate = self.amounts_out[1] / self.amounts_in[1]
+
+        return rate, self.amounts_out[-1] / rate
+
+    @override
+    def price_impact_curve(self, token_in: Esdt, token_out: Esdt) -> Optional[PriceImpactCurve]:
+        if token_in.identifier != self.token_in.identifier \
+                or token_out.identifier != self.token_out.identifier \
+                or len(self.amounts_in) < 2:
+            return None
+
+        # sampled depth
+        return PriceImpactCurve(amounts_in=list(self.amounts_in),
+                                amounts_out=list(self.amounts_out),
+                                estimated_gas=self.estimated_gas())
+
+    @override
+    def lp_token_composition(self) -> Optional[LpTokenComposition]:
+        return None
+
+    @override
+    def update_reserves(self,
+                        token_in: Esdt,
+                        amount_in: int,
+                        token_out: Esdt,
+                        amount_out: int):
+        # the consumed levels are removed from the book
+        filled = self._fill(amount_in)
+        i = bisect.bisect_right(self.amounts_in, amount_in)
+
+        self.amounts_in = [0] + [a - amount_in
+                                 for a in self.amounts_in[i:]]
+        self.amounts_out = [0] + [a - filled
+                                  for a in self.amounts_out[i:]]
+
+    def _fill(self, amount_in: int) -> int:
+        if amount_in > self.amounts_in[-1]:
+            raise ValueError(
+                f'Amount to swap to big {amount_in} (max={self.amounts_in[-1]})')
+
+        return interpolate(self.amounts_in, self.amounts_out, amount_in)
+
+    @override
+    def _source(self) -> str:
+        return 'jexchange'
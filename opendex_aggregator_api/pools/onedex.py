@@ -17,6 +17,8 @@ class OneDexConstantProductPool(ConstantProductPool):
     OneDex constant product pool with specific fees management.
     """
 
+    __slots__ = ('main_pair_tokens',)
+
     main_pair_tokens: List[str]
 
     def __init__(self,
@@ -13,6 +13,8 @@ MAX_FEE = 10_000
 
 @dataclass
 class OpendexConstantProductPool(ConstantProductPool):
+    __slots__ = ('fee_token', 'platform_fee')
+
     fee_token: Optional[Esdt]
 
     platform_fee: int
@@ -1,14 +1,15 @@
 import math
 import sys
 from dataclasses import dataclass
-from typing import Any, Callable, Iterable, List, Optional, Tuple
+from typing import (Any, Callable, Dict, Iterable, List, NamedTuple,
+                    Optional, Tuple)
 
 from typing_extensions import override
 
 from opendex_aggregator_api.data.model import (Esdt, ExchangeRate,
                                                LpTokenComposition)
 from opendex_aggregator_api.pools import stableswap
-from opendex_aggregator_api.utils.math import ceildiv
+from opendex_aggregator_api.utils.math import ceildiv, interpolate
 
 
 def find(function_: Callable[[Any], bool], iter_: Iterable[Any]) -> Tuple[int, Optional[Any]]:
@@ -18,7 +19,76 @@ def find(function_: Callable[[Any], bool], iter_: Iterable[Any]) -> Tuple[int, O
     return (-1, None)
 
 
+# 10**18 / 10**decimals, for the usual numbers of decimals
+_NORMALIZATION_FACTORS = [10**(18 - d) for d in range(19)]
+
+_SLOTS: Dict[type, Tuple[str, ...]] = {}
+
+# log-spaced amounts of the price impact curves: from 10**decimals / divisor,
+# multiplied by step, until the pool can not swap or is saturated (marginal
+# rate below 1 / ratio of the first one)
+PRICE_IMPACT_CURVE_FIRST_AMOUNT_DIVISOR = 10**6
+PRICE_IMPACT_CURVE_STEP = 4
+PRICE_IMPACT_CURVE_MAX_POINTS = 32
+PRICE_IMPACT_CURVE_SATURATION_RATIO = 100
+
+
+class PriceImpactCurve(NamedTuple):
+    """
+    Outputs of a pool (one direction) sampled for increasing amounts, both
+    starting at 0.
+    """
+    amounts_in: List[int]
+    amounts_out: List[int]
+    estimated_gas: int
+
+    def estimate_amount_out(self, amount_in: int) -> Optional[int]:
+        """
+        :return: interpolated amount out, None above the sampled amounts
+        """
+        if amount_in > self.amounts_in[-1]:
+            return None
+
+        return interpolate(self.amounts_in, self.amounts_out, amount_in)
+
+    def estimate_theorical_amount_out(self, amount_in: int) -> int:
+        # price of the smallest amount sampled
+        return (amount_in * self.amounts_out[1]) // self.amounts_in[1]
+
+
+def _slots(cls: type) -> Tuple[str, ...]:
+    slots = _SLOTS.get(cls, None)
+
+    if slots is None:
+        slots = tuple(name
+                      for c in reversed(cls.__mro__)
+                      for name in c.__dict__.get('__slots__', ()))
+        _SLOTS[cls] = slots
+
+    return slots
+
+
 class AbstractPool:
+    """
+    Pools are compact objects: each subclass declares the slots of its
+    fields. Slots starting with an underscore are caches of the pool state,
+    they are not pickled and are rebuilt by +_reset_caches+.
+    """
+
+    __slots__ = ()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {name: getattr(self, name)
+                for name in _slots(type(self))
+                if not name.startswith('_')}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        # also loads pools pickled before slots (same fields)
+        for name, value in state.items():
+            if not name.startswith('_'):
+                setattr(self, name, value)
+
+        self._reset_caches()
 
     def deep_copy(self) -> 'AbstractPool':
         raise NotImplementedError()
@@ -50,6 +120,58 @@ class AbstractPool:
     def exchange_rates(self, sc_address: str) -> List[ExchangeRate]:
         raise NotImplementedError()
 
+    def screening_curve(self, token_in: Esdt, token_out: Esdt) -> Optional[Tuple[float, float]]:
+        """
+        Float approximation of the pool used to screen routes: the output
+        for an amount a is about rate * a / (1 + a / depth).
+
+        :return: (rate, depth), None if the pool has no approximation
+        """
+        return None
+
+    def price_impact_curve(self, token_in: Esdt, token_out: Esdt) -> Optional[PriceImpactCurve]:
+        """
+        Sample the output of the pool for log-spaced amounts (see
+        PRICE_IMPACT_CURVE_*).
+
+        :return: None if the pool can not swap the smallest amount
+        """
+        amounts_in = [0]
+        amounts_out = [0]
+
+        amount = max(1, 10**token_in.decimals //
+                     PRICE_IMPACT_CURVE_FIRST_AMOUNT_DIVISOR)
+
+        for _ in range(PRICE_IMPACT_CURVE_MAX_POINTS):
+            try:
+                amount_out, _, _ = self.estimate_amount_out(token_in,
+                                                            amount,
+                                                            token_out)
+            except ValueError:
+                break
+
+            if amount_out <= amounts_out[-1]:
+                break
+
+            amounts_in.append(amount)
+            amounts_out.append(amount_out)
+
+            # marginal rate of the last segment vs the first one (cross products)
+            last_rate = (amounts_out[-1] - amounts_out[-2]) * amounts_in[1]
+            first_rate = amounts_out[1] * (amounts_in[-1] - amounts_in[-2])
+
+            if last_rate * PRICE_IMPACT_CURVE_SATURATION_RATIO < first_rate:
+                break
+
+            amount *= PRICE_IMPACT_CURVE_STEP
+
+        if len(amounts_in) < 2:
+            return None
+
+        return PriceImpactCurve(amounts_in=amounts_in,
+                                amounts_out=amounts_out,
+                                estimated_gas=self.estimated_gas())
+
     def lp_token_composition(self) -> Optional[LpTokenComposition]:
         raise NotImplementedError()
 
@@ -60,10 +182,60 @@ class AbstractPool:
                         amount_out: int):
         raise NotImplementedError()
 
+    def with_updated_reserves(self,
+                              token_in: Esdt,
+                              amount_in: int,
+                              token_out: Esdt,
+                              amount_out: int) -> 'AbstractPool':
+        """
+        Copy-on-write version of +update_reserves+.
+
+        :return: an updated copy of the pool (tokens and parameters are
+        shared, reserves are not), this pool is left untouched
+        """
+        pool = object.__new__(type(self))
+
+        for name in _slots(type(self)):
+            value = getattr(self, name)
+
+            if isinstance(value, list):
+                value = value.copy()
+
+            setattr(pool, name, value)
+
+        pool.update_reserves(token_in, amount_in, token_out, amount_out)
+
+        return pool
+
+    def intern_tokens(self, tokens: Dict[str, Esdt]):
+        """
+        Replace the tokens of the pool by the ones of +tokens+ (by
+        identifier), adding the missing ones, so that pools of the same
+        snapshot share their tokens.
+        """
+        for name in _slots(type(self)):
+            value = getattr(self, name)
+
+            if isinstance(value, Esdt):
+                setattr(self, name,
+                        tokens.setdefault(value.identifier, value))
+            elif isinstance(value, list) and len(value) > 0 and isinstance(value[0], Esdt):
+                setattr(self, name,
+                        [tokens.setdefault(t.identifier, t) for t in value])
+
+    def _reset_caches(self):
+        pass
+
     def _normalize_amount(self, amount: int, token: Esdt) -> int:
+        if token.decimals <= 18:
+            return amount * _NORMALIZATION_FACTORS[token.decimals]
+
         return (amount * 10**18) // 10**token.decimals
 
     def _denormalize_amount(self, amount: int, token: Esdt) -> int:
+        if token.decimals <= 18:
+            return int(amount // _NORMALIZATION_FACTORS[token.decimals])
+
         num = amount * 10**token.decimals
         den = 10**18
 
@@ -79,6 +251,11 @@ class ConstantProductPool(AbstractPool):
     Constant product pools (x*y=k)
     """
 
+    __slots__ = ('max_fee', 'total_fee',
+                 'first_token', 'first_token_reserves',
+                 'lp_token', 'lp_token_supply',
+                 'second_token', 'second_token_reserves')
+
     max_fee: int
     total_fee: int
 
@@ -178,6 +355,20 @@ class ConstantProductPool(AbstractPool):
                              rate=rate2,
                              rate2=rate)]
 
+    @override
+    def screening_curve(self, token_in: Esdt, token_out: Esdt) -> Optional[Tuple[float, float]]:
+        try:
+            in_reserve, out_reserve = self._reserves(token_in, token_out)
+        except ValueError:
+            return None
+
+        if in_reserve == 0:
+            return None
+
+        rate = (out_reserve / in_reserve) * (1 - self.total_fee / self.max_fee)
+
+        return rate, float(in_reserve)
+
     @override
     def lp_token_composition(self) -> Optional[LpTokenComposition]:
         return LpTokenComposition(lp_token_id=self.lp_token.identifier,
@@ -240,6 +431,8 @@ class ConstantPricePool(AbstractPool):
     Example: Liquid staking pools
     """
 
+    __slots__ = ('price', 'token_in', 'token_out', 'token_out_reserve')
+
     price: int
     """ Price (10**18 = 1).
     1 * token_out = token_in / price """
@@ -299,6 +492,17 @@ class ConstantPricePool(AbstractPool):
                              sc_address=sc_address,
                              source=self._source())]
 
+    @override
+    def screening_curve(self, token_in: Esdt, token_out: Esdt) -> Optional[Tuple[float, float]]:
+        if token_in.identifier != self.token_in.identifier \
+                or token_out.identifier != self.token_out.identifier:
+            return None
+
+        rate = (10**18 / self.price) * \
+            (10**token_out.decimals / 10**token_in.decimals)
+
+        return rate, math.inf
+
     @override
     def lp_token_composition(self):
         return None
@@ -320,6 +524,11 @@ class StableSwapPool(AbstractPool):
     Example: AshSwap stable pool
     """
 
+    __slots__ = ('amp_factor', 'swap_fee', 'max_fee',
+                 'lp_token', 'lp_token_supply',
+                 'tokens', 'reserves', 'underlying_prices', 'normalized_reserves',
+                 '_d', '_solutions', '_token_indexes')
+
     amp_factor: int
 
     swap_fee: int
@@ -351,6 +560,7 @@ class StableSwapPool(AbstractPool):
         self.lp_token_supply = lp_token_supply
         self.normalized_reserves = [self._normalize_amount(a, t)
                                     for (a, t) in zip(self.reserves, self.tokens)]
+        self._reset_caches()
 
     @override
     def deep_copy(self):
@@ -365,16 +575,15 @@ class StableSwapPool(AbstractPool):
 
     @override
     def estimate_amount_out(self, token_in: Esdt, amount_in: int, token_out: Esdt) -> Tuple[int, int, int]:
-        i_token_in, _ = find(lambda x: x.identifier ==
-                             token_in.identifier, self.tokens)
-        i_token_out, _ = find(lambda x: x.identifier ==
-                              token_out.identifier, self.tokens)
+        i_token_in = self._token_index(token_in)
+        i_token_out = self._token_index(token_out)
 
         normalized_amount_in = self._normalize_amount(amount_in, token_in)
 
         normalized_amount_out = stableswap.estimate_amount_out(
             self.amp_factor, self.normalized_reserves, self.underlying_prices,
-            i_token_in, normalized_amount_in, i_token_out)
+            i_token_in, normalized_amount_in, i_token_out, self._invariant(),
+            self._solutions)
 
         amount_out = self._denormalize_amount(normalized_amount_out, token_out)
 
@@ -406,10 +615,8 @@ class StableSwapPool(AbstractPool):
     def estimate_theorical_amount_out(self, token_in: Esdt, amount_in: int, token_out: Esdt) -> int:
         normalized_amount_in = self._normalize_amount(amount_in, token_in)
 
-        i_token_in, _ = find(lambda x: x.identifier ==
-                             token_in.identifier, self.tokens)
-        i_token_out, _ = find(lambda x: x.identifier ==
-                              token_out.identifier, self.tokens)
+        i_token_in = self._token_index(token_in)
+        i_token_out = self._token_index(token_out)
 
         amount_num = normalized_amount_in * self.underlying_prices[i_token_in]
         amount_den = self.underlying_prices[i_token_out]
@@ -424,6 +631,21 @@ class StableSwapPool(AbstractPool):
     def estimated_gas(self) -> int:
         return 20_000_000
 
+    @override
+    def screening_curve(self, token_in: Esdt, token_out: Esdt) -> Optional[Tuple[float, float]]:
+        # linearized around the peg (no price impact)
+        i_token_in = self._token_index(token_in)
+        i_token_out = self._token_index(token_out)
+
+        if i_token_in < 0 or i_token_out < 0 or self.reserves[i_token_out] == 0:
+            return None
+
+        rate = (self.underlying_prices[i_token_in] / self.underlying_prices[i_token_out]) * \
+            (10**token_out.decimals / 10**token_in.decimals) * \
+            (1 - self.swap_fee / self.max_fee)
+
+        return rate, math.inf
+
     @override
     def lp_token_composition(self) -> Optional[LpTokenComposition]:
         return LpTokenComposition(lp_token_id=self.lp_token.identifier,
@@ -438,16 +660,16 @@ class StableSwapPool(AbstractPool):
                         amount_in: int,
                         token_out: Esdt,
                         amount_out: int):
-        i_token_in, _ = find(lambda x: x.identifier ==
-                             token_in.identifier, self.tokens)
-        i_token_out, _ = find(lambda x: x.identifier ==
-                              token_out.identifier, self.tokens)
+        i_token_in = self._token_index(token_in)
+        i_token_out = self._token_index(token_out)
 
         self.reserves[i_token_in] += amount_in
         self.reserves[i_token_out] -= amount_out
 
         self.normalized_reserves = [self._normalize_amount(a, t)
                                     for (a, t) in zip(self.reserves, self.tokens)]
+        self._d = None
+        self._solutions = {}
 
     @override
     def exchange_rates(self, sc_address: str) -> List[ExchangeRate]:
@@ -466,7 +688,7 @@ class StableSwapPool(AbstractPool):
 
                 normalized_amount_out = stableswap.estimate_amount_out(
                     self.amp_factor, self.normalized_reserves, self.underlying_prices,
-                    i_token_in, normalized_amount_in, i_token_out)
+                    i_token_in, normalized_amount_in, i_token_out, self._invariant())
 
                 if normalized_amount_out != 0:
 
@@ -480,3 +702,24 @@ class StableSwapPool(AbstractPool):
                                               rate2=normalized_amount_in / normalized_amount_out))
 
         return rates
+
+    @override
+    def _reset_caches(self):
+        # invariant (D) of the current reserves, computed when needed
+        self._d = None
+        # last solutions of the swap equation for the current reserves,
+        # see +stableswap.estimate_amount_out+
+        self._solutions = {}
+        self._token_indexes = {t.identifier: i
+                               for i, t in enumerate(self.tokens)}
+
+    def _invariant(self) -> int:
+        if self._d is None:
+            self._d = stableswap.invariant(self.amp_factor,
+                                           self.normalized_reserves,
+                                           self.underlying_prices)
+
+        return self._d
+
+    def _token_index(self, token: Esdt) -> int:
+        return self._token_indexes.get(token.identifier, -1)
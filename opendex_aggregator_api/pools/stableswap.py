@@ -1,20 +1,45 @@
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 from opendex_aggregator_api.pools import curve
 
 UNDERLYING_PRICE_PRECISION = 10**18
 
 
+def invariant(amp: int,
+              reserves: List[int],
+              underlying_prices: List[int]) -> int:
+    """
+    Stable swap invariant (D) of a pool, 0 if a reserve is empty.
+
+    Note that +reserves+ must be normalized (same number of decimals)
+    """
+    xp = [(r*p)//UNDERLYING_PRICE_PRECISION for (r, p)
+          in zip(reserves, underlying_prices)]
+
+    if any((x == 0 for x in xp)):
+        return 0
+
+    return curve.D(amp, xp)
+
+
 def estimate_amount_out(amp: int,
                         reserves: List[int],
                         underlying_prices: List[int],
                         i_token_in: int,
                         amount_in: int,
-                        i_token_out: int):
+                        i_token_out: int,
+                        d: Optional[int] = None,
+                        solutions: Optional[Dict[Tuple[int, int], Tuple[int, int]]] = None):
     """
     Estimate output amount of a stable swap.
 
     Note that +reserves+ and +amount_in+ must be normalized (same number of decimals)
+
+    +d+ is the invariant of the pool if already known (see +invariant+)
+
+    +solutions+ keeps the last balances (x, y) solved per (i_token_in, i_token_out)
+    for these reserves: they are used to warm start the next estimations
+    for higher amounts.
     """
 
     reserves = [(r*p)//UNDERLYING_PRICE_PRECISION for (r, p)
@@ -29,8 +54,19 @@ def estimate_amount_out(amp: int,
     x = reserves[i_token_in] + amount_in * \
         underlying_prices[i_token_in] // UNDERLYING_PRICE_PRECISION
 
+    y_start = None
+
+    if solutions is not None:
+        previous = solutions.get((i_token_in, i_token_out), None)
+
+        if previous is not None and previous[0] <= x:
+            y_start = previous[1]
+
     out_reserve_after = curve.y(
-        amp, reserves, i_token_in, i_token_out, x)
+        amp, reserves, i_token_in, i_token_out, x, d, y_start)
+
+    if solutions is not None:
+        solutions[(i_token_in, i_token_out)] = (x, out_reserve_after)
 
     dy = (out_reserve - out_reserve_after) * \
         UNDERLYING_PRICE_PRECISION // underlying_prices[i_token_out]
@@ -43,11 +79,14 @@ def estimate_amount_in(amp: int,
                        underlying_prices: List[int],
                        i_token_out: int,
                        amount_out: int,
-                       i_token_in: int):
+                       i_token_in: int,
+                       d: Optional[int] = None):
     """
     Estimate input amount of a stable swap.
 
     Note that +reserves+ and +amount_out+ must be normalized (same number of decimals)
+
+    +d+ is the invariant of the pool if already known (see +invariant+)
     """
 
     reserves = [(r*p)//UNDERLYING_PRICE_PRECISION for (r, p)
@@ -63,7 +102,7 @@ def estimate_amount_in(amp: int,
         underlying_prices[i_token_out] // UNDERLYING_PRICE_PRECISION
 
     in_reserve_after = curve.y(
-        amp, reserves, i_token_out, i_token_in, y)
+        amp, reserves, i_token_out, i_token_in, y, d)
 
     dx = (in_reserve_after - in_reserve) * \
         UNDERLYING_PRICE_PRECISION // underlying_prices[i_token_in]
@@ -120,11 +159,14 @@ def estimate_deposit(deposits: List[int],
                      lp_total_supply: int,
                      amp: int,
                      liquidity_fees: int,
-                     max_fees: int) -> int:
+                     max_fees: int,
+                     d: Optional[int] = None) -> int:
     """
     Estimate deposit in a stable pool (mint).
 
     Note that +reserves+ and +deposits+ must be normalized (same number of decimals)
+
+    +d+ is the invariant of the pool if already known (see +invariant+)
     """
 
     old_xs = [(r*p)//UNDERLYING_PRICE_PRECISION for (r, p)
@@ -132,7 +174,7 @@ def estimate_deposit(deposits: List[int],
 
     d0 = 0
     if lp_total_supply > 0:
-        d0 = curve.D(amp, old_xs)
+        d0 = d if d is not None else curve.D(amp, old_xs)
 
     scaled_deposits = [(d*p)//UNDERLYING_PRICE_PRECISION for (d, p)
                        in zip(deposits, underlying_prices)]
@@ -23,3 +23,22 @@ def test_curve_y(amp: int, amounts: List[int], i_token_in: int, i_token_out: int
              i_token_in,
              i_token_out,
              token_in_balance) == expected
+
+
+@pytest.mark.parametrize('amp,amounts,i_token_in,i_token_out,token_in_balances', [
+    (256, [1_000_000, 1_000_000], 0, 1, [1_100_000, 1_500_000, 1_500_001]),
+    (256,
+     [514670_000000, 392640_000000, 495630_000000],
+     1, 2, [400000_000000, 450000_000000, 900000_000000]),
+])
+def test_curve_y_warm_start(amp: int, amounts: List[int], i_token_in: int, i_token_out: int, token_in_balances: List[int]):
+    y_start = None
+
+    for token_in_balance in token_in_balances:
+        expected = y(amp, amounts.copy(), i_token_in,
+                     i_token_out, token_in_balance)
+
+        y_start = y(amp, amounts.copy(), i_token_in, i_token_out,
+                    token_in_balance, y_start=y_start)
+
+        assert y_start == expected
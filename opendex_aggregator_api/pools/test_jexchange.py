@@ -4,7 +4,8 @@ import pytest
 
 from opendex_aggregator_api.data.model import Esdt
 from opendex_aggregator_api.pools.pools import StableSwapPool
-from .jexchange import MAX_FEE, JexConstantProductPool, JexStableSwapPool
+from .jexchange import (MAX_FEE, JexConstantProductPool, JexOrderbookPool,
+                        JexStableSwapPool)
 
 TOKEN_IN = Esdt(decimals=18,
                 identifier='IN-000000',
@@ -167,3 +168,49 @@ def test_JexStableSwapPool_estimate_amount_out2(reserves: List[int],
         token_in, amount_in, token_out)
 
     assert net_amount_out == expected
+
+
+@pytest.mark.parametrize('amount_in,expected', [
+    (0, 0),
+    (1_000, 2_000),
+    (2_000, 2_750),
+    (3_000, 3_500),
+    (4_000, 4_000),
+    (5_000, 4_500)
+])
+def test_JexOrderbookPool_estimate_amount_out(amount_in: int, expected: int):
+    pool = JexOrderbookPool(token_in=TOKEN_IN,
+                            token_out=TOKEN_OUT,
+                            amounts_in=[0, 1_000, 3_000, 5_000],
+                            amounts_out=[0, 2_000, 3_500, 4_500])
+
+    net_amount_out, admin_fee_in, admin_fee_out = pool.estimate_amount_out(
+        TOKEN_IN, amount_in, TOKEN_OUT)
+
+    assert net_amount_out == expected
+    assert admin_fee_in == 0
+    assert admin_fee_out == 0
+
+    with pytest.raises(ValueError):
+        pool.estimate_amount_out(TOKEN_IN, 5_001, TOKEN_OUT)
+
+
+def test_JexOrderbookPool_with_updated_reserves():
+    pool = JexOrderbookPool(token_in=TOKEN_IN,
+                            token_out=TOKEN_OUT,
+                            amounts_in=[0, 1_000, 3_000, 5_000],
+                            amounts_out=[0, 2_000, 3_500, 4_500])
+
+    amount_out, _, _ = pool.estimate_amount_out(TOKEN_IN, 2_000, TOKEN_OUT)
+
+    updated_pool = pool.with_updated_reserves(TOKEN_IN, 2_000,
+                                              TOKEN_OUT, amount_out)
+
+    assert pool.amounts_in == [0, 1_000, 3_000, 5_000]
+    assert updated_pool.amounts_in == [0, 1_000, 3_000]
+    assert updated_pool.amounts_out == [0, 750, 1_750]
+
+    # consuming the book in two swaps is the same as in one swap
+    amount_out_2, _, _ = updated_pool.estimate_amount_out(TOKEN_IN, 3_000,
+                                                          TOKEN_OUT)
+    assert amount_out + amount_out_2 == 4_500
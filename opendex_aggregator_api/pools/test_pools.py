@@ -1,11 +1,13 @@
 
+import pickle
 from typing import List
 
 import pytest
 
 from opendex_aggregator_api.data.model import Esdt
 
-from .pools import ConstantPricePool, ConstantProductPool, StableSwapPool
+from .pools import (PRICE_IMPACT_CURVE_MAX_POINTS, ConstantPricePool,
+                    ConstantProductPool, StableSwapPool)
 
 TOKEN_IN = Esdt(decimals=18,
                 identifier='IN-000000',
@@ -260,3 +262,139 @@ def test_StableSwapPool_estimate_theorical_amount_out_with_underlying_prices(
     assert pool.estimate_theorical_amount_out(token_in,
                                               amount_in,
                                               token_out) == expected
+
+
+@pytest.mark.parametrize('amount_in', [1_000000000000000000, 10_000000000000000000, 500_000000000000000000])
+def test_ConstantProductPool_screening_curve(amount_in: int):
+    pool = ConstantProductPool(
+        max_fee=10_000,
+        total_fee=30,
+        first_token=TOKEN_IN,
+        first_token_reserves=1000_000000000000000000,
+        lp_token=LP_TOKEN,
+        lp_token_supply=999,
+        second_token=TOKEN_OUT,
+        second_token_reserves=2000_000000000000000000)
+
+    rate, depth = pool.screening_curve(TOKEN_IN, TOKEN_OUT)
+    net_amount_out, _, _ = pool.estimate_amount_out(TOKEN_IN, amount_in, TOKEN_OUT)
+
+    assert rate * amount_in / (1 + amount_in / depth) == pytest.approx(net_amount_out, rel=1e-2)
+    assert pool.screening_curve(TOKEN_IN, USDC) is None
+
+
+def test_ConstantProductPool_price_impact_curve():
+    pool = ConstantProductPool(
+        max_fee=10_000,
+        total_fee=30,
+        first_token=TOKEN_IN,
+        first_token_reserves=1000_000000000000000000,
+        lp_token=LP_TOKEN,
+        lp_token_supply=999,
+        second_token=TOKEN_OUT,
+        second_token_reserves=2000_000000000000000000)
+
+    curve = pool.price_impact_curve(TOKEN_IN, TOKEN_OUT)
+
+    # sampled until saturation, far below the max number of points
+    assert curve.amounts_in[:3] == [0, 10**12, 4 * 10**12]
+    assert 2 < len(curve.amounts_in) < PRICE_IMPACT_CURVE_MAX_POINTS
+    assert curve.estimated_gas == pool.estimated_gas()
+
+    for amount_in, amount_out in zip(curve.amounts_in[1:], curve.amounts_out[1:]):
+        assert pool.estimate_amount_out(TOKEN_IN, amount_in, TOKEN_OUT)[0] == amount_out
+
+    # concave output: interpolation is below the exact output
+    amount_in = 7_000000000000000000
+    net_amount_out, _, _ = pool.estimate_amount_out(TOKEN_IN, amount_in, TOKEN_OUT)
+    estimate = curve.estimate_amount_out(amount_in)
+
+    assert estimate <= net_amount_out
+    assert estimate == pytest.approx(net_amount_out, rel=1e-2)
+    assert curve.estimate_amount_out(curve.amounts_in[-1] + 1) is None
+
+
+def test_ConstantProductPool_with_updated_reserves():
+    pool = ConstantProductPool(
+        max_fee=10_000,
+        total_fee=0,
+        first_token=TOKEN_IN,
+        first_token_reserves=1000,
+        lp_token=LP_TOKEN,
+        lp_token_supply=999,
+        second_token=TOKEN_OUT,
+        second_token_reserves=2000)
+
+    updated_pool = pool.with_updated_reserves(TOKEN_IN, 10, TOKEN_OUT, 20)
+
+    assert (updated_pool.first_token_reserves,
+            updated_pool.second_token_reserves) == (1010, 1980)
+    assert (pool.first_token_reserves,
+            pool.second_token_reserves) == (1000, 2000)
+    assert updated_pool.first_token is pool.first_token
+
+
+def test_StableSwapPool_with_updated_reserves():
+    reserves = [1000_000000000000000000, 1000_000000]
+
+    pool = StableSwapPool(amp_factor=256,
+                          swap_fee=0,
+                          max_fee=1_000_000,
+                          tokens=[BUSD, USDC],
+                          reserves=reserves,
+                          underlying_prices=[10**18, 10**18],
+                          lp_token=LP_TOKEN,
+                          lp_token_supply=0)
+
+    normalized_reserves = pool.normalized_reserves
+
+    updated_pool = pool.with_updated_reserves(BUSD,
+                                              10_000000000000000000,
+                                              USDC,
+                                              10_000000)
+
+    assert updated_pool.reserves == [1010_000000000000000000, 990_000000]
+    assert updated_pool.normalized_reserves == [1010_000000000000000000,
+                                                990_000000000000000000]
+    assert pool.reserves == [1000_000000000000000000, 1000_000000]
+    assert pool.normalized_reserves == normalized_reserves
+
+
+def test_StableSwapPool_pickle():
+    pool = StableSwapPool(amp_factor=256,
+                          swap_fee=100,
+                          max_fee=1_000_000,
+                          tokens=[BUSD, USDC],
+                          reserves=[1000_000000000000000000, 1000_000000],
+                          underlying_prices=[10**18, 10**18],
+                          lp_token=LP_TOKEN,
+                          lp_token_supply=0)
+
+    amount_out = pool.estimate_amount_out(BUSD, 10_000000000000000000, USDC)
+
+    loaded_pool = pickle.loads(pickle.dumps(pool))
+
+    assert not hasattr(loaded_pool, '__dict__')
+    assert loaded_pool == pool
+    assert loaded_pool.estimate_amount_out(BUSD,
+                                           10_000000000000000000,
+                                           USDC) == amount_out
+
+
+def test_intern_tokens():
+    pool = ConstantProductPool(max_fee=10_000,
+                               total_fee=30,
+                               first_token=TOKEN_IN,
+                               first_token_reserves=1000,
+                               lp_token=LP_TOKEN,
+                               lp_token_supply=1000,
+                               second_token=TOKEN_OUT,
+                               second_token_reserves=2000)
+
+    token_in = TOKEN_IN.model_copy()
+    tokens = {token_in.identifier: token_in}
+
+    pool.intern_tokens(tokens)
+
+    assert pool.first_token is token_in
+    assert tokens[TOKEN_OUT.identifier] is pool.second_token
@@ -1,7 +1,7 @@
 
 from typing import List
 import pytest
-from .stableswap import estimate_amount_out, estimate_amount_in, estimate_deposit, estimate_withdraw_one_token
+from .stableswap import estimate_amount_out, estimate_amount_in, estimate_deposit, estimate_withdraw_one_token, invariant
 
 
 @pytest.mark.parametrize('reserves,underlying_prices,amount_in,expected', [
@@ -36,6 +36,31 @@ def test_estimate_amount_out(reserves: List[int], underlying_prices: List[int],
         256, reserves, underlying_prices, 0, amount_in, 1) == expected
 
 
+@pytest.mark.parametrize('reserves,underlying_prices', [
+    ([466_060, 518_355, 428_216],
+     [10**18, 10**18, 10**18]),
+
+    ([15_347_000_000, 34_757_000_000],
+     [10**18, 1_013470148086771241]),
+
+    ([514670_000000, 392640_000000, 495630_000000],
+     [10**18, 10**18, 10**18])
+])
+def test_estimate_amount_out_with_invariant_and_solutions(reserves: List[int], underlying_prices: List[int]):
+    d = invariant(256, reserves, underlying_prices)
+    solutions = {}
+
+    # increasing amounts: each estimation starts from the previous solution
+    for amount_in in [10**k for k in range(1, 10)]:
+        expected = estimate_amount_out(
+            256, reserves, underlying_prices, 0, amount_in, 1)
+
+        assert estimate_amount_out(
+            256, reserves, underlying_prices, 0, amount_in, 1, d) == expected
+        assert estimate_amount_out(
+            256, reserves, underlying_prices, 0, amount_in, 1, d, solutions) == expected
+
+
 @pytest.mark.parametrize('reserves,underlying_prices,amount_out,expected', [
     ([1, 1], [10**18, 10**18], 0, 0),
 
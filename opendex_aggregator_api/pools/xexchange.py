@@ -14,6 +14,8 @@ MAX_FEE = 100_000
 @dataclass
 class XExchangeConstantProductPool(ConstantProductPool):
 
+    __slots__ = ('special_fee',)
+
     special_fee: int
 
     def __init__(self,
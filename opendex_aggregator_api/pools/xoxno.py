@@ -11,6 +11,8 @@ from opendex_aggregator_api.token_constants import WEGLD_IDENTIFIER
 @dataclass
 class XoxnoConstantPricePool(ConstantPricePool):
 
+    __slots__ = ()
+
     @override
     def estimate_amount_out(self, token_in: Esdt, amount_in: int, token_out: Esdt) -> Tuple[int, int, int]:
         if token_in.identifier == WEGLD_IDENTIFIER and amount_in < 1_000_000_000_000_000_000:
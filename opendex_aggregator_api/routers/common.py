@@ -1,27 +1,179 @@
+import logging
+import threading
+from collections import Counter
 from datetime import timedelta
-from typing import List
+from time import time
+from typing import List, Optional
 
+from opendex_aggregator_api.data.datastore import (get_route_table_routes,
+                                                   increment_route_requests)
+from opendex_aggregator_api.data.model import TokensReachability
 from opendex_aggregator_api.pools.model import SwapRoute
 from opendex_aggregator_api.services import routes as routes_svc
+from opendex_aggregator_api.services.pool_graph import (CompactRoute,
+                                                        PoolGraph,
+                                                        get_pool_graph,
+                                                        get_reachability)
 from opendex_aggregator_api.utils.redis_utils import redis_get_or_set_cache
 
+ROUTES_CACHE_TTL = timedelta(days=1)
+BEST_ROUTES_CACHE_TTL = timedelta(seconds=30)
+ROUTE_REQUESTS_FLUSH_INTERVAL = 30  # seconds
+
+_route_requests: Counter = Counter()
+_route_requests_flushed_at = time()
+_route_requests_lock = threading.Lock()
+
 
 def get_or_find_sorted_routes(token_in: str,
                               token_out: str,
-                              max_hops: int) -> List[SwapRoute]:
+                              max_hops: int,
+                              exhaustive: bool = False,
+                              max_routes: Optional[int] = None) -> List[SwapRoute]:
+    """
+    Return the best routes of a token pair (by expected output), or all
+    routes when +exhaustive+ is set (the first +max_routes+ ones if given).
+
+    Routes are searched and cached as compact routes of the current pool
+    graph and only built as +SwapRoute+ here.
+
+    Cache keys hold the topology version of the graph: all routes stay valid
+    until the topology changes, best routes are refreshed with the rates.
+
+    Pairs of the route table (precomputed by the sync task) are answered from
+    the table, the best routes being the table routes ranked by the rates.
+    The table only holds the first ROUTE_TABLE_MAX_ROUTES sorted routes, so
+    it answers exhaustive requests only when +max_routes+ is within it.
+
+    Pairs that the reachability index proves unreachable within max_hops+1
+    hops are answered without searching.
+
+    Only pairs with routes are counted as requested, so that unknown tokens
+    never reach the route table.
+    """
+
+    graph = get_pool_graph()
+
+    if graph is None:
+        return []
+
+    reachability = get_reachability(graph)
+
+    if reachability is not None:
+        min_hops = reachability.min_hops(token_in, token_out)
+
+        if min_hops is None or min_hops > max_hops + 1:
+            return []
+    else:
+        min_hops = 1
+
+    if exhaustive:
+        routes = _get_or_find_all_routes(graph,
+                                         token_in,
+                                         token_out,
+                                         max_hops,
+                                         min_hops,
+                                         max_routes)
+    else:
+        routes = _get_or_find_best_routes(graph,
+                                          token_in,
+                                          token_out,
+                                          max_hops,
+                                          reachability)
+
+    if len(routes) > 0:
+        _count_route_request(token_in, token_out)
+
+    return graph.swap_routes(routes)
+
+
+def _count_route_request(token_in: str, token_out: str):
+    """
+    Count requests in memory, flushed to Redis at most every
+    ROUTE_REQUESTS_FLUSH_INTERVAL seconds by the worker.
+    """
+    global _route_requests, _route_requests_flushed_at
+
+    with _route_requests_lock:
+        _route_requests[(token_in, token_out)] += 1
+
+        if time() - _route_requests_flushed_at < ROUTE_REQUESTS_FLUSH_INTERVAL:
+            return
+
+        counts = _route_requests
+        _route_requests = Counter()
+        _route_requests_flushed_at = time()
+
+    try:
+        increment_route_requests(counts)
+    except:
+        logging.exception('Error while counting route requests')
+
+
+def _get_or_find_all_routes(graph: PoolGraph,
+                            token_in: str,
+                            token_out: str,
+                            max_hops: int,
+                            min_hops: int,
+                            max_routes: Optional[int]) -> List[CompactRoute]:
+
+    if max_hops == routes_svc.ROUTE_TABLE_MAX_HOPS \
+            and max_routes is not None \
+            and max_routes <= routes_svc.ROUTE_TABLE_MAX_ROUTES:
+        routes = get_route_table_routes(graph.version,
+                                        token_in,
+                                        token_out)
+        if routes is not None:
+            return routes[:max_routes]
 
     def _do():
         routes = routes_svc.find_routes(token_in,
                                         token_out,
                                         max_hops,
                                         max_hops2=max_hops+2,
-                                        max_routes=9999)
+                                        max_routes=9999,
+                                        bidirectional=True,
+                                        graph=graph,
+                                        min_hops=min_hops)
+
+        return routes_svc.sort_routes(graph, routes)
 
-        return routes_svc.sort_routes(routes)
+    cache_key = f'routes_{graph.version}_{token_in}_{token_out}_{max_hops}'
+    routes = redis_get_or_set_cache(cache_key,
+                                    cache_ttl=ROUTES_CACHE_TTL,
+                                    task=_do,
+                                    parse=_parse_compact_routes)
 
-    cache_key = f'routes_{token_in}_{token_out}_{max_hops}'
+    return routes if max_routes is None else routes[:max_routes]
+
+
+def _get_or_find_best_routes(graph: PoolGraph,
+                             token_in: str,
+                             token_out: str,
+                             max_hops: int,
+                             reachability: Optional[TokensReachability]) -> List[CompactRoute]:
+
+    def _do():
+        if max_hops == routes_svc.ROUTE_TABLE_MAX_HOPS:
+            routes = get_route_table_routes(graph.version,
+                                            token_in,
+                                            token_out)
+            if routes is not None:
+                return routes_svc.rank_routes(graph, routes)
+
+        return routes_svc.find_best_routes(token_in,
+                                           token_out,
+                                           max_hops,
+                                           max_hops2=max_hops+1,
+                                           graph=graph,
+                                           reachability=reachability)
+
+    cache_key = f'best_routes_{graph.version}_{token_in}_{token_out}_{max_hops}'
     return redis_get_or_set_cache(cache_key,
-                                  cache_ttl=timedelta(seconds=6),
+                                  cache_ttl=BEST_ROUTES_CACHE_TTL,
                                   task=_do,
-                                  parse=lambda json_: [SwapRoute.model_validate(x)
-                                                       for x in json_])
+                                  parse=_parse_compact_routes)
+
+
+def _parse_compact_routes(json_: list) -> List[CompactRoute]:
+    return [tuple(x) for x in json_]
@@ -15,11 +15,15 @@ from opendex_aggregator_api.routers.adapters import (adap_dyn_eval,
                                                      adapt_static_eval)
 from opendex_aggregator_api.routers.api_models import SwapEvaluationOut
 from opendex_aggregator_api.routers.common import get_or_find_sorted_routes
+from opendex_aggregator_api.services import evaluation_processes
 from opendex_aggregator_api.services import evaluations as eval_svc
-from opendex_aggregator_api.utils.env import mvx_gateway_url
+from opendex_aggregator_api.services.externals import gateway_client
 
 router = APIRouter()
 
+EVALUATED_MAX_ROUTES = 999
+EVALUATED_MAX_ONLINE_ROUTES = 5
+
 
 @router.get('/evaluate')
 @router.post('/evaluate')
@@ -28,7 +32,14 @@ async def do_evaluate(token_in: str,
                       amount_in: Optional[int] = None,
                       net_amount_out: Optional[int] = None,
                       max_hops: int = Query(default=3, ge=1, le=4),
-                      with_dyn_routing: Optional[bool] = False) -> SwapEvaluationOut:
+                      with_dyn_routing: Optional[bool] = False,
+                      exhaustive: Optional[bool] = False,
+                      indicative: Optional[bool] = False) -> SwapEvaluationOut:
+    """
+    If +indicative+, the outputs of the routes are interpolated from the
+    price impact curves of the pools (fast, approximate quote, without
+    dynamic routing).
+    """
     if token_in in IGNORED_TOKENS or token_out in IGNORED_TOKENS:
         raise HTTPException(status_code=400,
                             detail='Invalid input or output token')
@@ -42,12 +53,18 @@ async def do_evaluate(token_in: str,
             raise HTTPException(status_code=400,
                                 detail='Either amount_in or net_amount_out is required')
 
+    if indicative and amount_in is None:
+        raise HTTPException(status_code=400,
+                            detail='Indicative evaluations require amount_in')
+
     token_in_obj = _get_token(token_in)
     token_out_obj = _get_token(token_out)
 
     routes = get_or_find_sorted_routes(token_in,
                                        token_out,
-                                       max_hops)
+                                       max_hops,
+                                       exhaustive=exhaustive,
+                                       max_routes=EVALUATED_MAX_ROUTES)
 
     if len(routes) == 0:
         return _adapt_eval_result(static_eval=None,
@@ -61,33 +78,52 @@ async def do_evaluate(token_in: str,
 
     pools_cache = {}
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
-        if amount_in is not None:
-            evals = await asyncio.gather(*[_safely_do(eval_svc.evaluate_fixed_input(r,
-                                                                                    amount_in,
-                                                                                    pools_cache,
-                                                                                    http_client))
-                                           for r in routes])
-            evals = (e for e in evals if e is not None and e.net_amount_out > 1)
-            evals = sorted(evals,
-                           key=lambda x: x.net_amount_out,
-                           reverse=True)
-        else:
-            evals = await asyncio.gather(*[_safely_do(eval_svc.evaluate_fixed_output(r,
-                                                                                     net_amount_out,
-                                                                                     pools_cache,
-                                                                                     http_client))
-                                           for r in routes])
-            evals = (e for e in evals if e is not None and e.amount_in > 1)
-            evals = sorted(evals,
-                           key=lambda x: x.amount_in)
+    http_client = gateway_client()
+
+    if indicative:
+        evals = eval_svc.evaluate_fixed_input_indicative(routes, amount_in)
+        evals = (e for e in evals if e is not None and e.net_amount_out > 1)
+        evals = sorted(evals,
+                       key=lambda x: x.net_amount_out,
+                       reverse=True)
+    elif amount_in is not None:
+        # dynamic routing needs every evaluation, not only the best one
+        evals = await _evaluate_fixed_input(routes,
+                                            amount_in,
+                                            pools_cache,
+                                            http_client,
+                                            prune=not with_dyn_routing)
+        evals = (e for e in evals if e is not None and e.net_amount_out > 1)
+        evals = sorted(evals,
+                       key=lambda x: x.net_amount_out,
+                       reverse=True)
+    else:
+        eval_svc.preload_pools((r for r in routes if eval_svc.can_evaluate_offline(r)),
+                               pools_cache)
+        evals = await asyncio.gather(*[_safely_do(eval_svc.evaluate_fixed_output(r,
+                                                                                 net_amount_out,
+                                                                                 pools_cache,
+                                                                                 http_client))
+                                       for r in routes])
+        evals = (e for e in evals if e is not None and e.amount_in > 1)
+        evals = sorted(evals,
+                       key=lambda x: x.amount_in)
 
     best_static_eval = evals[0] if len(evals) > 0 else None
 
-    if with_dyn_routing:
-        dyn_routing_eval = await eval_svc.find_best_dynamic_routing_algo3(routes,
-                                                                          amount_in,
-                                                                          max_routes=3)
+    if with_dyn_routing and amount_in is not None and not indicative:
+        dyn_routing_evals = await asyncio.gather(
+            evaluation_processes.run(eval_svc.find_best_dynamic_routing_algo4,
+                                     evals,
+                                     amount_in,
+                                     3),
+            evaluation_processes.run(eval_svc.find_best_dynamic_routing_flow,
+                                     evals,
+                                     amount_in,
+                                     6))
+        dyn_routing_eval = max((e for e in dyn_routing_evals if e is not None),
+                               key=lambda x: x.net_amount_out,
+                               default=None)
     else:
         dyn_routing_eval = None
 
@@ -131,6 +167,42 @@ def _adapt_eval_result(static_eval: Optional[SwapEvaluation],
                                                    token_out) if dyn_eval else None)
 
 
+async def _evaluate_fixed_input(routes: List[SwapRoute],
+                                amount_in: int,
+                                pools_cache: dict,
+                                http_client: aiohttp.ClientSession,
+                                prune: bool) -> List[Optional[SwapEvaluation]]:
+    """
+    Evaluate +routes+ (results in the same order).
+
+    If +prune+, offline routes whose upper bound is below the best output
+    found are skipped (None).
+    """
+    evals: List[Optional[SwapEvaluation]] = [None] * len(routes)
+
+    offline = [eval_svc.can_evaluate_offline(r) for r in routes]
+
+    offline_indexes = [i for i in range(len(routes)) if offline[i]]
+    online_indexes = [i for i in range(len(routes)) if not offline[i]]
+
+    online_evals, offline_evals = await asyncio.gather(
+        eval_svc.evaluate_fixed_input_online_batch([routes[i] for i in online_indexes],
+                                                   amount_in,
+                                                   http_client),
+        evaluation_processes.evaluate_fixed_input_offline([routes[i] for i in offline_indexes],
+                                                          amount_in,
+                                                          prune,
+                                                          pools_cache))
+
+    for i, e in zip(online_indexes, online_evals):
+        evals[i] = e
+
+    for i, e in zip(offline_indexes, offline_evals):
+        evals[i] = e
+
+    return evals
+
+
 async def _safely_do(coroutine_: Callable[..., None]) -> SwapEvaluation:
     try:
         return await coroutine_
@@ -139,8 +211,8 @@ async def _safely_do(coroutine_: Callable[..., None]) -> SwapEvaluation:
 
 
 def _cutoff_routes(routes: List[SwapRoute]):
-    max_routes = 999
-    max_online = 5
+    max_routes = EVALUATED_MAX_ROUTES
+    max_online = EVALUATED_MAX_ONLINE_ROUTES
     nb_online = 0
 
     res = []
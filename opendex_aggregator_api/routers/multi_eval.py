@@ -8,6 +8,7 @@ from opendex_aggregator_api.routers.adapters import adapt_static_eval
 from opendex_aggregator_api.routers.api_models import (
     StaticRouteSwapEvaluationOut, TokenIdAndAmount)
 from opendex_aggregator_api.routers.common import get_or_find_sorted_routes
+from opendex_aggregator_api.services import evaluation_processes
 from opendex_aggregator_api.services import evaluations as eval_svc
 
 router = APIRouter()
@@ -15,7 +16,8 @@ router = APIRouter()
 
 @router.post("/multi-eval")
 async def post_multi_eval(token_out: str,
-                          token_and_amounts: List[TokenIdAndAmount]) -> List[StaticRouteSwapEvaluationOut]:
+                          token_and_amounts: List[TokenIdAndAmount],
+                          exhaustive: bool = False) -> List[StaticRouteSwapEvaluationOut]:
 
     if len(token_and_amounts) < 0 or len(token_and_amounts) > 10:
         raise HTTPException(status_code=400,
@@ -29,7 +31,7 @@ async def post_multi_eval(token_out: str,
     if token_out_obj is None:
         raise HTTPException(status_code=404)
 
-    evals = [_eval(token_and_amount, token_out)
+    evals = [await _eval(token_and_amount, token_out, exhaustive)
              for token_and_amount in token_and_amounts]
 
     tokens_in_objs = [next((t for t in all_tokens if t.identifier == token_and_amount.token_id),
@@ -41,18 +43,20 @@ async def post_multi_eval(token_out: str,
             if e is not None]
 
 
-def _eval(token_and_amount: TokenIdAndAmount, token_out: str) -> Optional[SwapEvaluation]:
+async def _eval(token_and_amount: TokenIdAndAmount,
+                token_out: str,
+                exhaustive: bool) -> Optional[SwapEvaluation]:
     routes = get_or_find_sorted_routes(token_and_amount.token_id,
                                        token_out,
-                                       max_hops=3)
+                                       max_hops=3,
+                                       exhaustive=exhaustive)
 
-    pools_cache = {}
+    routes = [r for r in routes if eval_svc.can_evaluate_offline(r)]
 
-    evals = (eval_svc.evaluate_fixed_input_offline(r,
-                                                   int(token_and_amount.amount),
-                                                   pools_cache)
-             for r in routes
-             if eval_svc.can_evaluate_offline(r))
+    evals = await evaluation_processes.evaluate_fixed_input_offline(routes,
+                                                                    int(token_and_amount.amount),
+                                                                    True,
+                                                                    {})
 
     evals = (e for e in evals if e is not None)
 
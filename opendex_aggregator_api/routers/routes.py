@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter, HTTPException, Query
 
@@ -13,7 +13,12 @@ router = APIRouter()
 @router.get('/routes')
 def get_routes(token_in: str,
                token_out: str,
-               max_hops: int = Query(default=3, ge=1, le=4)) -> List[SwapRouteOut]:
+               max_hops: int = Query(default=3, ge=1, le=4),
+               exhaustive: Optional[bool] = True) -> List[SwapRouteOut]:
+    """
+    Return all routes of the pair, or only the best ones (by expected
+    output) if +exhaustive+ is false.
+    """
     if token_in in IGNORED_TOKENS or token_out in IGNORED_TOKENS:
         raise HTTPException(status_code=400,
                             detail='Invalid input or output token')
@@ -21,4 +26,5 @@ def get_routes(token_in: str,
     return [adapt_route(r)
             for r in get_or_find_sorted_routes(token_in,
                                                token_out,
-                                               max_hops)]
+                                               max_hops,
+                                               exhaustive=exhaustive)]
@@ -0,0 +1,95 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from opendex_aggregator_api.pools.model import SwapEvaluation, SwapRoute
+from opendex_aggregator_api.services import evaluations as eval_svc
+from opendex_aggregator_api.utils.env import evaluation_processes
+
+_EXECUTOR: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    """
+    Process pool of the worker (None if EVALUATION_PROCESSES is 0).
+
+    Processes are spawned (the worker runs sync threads) and keep their own
+    pool snapshot cache between tasks.
+    """
+    global _EXECUTOR
+
+    nb_processes = evaluation_processes()
+
+    if nb_processes <= 0:
+        return None
+
+    if _EXECUTOR is None:
+        _EXECUTOR = ProcessPoolExecutor(max_workers=nb_processes,
+                                        mp_context=multiprocessing.get_context('spawn'))
+
+    return _EXECUTOR
+
+
+def shutdown():
+    """
+    Stop the processes of the pool (if started), cancelling pending tasks.
+    """
+    global _EXECUTOR
+
+    if _EXECUTOR is not None:
+        _EXECUTOR.shutdown(wait=True, cancel_futures=True)
+        _EXECUTOR = None
+
+
+async def run(function_: Callable[..., Any], *args) -> Any:
+    """
+    Run a CPU-bound function in the process pool, or in the event loop if
+    the process pool is disabled.
+    """
+    executor = _get_executor()
+
+    if executor is None:
+        return function_(*args)
+
+    return await asyncio.get_running_loop().run_in_executor(executor,
+                                                            function_,
+                                                            *args)
+
+
+async def evaluate_fixed_input_offline(routes: List[SwapRoute],
+                                       amount_in: int,
+                                       prune: bool,
+                                       pools_cache: dict) -> List[Optional[SwapEvaluation]]:
+    """
+    Evaluate offline +routes+ (results in the same order), in batches spread
+    across the process pool when enabled (+pools_cache+ is used otherwise).
+    """
+    executor = _get_executor()
+
+    if executor is None:
+        return eval_svc.evaluate_fixed_input_offline_batch(routes,
+                                                           amount_in,
+                                                           prune,
+                                                           pools_cache)
+
+    nb_batches = min(len(routes), evaluation_processes())
+
+    if nb_batches == 0:
+        return []
+
+    # interleaved batches: best routes (and bounds) are spread across processes
+    batches = [routes[i::nb_batches] for i in range(nb_batches)]
+
+    results = await asyncio.gather(*[run(eval_svc.evaluate_fixed_input_offline_batch,
+                                         batch,
+                                         amount_in,
+                                         prune)
+                                     for batch in batches])
+
+    evals: List[Optional[SwapEvaluation]] = [None] * len(routes)
+
+    for i, batch_evals in enumerate(results):
+        evals[i::nb_batches] = batch_evals
+
+    return evals
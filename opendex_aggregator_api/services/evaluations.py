@@ -1,34 +1,87 @@
 
+import asyncio
+import heapq
 import logging
 from time import time
-from typing import List, Mapping, Optional, Tuple
+from typing import (Callable, Dict, Iterable, List, Mapping, NamedTuple,
+                    Optional, Tuple)
 
 import aiohttp
+from cachetools import LRUCache
 
 from opendex_aggregator_api.data.constants import SC_TYPE_JEXCHANGE_ORDERBOOK
 from opendex_aggregator_api.data.datastore import get_dex_aggregator_pool
 from opendex_aggregator_api.pools.model import (DynamicRoutingSwapEvaluation,
-                                                SwapEvaluation, SwapRoute)
-from opendex_aggregator_api.pools.pools import AbstractPool
+                                                SwapEvaluation, SwapHop,
+                                                SwapRoute)
+from opendex_aggregator_api.pools.pools import AbstractPool, PriceImpactCurve
 from opendex_aggregator_api.services.externals import async_sc_query
 from opendex_aggregator_api.services.parsers.routing import \
     parse_evaluate_response
+from opendex_aggregator_api.services.pool_states import (get_pool_curves,
+                                                         get_pool_version,
+                                                         get_pools)
 from opendex_aggregator_api.services.tokens import get_or_fetch_token
 from opendex_aggregator_api.utils.env import sc_address_aggregator
+from opendex_aggregator_api.utils.math import ceildiv
 
 FEE_MULTIPLIER = 50  # 0.05%
 MAX_FEE = 100_000
 
+EVALUATIONS_CACHE_SIZE = 50_000
+
+ONLINE_EVALUATIONS_CONCURRENCY = 4
+ONLINE_EVALUATIONS_TIMEOUT = 3.0  # seconds
+
+UPPER_BOUND_PROBE_DIVISOR = 1_000
+UPPER_BOUND_ROUNDING_MARGIN = 2
+
+SCREENING_NB_FINALISTS = 10
+
+DYN_ROUTING_SPLIT_PRECISION = 10_000
+# marginal output of the split probed first at +/- 1 / divisor of its
+# estimation from the price impact curves
+DYN_ROUTING_MARGINAL_HINT_DIVISOR = 20
+
+DYN_ROUTING_FLOW_NB_ROUTES = 10
+DYN_ROUTING_FLOW_MAX_PATHS = 100
+DYN_ROUTING_FLOW_NB_SUB_AMOUNTS = 50
+# fewer sub-amounts for many paths: at most about this many path simulations
+DYN_ROUTING_FLOW_MAX_SIMULATIONS = 1_000
+
+# orderbooks are simulated from the depth sampled by the sync task, or
+# evaluated online when the snapshot has no depth for them
+SAMPLED_DEPTH_SC_TYPES = [SC_TYPE_JEXCHANGE_ORDERBOOK]
+
+
+class _HopState(NamedTuple):
+    amount: int
+    fee_amount: int
+    fee_token: Optional[str]
+    theorical_amount: int
+    estimated_gas: int
+
+
+_EVALUATIONS_CACHE = LRUCache(maxsize=EVALUATIONS_CACHE_SIZE)
+_NOT_CACHED = object()
+
+
+# (sc_address, token_in, token_out) -> (state after the hop, next hops)
+RoutePrefixes = Dict[Tuple[str, str, str],
+                     Tuple[Optional[_HopState], 'RoutePrefixes']]
+
 
 async def evaluate_fixed_input(route: SwapRoute,
                                amount_in: int,
                                pools_cache: Mapping[Tuple[str, str, str], AbstractPool],
-                               http_client: aiohttp.ClientSession) -> Optional[SwapEvaluation]:
+                               http_client: aiohttp.ClientSession,
+                               prefixes: Optional[RoutePrefixes] = None) -> Optional[SwapEvaluation]:
 
     if can_evaluate_offline(route):
         return evaluate_fixed_input_offline(route,
                                             amount_in,
-                                            pools_cache)
+                                            pools_cache,
+                                            prefixes=prefixes)
     else:
         return await evaluate_fixed_input_online(amount_in,
                                                  route,
@@ -48,94 +101,493 @@ async def evaluate_fixed_output(route: SwapRoute,
         raise ValueError('Cannot evaluate fixed output (online)')
 
 
-def evaluate_fixed_input_offline(route: SwapRoute,
-                                 amount_in: int,
-                                 pools_cache: Mapping[Tuple[str, str, str], AbstractPool],
-                                 update_reserves: bool = False) -> Optional[SwapEvaluation]:
-    token = route.token_in
-    amount = amount_in
-    fee_amount = 0
-    fee_token = None
-    estimated_gas = 10_000_000
-    theorical_amount = amount_in
+def preload_pools(routes: Iterable[SwapRoute],
+                  pools_cache: Mapping[Tuple[str, str, str], AbstractPool]):
+    '''
+    Load the pools of the hops of +routes+ missing in +pools_cache+ from the
+    worker snapshot, fetching unknown ones in a single read (unknown pools
+    are cached as None).
+    '''
+    keys = {(hop.pool.sc_address, hop.token_in, hop.token_out)
+            for route in routes
+            for hop in route.hops}
 
-    for hop in route.hops:
+    missing_keys = [k for k in keys if k not in pools_cache]
+
+    if len(missing_keys) > 0:
+        pools_cache.update(get_pools(missing_keys))
+
+
+def evaluate_fixed_input_offline_batch(routes: List[SwapRoute],
+                                       amount_in: int,
+                                       prune: bool,
+                                       pools_cache: Optional[Mapping[Tuple[str, str, str], AbstractPool]] = None) -> List[Optional[SwapEvaluation]]:
+    '''
+    Evaluate offline +routes+ (results in the same order, None on error).
+
+    :prune: evaluate first the +SCREENING_NB_FINALISTS+ best routes according
+    to a float approximation (see +screening_estimates+), then the others by
+    decreasing upper bound and skip (None) the ones whose bound is below the
+    best output found
+    :pools_cache: default: pools of the worker snapshot
+    '''
+    if pools_cache is None:
+        pools_cache = {}
+
+    preload_pools(routes, pools_cache)
+
+    prefixes: RoutePrefixes = {}
+
+    def _evaluate(route: SwapRoute) -> Optional[SwapEvaluation]:
         try:
-            if hop.token_in != token:
-                raise ValueError(f'Invalid input token [{hop.token_in}]')
+            return evaluate_fixed_input_offline(route,
+                                                amount_in,
+                                                pools_cache,
+                                                prefixes=prefixes)
+        except:
+            logging.exception('Error during evaluation')
+            return None
+
+    if not prune:
+        return [_evaluate(r) for r in routes]
+
+    evals: List[Optional[SwapEvaluation]] = [None] * len(routes)
+
+    best_amount_out = 0
+    nb_evaluated = 0
+
+    estimates = screening_estimates(routes, amount_in, pools_cache)
+
+    finalists = sorted((i for i, e in enumerate(estimates) if e is not None),
+                       key=lambda i: -estimates[i])[:SCREENING_NB_FINALISTS]
+
+    for i in finalists:
+        evals[i] = _evaluate(routes[i])
+        nb_evaluated += 1
+
+        if evals[i] is not None:
+            best_amount_out = max(best_amount_out, evals[i].net_amount_out)
+
+    screened = set(finalists)
+
+    bounds = fixed_input_upper_bounds(routes, amount_in, pools_cache)
+
+    # routes without bound first
+    sorted_bounds = sorted(((b, i) for i, b in enumerate(bounds) if i not in screened),
+                           key=lambda x: (x[0] is not None, -(x[0] or 0)))
+
+    for bound, i in sorted_bounds:
+        if bound is not None and bound < best_amount_out:
+            break
+
+        evals[i] = _evaluate(routes[i])
+        nb_evaluated += 1
+
+        if evals[i] is not None:
+            best_amount_out = max(best_amount_out, evals[i].net_amount_out)
+
+    logging.info(f'{nb_evaluated}/{len(routes)} offline routes evaluated')
+
+    return evals
+
+
+def screening_estimates(routes: List[SwapRoute],
+                        amount_in: int,
+                        pools_cache: Mapping[Tuple[str, str, str], AbstractPool]) -> List[Optional[float]]:
+    '''
+    Approximate outputs of +routes+ for +amount_in+, interpolated from the
+    price impact curves of the snapshot or else computed with floats from the
+    screening curves of the pools (None if a pool has neither).
+
+    Estimates are only used to choose which routes to evaluate first: they
+    are neither exact nor bounds.
+    '''
+    price_impact_curves = get_pool_curves((hop.pool.sc_address,
+                                           hop.token_in,
+                                           hop.token_out)
+                                          for route in routes
+                                          for hop in route.hops)
+
+    curves: Dict[Tuple[str, str, str], Optional[Tuple[float, float]]] = {}
+
+    def _curve(hop: SwapHop) -> Optional[Tuple[float, float]]:
+        pool_cache_key = (hop.pool.sc_address,
+                          hop.token_in,
+                          hop.token_out)
+
+        if pool_cache_key not in curves:
+            pool = pools_cache.get(pool_cache_key, None)
+
+            curves[pool_cache_key] = pool.screening_curve(get_or_fetch_token(hop.token_in),
+                                                          get_or_fetch_token(hop.token_out)) \
+                if pool is not None else None
+
+        return curves[pool_cache_key]
+
+    def _estimate(route: SwapRoute) -> Optional[float]:
+        amount = float(amount_in)
+
+        for hop in route.hops:
+            price_impact_curve = price_impact_curves[(hop.pool.sc_address,
+                                                      hop.token_in,
+                                                      hop.token_out)]
+
+            if price_impact_curve is not None:
+                amount_out = price_impact_curve.estimate_amount_out(int(amount))
+
+                if amount_out is not None:
+                    amount = float(amount_out)
+                    continue
+
+            curve = _curve(hop)
+
+            if curve is None:
+                return None
+
+            rate, depth = curve
+            amount = rate * amount / (1 + amount / depth)
+
+        return amount
+
+    return [_estimate(r) for r in routes]
+
+
+def fixed_input_upper_bounds(routes: List[SwapRoute],
+                             amount_in: int,
+                             pools_cache: Mapping[Tuple[str, str, str], AbstractPool]) -> List[Optional[int]]:
+    '''
+    Optimistic outputs of +routes+ for +amount_in+ (None if unknown).
+
+    Outputs of pools are concave: for an amount a >= e, the output of a pool
+    is at most a * output(e) / e. Each pool is probed once with a small
+    amount e (rounding is covered by a margin of a few units per hop).
+    '''
+    probes: Dict[Tuple[str, str, str], Optional[Tuple[int, int]]] = {}
+
+    def _probe(hop: SwapHop) -> Optional[Tuple[int, int]]:
+        pool_cache_key = (hop.pool.sc_address,
+                          hop.token_in,
+                          hop.token_out)
+
+        if pool_cache_key not in probes:
+            probes[pool_cache_key] = None
+
+            pool = pools_cache.get(pool_cache_key, None)
+
+            if pool is not None:
+                esdt_in = get_or_fetch_token(hop.token_in)
+                esdt_out = get_or_fetch_token(hop.token_out)
+                amount = max(1, 10**esdt_in.decimals // UPPER_BOUND_PROBE_DIVISOR)
+
+                try:
+                    amount_out, _, _ = pool.estimate_amount_out(esdt_in,
+                                                                amount,
+                                                                esdt_out)
+                    probes[pool_cache_key] = (amount, amount_out)
+                except ValueError:
+                    pass
+
+        return probes[pool_cache_key]
+
+    def _bound(route: SwapRoute) -> Optional[int]:
+        amount = amount_in
+
+        for hop in route.hops:
+            probe = _probe(hop)
+
+            if probe is None:
+                return None
+
+            probe_amount_in, probe_amount_out = probe
+            probe_amount_out += UPPER_BOUND_ROUNDING_MARGIN
+
+            if amount <= probe_amount_in:
+                amount = probe_amount_out
+            else:
+                amount = ceildiv(amount * probe_amount_out, probe_amount_in) \
+                    + UPPER_BOUND_ROUNDING_MARGIN
 
-            pool_cache_key = (hop.pool.sc_address,
+        return amount
+
+    return [_bound(r) for r in routes]
+
+
+def evaluate_fixed_input_offline(route: SwapRoute,
+                                 amount_in: int,
+                                 pools_cache: Mapping[Tuple[str, str, str], AbstractPool],
+                                 update_reserves: bool = False,
+                                 prefixes: Optional[RoutePrefixes] = None) -> Optional[SwapEvaluation]:
+    '''
+    :prefixes: trie of the route prefixes already evaluated with the same
+    +amount_in+ (and the same pools), shared by the routes of a batch so that
+    common hops are estimated once (ignored when updating reserves)
+    '''
+    return _cached_evaluation('in',
+                              route,
+                              amount_in,
+                              pools_cache,
+                              update_reserves,
+                              lambda: _evaluate_fixed_input_offline(route,
+                                                                    amount_in,
+                                                                    pools_cache,
+                                                                    update_reserves,
+                                                                    prefixes))
+
+
+def evaluate_fixed_input_indicative(routes: List[SwapRoute],
+                                    amount_in: int) -> List[Optional[SwapEvaluation]]:
+    '''
+    Indicative evaluations of +routes+ (results in the same order), computed
+    from the price impact curves of the snapshot without simulating pools.
+
+    Routes with a pool without curve, or with an amount above the sampled
+    ones, are not evaluated (None).
+    '''
+    curves = get_pool_curves((hop.pool.sc_address,
                               hop.token_in,
                               hop.token_out)
-            pool = pools_cache.get(pool_cache_key, None)
+                             for route in routes
+                             for hop in route.hops)
 
-            if pool is None:
-                pool = get_dex_aggregator_pool(hop.pool.sc_address,
-                                               hop.token_in,
-                                               hop.token_out)
+    def _evaluate(route: SwapRoute) -> Optional[SwapEvaluation]:
+        amount = amount_in
+        theorical_amount = amount_in
+        fee_amount = 0
+        fee_token = None
+        estimated_gas = 10_000_000
 
-            if pool is None:
-                raise ValueError(
-                    f'Unknown pool [{hop.pool.sc_address}] [{hop.token_in}] [{hop.token_out}]')
+        for hop in route.hops:
+            curve = curves[(hop.pool.sc_address,
+                            hop.token_in,
+                            hop.token_out)]
 
-            pool = pool.deep_copy()
-            pools_cache[pool_cache_key] = pool
+            if curve is None:
+                return None
 
+            # same fees as the offline evaluations
             if hop.token_in.startswith('WEGLD-'):
                 fee_amount = amount * FEE_MULTIPLIER // MAX_FEE
                 fee_token = hop.token_in
                 amount -= fee_amount
                 theorical_amount -= fee_amount
 
-            esdt_in = get_or_fetch_token(hop.token_in)
-            esdt_out = get_or_fetch_token(hop.token_out)
+            amount = curve.estimate_amount_out(amount)
 
-            amount_out, admin_fee_in, admin_fee_out = pool.estimate_amount_out(esdt_in,
-                                                                               amount,
-                                                                               esdt_out)
+            if amount is None:
+                return None
 
-            theorical_amount = pool.estimate_theorical_amount_out(esdt_in,
-                                                                  theorical_amount,
-                                                                  esdt_out)
+            theorical_amount = curve.estimate_theorical_amount_out(theorical_amount)
+            estimated_gas += curve.estimated_gas
 
-            if update_reserves:
-                pool.update_reserves(esdt_in,
-                                     amount - admin_fee_in,
-                                     esdt_out,
-                                     amount_out + admin_fee_out)
+        if fee_amount == 0:
+            fee_amount = amount * FEE_MULTIPLIER // MAX_FEE
+            fee_token = route.token_out
+            amount -= fee_amount
 
-            amount = amount_out
-        except ValueError as e:
+        return SwapEvaluation(amount_in=amount_in,
+                              estimated_gas=estimated_gas,
+                              fee_amount=fee_amount,
+                              fee_token=fee_token,
+                              net_amount_out=amount,
+                              route=route,
+                              theorical_amount_out=theorical_amount)
+
+    return [_evaluate(r) for r in routes]
+
+
+def _evaluate_fixed_input_offline(route: SwapRoute,
+                                  amount_in: int,
+                                  pools_cache: Mapping[Tuple[str, str, str], AbstractPool],
+                                  update_reserves: bool,
+                                  prefixes: Optional[RoutePrefixes]) -> Optional[SwapEvaluation]:
+    token = route.token_in
+    state = _HopState(amount=amount_in,
+                      fee_amount=0,
+                      fee_token=None,
+                      theorical_amount=amount_in,
+                      estimated_gas=10_000_000)
+
+    if update_reserves:
+        prefixes = None
+
+    for hop in route.hops:
+        if hop.token_in != token:
             logging.info('Error during estimation for this route -> abort')
             return None
 
-        token = hop.token_out
+        if prefixes is None:
+            state = _estimate_hop_fixed_input(hop,
+                                              state,
+                                              pools_cache,
+                                              update_reserves)
+        else:
+            prefix_key = (hop.pool.sc_address,
+                          hop.token_in,
+                          hop.token_out)
+            node = prefixes.get(prefix_key, None)
+
+            if node is None:
+                node = (_estimate_hop_fixed_input(hop,
+                                                  state,
+                                                  pools_cache,
+                                                  update_reserves),
+                        {})
+                prefixes[prefix_key] = node
 
-        if pool:
-            estimated_gas += pool.estimated_gas()
+            state, prefixes = node
+
+        if state is None:
+            return None
+
+        token = hop.token_out
 
     if token != route.token_out:
         raise ValueError(
             f'Invalid output token after swaps [{token}] != [{route.token_out}]')
 
+    amount = state.amount
+    fee_amount = state.fee_amount
+    fee_token = state.fee_token
+
     if fee_amount == 0:
         fee_amount = amount * FEE_MULTIPLIER // MAX_FEE
         fee_token = token
         amount -= fee_amount
 
     return SwapEvaluation(amount_in=amount_in,
-                          estimated_gas=estimated_gas,
+                          estimated_gas=state.estimated_gas,
                           fee_amount=fee_amount,
                           fee_token=fee_token,
                           net_amount_out=amount,
                           route=route,
-                          theorical_amount_out=theorical_amount)
+                          theorical_amount_out=state.theorical_amount)
+
+
+def _cached_evaluation(direction: str,
+                       route: SwapRoute,
+                       amount: int,
+                       pools_cache: Mapping[Tuple[str, str, str], AbstractPool],
+                       update_reserves: bool,
+                       evaluate: Callable[[], Optional[SwapEvaluation]]) -> Optional[SwapEvaluation]:
+    '''
+    Evaluations are cached by route hops, amount and versions of the pools of
+    the route, when all pools are snapshot pools (not updated by the request).
+    A re-synced pool has a new version, so its evaluations are not reused.
+
+    Failed evaluations (None) are not cached: they may come from a transient
+    error (missing token, pool read during a sync).
+    '''
+    if update_reserves:
+        return evaluate()
+
+    cache_key = [direction, amount]
+
+    for hop in route.hops:
+        pool_cache_key = (hop.pool.sc_address,
+                          hop.token_in,
+                          hop.token_out)
+        version = get_pool_version(pool_cache_key,
+                                   pools_cache.get(pool_cache_key, None))
+
+        if version is None:
+            return evaluate()
+
+        cache_key.append((pool_cache_key, version))
+
+    cache_key = tuple(cache_key)
+
+    evaluation = _EVALUATIONS_CACHE.get(cache_key, _NOT_CACHED)
+
+    if evaluation is _NOT_CACHED:
+        evaluation = evaluate()
+
+        if evaluation is not None:
+            _EVALUATIONS_CACHE[cache_key] = evaluation
+
+    if evaluation is None or evaluation.route is route:
+        return evaluation
+
+    return evaluation.model_copy(update={'route': route})
+
+
+def _estimate_hop_fixed_input(hop: SwapHop,
+                              state: _HopState,
+                              pools_cache: Mapping[Tuple[str, str, str], AbstractPool],
+                              update_reserves: bool) -> Optional[_HopState]:
+    amount = state.amount
+    fee_amount = state.fee_amount
+    fee_token = state.fee_token
+    theorical_amount = state.theorical_amount
+
+    try:
+        pool_cache_key = (hop.pool.sc_address,
+                          hop.token_in,
+                          hop.token_out)
+        if pool_cache_key in pools_cache:
+            pool = pools_cache[pool_cache_key]
+        else:
+            pool = get_dex_aggregator_pool(hop.pool.sc_address,
+                                           hop.token_in,
+                                           hop.token_out)
+
+        if pool is None:
+            raise ValueError(
+                f'Unknown pool [{hop.pool.sc_address}] [{hop.token_in}] [{hop.token_out}]')
+
+        pools_cache[pool_cache_key] = pool
+
+        if hop.token_in.startswith('WEGLD-'):
+            fee_amount = amount * FEE_MULTIPLIER // MAX_FEE
+            fee_token = hop.token_in
+            amount -= fee_amount
+            theorical_amount -= fee_amount
+
+        esdt_in = get_or_fetch_token(hop.token_in)
+        esdt_out = get_or_fetch_token(hop.token_out)
+
+        amount_out, admin_fee_in, admin_fee_out = pool.estimate_amount_out(esdt_in,
+                                                                           amount,
+                                                                           esdt_out)
+
+        theorical_amount = pool.estimate_theorical_amount_out(esdt_in,
+                                                              theorical_amount,
+                                                              esdt_out)
+
+        if update_reserves:
+            pools_cache[pool_cache_key] = pool.with_updated_reserves(esdt_in,
+                                                                     amount - admin_fee_in,
+                                                                     esdt_out,
+                                                                     amount_out + admin_fee_out)
+    except ValueError as e:
+        logging.info('Error during estimation for this route -> abort')
+        return None
+
+    return _HopState(amount=amount_out,
+                     fee_amount=fee_amount,
+                     fee_token=fee_token,
+                     theorical_amount=theorical_amount,
+                     estimated_gas=state.estimated_gas + pool.estimated_gas())
 
 
 def evaluate_fixed_output_offline(route: SwapRoute,
                                   net_amount_out: int,
                                   pools_cache: Mapping[Tuple[str, str, str], AbstractPool],
                                   update_reserves: bool = False) -> Optional[SwapEvaluation]:
+    return _cached_evaluation('out',
+                              route,
+                              net_amount_out,
+                              pools_cache,
+                              update_reserves,
+                              lambda: _evaluate_fixed_output_offline(route,
+                                                                     net_amount_out,
+                                                                     pools_cache,
+                                                                     update_reserves))
+
+
+def _evaluate_fixed_output_offline(route: SwapRoute,
+                                   net_amount_out: int,
+                                   pools_cache: Mapping[Tuple[str, str, str], AbstractPool],
+                                   update_reserves: bool) -> Optional[SwapEvaluation]:
     token = route.token_out
     amount = net_amount_out
     fee_amount = 0
@@ -150,9 +602,9 @@ def evaluate_fixed_output_offline(route: SwapRoute,
         pool_cache_key = (hop.pool.sc_address,
                           hop.token_in,
                           hop.token_out)
-        pool = pools_cache.get(pool_cache_key, None)
-
-        if pool is None:
+        if pool_cache_key in pools_cache:
+            pool = pools_cache[pool_cache_key]
+        else:
             pool = get_dex_aggregator_pool(hop.pool.sc_address,
                                            hop.token_in,
                                            hop.token_out)
@@ -161,7 +613,6 @@ def evaluate_fixed_output_offline(route: SwapRoute,
             raise ValueError(
                 f'Unknown pool [{hop.pool.sc_address}] [{hop.token_in}] [{hop.token_out}]')
 
-        pool = pool.deep_copy()
         pools_cache[pool_cache_key] = pool
 
         if hop.token_out.startswith('WEGLD-'):
@@ -184,10 +635,10 @@ def evaluate_fixed_output_offline(route: SwapRoute,
             #                                                       esdt_out)
 
             if update_reserves:
-                pool.update_reserves(esdt_in,
-                                     amount_in - admin_fee_in,
-                                     esdt_out,
-                                     amount + admin_fee_out)
+                pools_cache[pool_cache_key] = pool.with_updated_reserves(esdt_in,
+                                                                         amount_in - admin_fee_in,
+                                                                         esdt_out,
+                                                                         amount + admin_fee_out)
 
             amount = amount_in
         except ValueError as e:
@@ -231,6 +682,12 @@ async def evaluate_fixed_input_online(amount_in: int,
                                       sc_address=sc_address,
                                       function='evaluateRoute',
                                       args=args)
+    except asyncio.CancelledError:
+        # dropped by the caller (see evaluate_fixed_input_online_batch)
+        raise
+    except asyncio.TimeoutError:
+        logging.info('Timeout during evaluation')
+        return None
     except:
         logging.exception('Error during evaluation')
         return None
@@ -252,6 +709,62 @@ async def evaluate_fixed_input_online(amount_in: int,
     return None
 
 
+async def evaluate_fixed_input_online_batch(routes: List[SwapRoute],
+                                            amount_in: int,
+                                            http_client: aiohttp.ClientSession,
+                                            timeout: float = ONLINE_EVALUATIONS_TIMEOUT) -> List[Optional[SwapEvaluation]]:
+    '''
+    Evaluate +routes+ with the aggregator SC (results in the same order).
+
+    Identical routes are queried once and at most
+    +ONLINE_EVALUATIONS_CONCURRENCY+ queries are in flight at the same time.
+    Evaluations not done after +timeout+ seconds are cancelled (None), so a
+    slow gateway cannot hold the caller.
+    '''
+    if len(routes) == 0:
+        return []
+
+    semaphore = asyncio.Semaphore(ONLINE_EVALUATIONS_CONCURRENCY)
+
+    async def _evaluate(route: SwapRoute) -> Optional[SwapEvaluation]:
+        async with semaphore:
+            return await evaluate_fixed_input_online(amount_in,
+                                                     route,
+                                                     http_client)
+
+    tasks: Dict[bytes, asyncio.Task] = {}
+    route_tasks: List[asyncio.Task] = []
+
+    for route in routes:
+        payload = route.serialize()
+
+        if payload not in tasks:
+            tasks[payload] = asyncio.ensure_future(_evaluate(route))
+
+        route_tasks.append(tasks[payload])
+
+    _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+
+    for task in pending:
+        task.cancel()
+
+    if len(pending) > 0:
+        logging.info(
+            f'Online evaluations: {len(pending)}/{len(tasks)} dropped after {timeout} seconds')
+
+    evals: List[Optional[SwapEvaluation]] = []
+
+    for route, task in zip(routes, route_tasks):
+        if task in pending or task.exception() is not None:
+            evals.append(None)
+        elif task.result() is not None and task.result().route is not route:
+            evals.append(task.result().model_copy(update={'route': route}))
+        else:
+            evals.append(task.result())
+
+    return evals
+
+
 def find_best_dynamic_routing_algo1(single_route_evaluations: List[SwapEvaluation],
                                     amount_in: int) -> Optional[DynamicRoutingSwapEvaluation]:
     if len(single_route_evaluations) < 2:
@@ -372,45 +885,19 @@ async def find_best_dynamic_routing_algo3(routes: List[SwapRoute],
 
     pools_cache: Mapping[Tuple[str, str, str], AbstractPool] = {}
 
-    amount_per_route: Mapping[SwapRoute, int] = {}
+    preload_pools(offline_routes, pools_cache)
 
-    for amount in amounts:
-        if len(amount_per_route) >= max_routes:
-            route_candidates = amount_per_route.keys()
-        else:
-            route_candidates = offline_routes
+    # pools are copied on write: initial states stay available for the verifications
+    initial_pools = dict(pools_cache)
 
-        evals = [evaluate_fixed_input_offline(r,
-                                              amount,
-                                              pools_cache) for r in route_candidates]
+    amount_per_route = _split_greedily(offline_routes,
+                                       amounts,
+                                       pools_cache,
+                                       max_routes,
+                                       disjointed=True)
 
-        evals = [e for e in evals if e is not None]
-
-        evals = sorted(evals,
-                       key=lambda x: x.net_amount_out,
-                       reverse=True)
-
-        best_eval = next((e for e in evals
-                          if e
-                          and  # first eval
-                          len(amount_per_route) == 0
-                          or  # known route
-                          e.route in amount_per_route
-                          or  # new route (disjointed from known routes)
-                          all((e.route.is_disjointed(r)
-                              for r in amount_per_route.keys()))
-                          ))
-
-        evaluate_fixed_input_offline(best_eval.route,
-                                     amount,
-                                     pools_cache,
-                                     update_reserves=True)
-
-        amount_of_route = amount_per_route.get(best_eval.route, 0)
-
-        amount_of_route += amount
-
-        amount_per_route[best_eval.route] = amount_of_route
+    if amount_per_route is None:
+        return None
 
     pools_cache.clear()
 
@@ -428,7 +915,7 @@ async def find_best_dynamic_routing_algo3(routes: List[SwapRoute],
         #         print(f'Route: {[h.pool.name for h in route.hops]}')
         #         print(f'Amount: {amount}')
 
-        eval = evaluate_fixed_input_offline(route, amount, {})
+        eval = evaluate_fixed_input_offline(route, amount, dict(initial_pools))
 
     #         print(f'Amount out (offline): {eval.net_amount_out}')
     #         print(f'Fee (offline): {eval.fee_amount} {eval.fee_token}')
@@ -475,6 +962,444 @@ async def find_best_dynamic_routing_algo3(routes: List[SwapRoute],
                                         token_out=evals[0].route.token_out)
 
 
+def _split_greedily(routes: List[SwapRoute],
+                    amounts: List[int],
+                    pools_cache: Mapping[Tuple[str, str, str], AbstractPool],
+                    max_routes: int,
+                    disjointed: bool) -> Optional[Mapping[SwapRoute, int]]:
+    '''
+    Assign each amount to the route with the best output for it, updating
+    the reserves of +pools_cache+ along the chosen route.
+
+    :max_routes: maximum number of routes used
+    :disjointed: only combine routes that share no pool
+    :return: amount per route (None if an amount can not be assigned)
+    '''
+    amount_per_route: Mapping[SwapRoute, int] = {}
+
+    # outputs of the next amount per route, updated only for the routes
+    # reading a pool updated by the last assignment
+    pool_keys = [{(h.pool.sc_address, h.token_in, h.token_out) for h in r.hops}
+                 for r in routes]
+    routes_per_pool_key: Dict[Tuple[str, str, str], List[int]] = {}
+    for i, keys in enumerate(pool_keys):
+        for key in keys:
+            routes_per_pool_key.setdefault(key, []).append(i)
+
+    evals: List[Optional[SwapEvaluation]] = [None] * len(routes)
+    versions = [0] * len(routes)
+    discarded = [False] * len(routes)
+    heap: List[Tuple[int, int, int]] = []
+
+    def _evaluate(indexes: Iterable[int], amount: int):
+        prefixes: RoutePrefixes = {}
+        for i in indexes:
+            if discarded[i]:
+                continue
+            versions[i] += 1
+            evals[i] = evaluate_fixed_input_offline(routes[i],
+                                                    amount,
+                                                    pools_cache,
+                                                    prefixes=prefixes)
+            if evals[i] is not None:
+                heapq.heappush(heap,
+                               (-evals[i].net_amount_out, i, versions[i]))
+
+    def _is_candidate(route: SwapRoute) -> bool:
+        if route in amount_per_route:
+            return True
+        if len(amount_per_route) >= max_routes:
+            return False
+        # new route (disjointed from known routes)
+        return not disjointed \
+            or all((route.is_disjointed(r) for r in amount_per_route.keys()))
+
+    previous_amount = None
+
+    for amount in amounts:
+        if amount != previous_amount:
+            heap.clear()
+            _evaluate(range(len(routes)), amount)
+            previous_amount = amount
+
+        best_eval = None
+
+        while len(heap) > 0:
+            _, best_index, version = heap[0]
+
+            if version != versions[best_index]:
+                heapq.heappop(heap)
+            elif not _is_candidate(routes[best_index]):
+                # known routes only grow: the route is never a candidate again
+                heapq.heappop(heap)
+                discarded[best_index] = True
+            else:
+                best_eval = evals[best_index]
+                break
+
+        if best_eval is None:
+            return None
+
+        evaluate_fixed_input_offline(best_eval.route,
+                                     amount,
+                                     pools_cache,
+                                     update_reserves=True)
+
+        amount_of_route = amount_per_route.get(best_eval.route, 0)
+
+        amount_of_route += amount
+
+        amount_per_route[best_eval.route] = amount_of_route
+
+        _evaluate({i
+                   for key in pool_keys[best_index]
+                   for i in routes_per_pool_key[key]},
+                  amount)
+
+    return amount_per_route
+
+
+def find_best_dynamic_routing_algo4(single_route_evaluations: List[SwapEvaluation],
+                                    amount_in: int,
+                                    max_routes: int) -> Optional[DynamicRoutingSwapEvaluation]:
+    '''
+    Split +amount_in+ across the best disjointed routes so that their marginal
+    outputs are equal (optimal split, outputs being concave).
+
+    Routes whose marginal output at 0 stays below the common marginal output
+    get nothing, so the number of routes (up to +max_routes+) is adaptive.
+
+    :single_route_evaluations: evaluations of the whole amount, sorted by output
+    '''
+    start = time()
+
+    routes: List[SwapRoute] = []
+
+    for e in single_route_evaluations:
+        if len(routes) >= max_routes:
+            break
+
+        if can_evaluate_offline(e.route) \
+                and all((e.route.is_disjointed(r) for r in routes)):
+            routes.append(e.route)
+
+    if len(routes) < 2:
+        return None
+
+    pools_cache: Mapping[Tuple[str, str, str], AbstractPool] = {}
+
+    preload_pools(routes, pools_cache)
+
+    nb_simulations = 0
+
+    def _output(route: SwapRoute) -> Callable[[int], int]:
+        outputs = {0: 0}
+
+        def _do(amount: int) -> int:
+            nonlocal nb_simulations
+
+            if amount not in outputs:
+                nb_simulations += 1
+                e = evaluate_fixed_input_offline(route, amount, pools_cache)
+                outputs[amount] = e.net_amount_out if e else 0
+            return outputs[amount]
+
+        return _do
+
+    amounts = _equalize_marginal_outputs([_output(r) for r in routes],
+                                         amount_in,
+                                         DYN_ROUTING_SPLIT_PRECISION,
+                                         _marginal_output_hint(routes, amount_in))
+
+    evals = [evaluate_fixed_input_offline(r, a, pools_cache)
+             for r, a in zip(routes, amounts)
+             if a > 0]
+
+    evals = [e for e in evals if e is not None]
+
+    end = time()
+
+    logging.info(f'algo4: {len(evals)} routes, {nb_simulations} simulations, '
+                 f'computed in {end-start} seconds')
+
+    if len(evals) < 2:
+        return None
+
+    return DynamicRoutingSwapEvaluation(amount_in=amount_in,
+                                        estimated_gas=sum((e.estimated_gas)
+                                                          for e in evals),
+                                        evaluations=evals,
+                                        net_amount_out=sum((e.net_amount_out
+                                                            for e in evals)),
+                                        theorical_amount_out=sum((e.theorical_amount_out
+                                                                  for e in evals)),
+                                        token_in=evals[0].route.token_in,
+                                        token_out=evals[0].route.token_out)
+
+
+def _marginal_output_hint(routes: List[SwapRoute], amount_in: int) -> Optional[int]:
+    '''
+    Estimate the common marginal output of the split of +amount_in+ between
+    +routes+ from the price impact curves of the snapshot (None if a pool has
+    no curve).
+    '''
+    curves = get_pool_curves((hop.pool.sc_address,
+                              hop.token_in,
+                              hop.token_out)
+                             for route in routes
+                             for hop in route.hops)
+
+    route_curves = [[curves[(hop.pool.sc_address, hop.token_in, hop.token_out)]
+                     for hop in route.hops]
+                    for route in routes]
+
+    if any((c is None for rc in route_curves for c in rc)):
+        return None
+
+    def _output(hop_curves: List[PriceImpactCurve]) -> Callable[[int], int]:
+        def _do(amount: int) -> int:
+            for curve in hop_curves:
+                amount = curve.estimate_amount_out(amount)
+
+                # no estimation above the sampled amounts
+                if amount is None:
+                    return 0
+            return amount
+
+        return _do
+
+    outputs = [_output(rc) for rc in route_curves]
+
+    amounts = _equalize_marginal_outputs(outputs,
+                                         amount_in,
+                                         DYN_ROUTING_SPLIT_PRECISION)
+
+    unit = max(1, amount_in // DYN_ROUTING_SPLIT_PRECISION)
+
+    # marginal output of the route with the largest amount
+    i, amount = max(enumerate(amounts), key=lambda x: x[1])
+
+    return outputs[i](amount) - outputs[i](amount - unit) if amount >= unit else None
+
+
+def _equalize_marginal_outputs(outputs: List[Callable[[int], int]],
+                               amount_in: int,
+                               precision: int,
+                               marginal_hint: Optional[int] = None) -> List[int]:
+    '''
+    Split +amount_in+ between concave +outputs+ by bisection on a common
+    marginal output.
+
+    Amounts are split in units of +amount_in+ / +precision+. For a given
+    marginal output, each output takes the units whose marginal output is
+    higher (found by bisection between the units taken at the bounds of the
+    common marginal output, which narrow at each step).
+
+    :marginal_hint: estimation of the common marginal output, the marginal
+    outputs around it are probed first (the precision does not depend on it)
+    :return: amount of each output
+    '''
+    unit = max(1, amount_in // precision)
+    nb_units = amount_in // unit
+
+    def _marginal(i: int, k: int) -> int:
+        return outputs[i]((k + 1) * unit) - outputs[i](k * unit)
+
+    def _nb_units(i: int, marginal: int, low: int, high: int) -> int:
+        while low < high:
+            mid = (low + high) // 2
+            if _marginal(i, mid) < marginal:
+                high = mid
+            else:
+                low = mid + 1
+        return low
+
+    nb_outputs = len(outputs)
+
+    # units taken at marginal_high <= nb_units < units taken at marginal_low
+    marginal_low = 0
+    marginal_high = max((_marginal(i, 0) for i in range(nb_outputs))) + 1
+    units_low = [nb_units] * nb_outputs
+    units_high = [0] * nb_outputs
+
+    probes = [] if marginal_hint is None \
+        else [marginal_hint + marginal_hint // DYN_ROUTING_MARGINAL_HINT_DIVISOR,
+              marginal_hint - marginal_hint // DYN_ROUTING_MARGINAL_HINT_DIVISOR]
+
+    while marginal_high - marginal_low > max(1, marginal_high // precision) \
+            and units_low != units_high:
+        while len(probes) > 0 and not marginal_low < probes[-1] < marginal_high:
+            probes.pop()
+
+        marginal = probes.pop() if len(probes) > 0 \
+            else (marginal_low + marginal_high) // 2
+
+        units = [_nb_units(i, marginal, units_high[i], units_low[i])
+                 for i in range(nb_outputs)]
+
+        if sum(units) <= nb_units:
+            marginal_high, units_high = marginal, units
+        else:
+            marginal_low, units_low = marginal, units
+
+    amounts = [k * unit for k in units_high]
+
+    # remaining amount to the output with the highest marginal output
+    best = max(range(nb_outputs),
+               key=lambda i: _marginal(i, units_high[i]))
+    amounts[best] += amount_in - sum(amounts)
+
+    # marginal outputs of small units are rounded, fall back to a single output
+    whole_outputs = [output(amount_in) for output in outputs]
+    best = max(range(nb_outputs), key=lambda i: whole_outputs[i])
+
+    if sum((output(a) for output, a in zip(outputs, amounts) if a > 0)) \
+            < whole_outputs[best]:
+        amounts = [0] * nb_outputs
+        amounts[best] = amount_in
+
+    return amounts
+
+
+def find_best_dynamic_routing_flow(single_route_evaluations: List[SwapEvaluation],
+                                   amount_in: int,
+                                   max_legs: int) -> Optional[DynamicRoutingSwapEvaluation]:
+    '''
+    Split +amount_in+ over the token DAG made of the hops of the best routes,
+    so that the amount can split (and merge) at intermediate tokens.
+
+    Sub-amounts are assigned to the best path of the DAG given the reserves
+    updated by the previous ones (paths may share pools). Each path used is a
+    leg of the result; legs are evaluated one after the other on the same
+    reserves, as they are swapped.
+
+    Each sub-amount may simulate every path again, so the number of
+    sub-amounts is capped by +DYN_ROUTING_FLOW_MAX_SIMULATIONS+ / number of
+    paths (at least 2).
+
+    :single_route_evaluations: evaluations of the whole amount, sorted by output
+    :max_legs: maximum number of paths used
+    '''
+    start = time()
+
+    routes = [e.route
+              for e in single_route_evaluations
+              if can_evaluate_offline(e.route)][:DYN_ROUTING_FLOW_NB_ROUTES]
+
+    if len(routes) < 2:
+        return None
+
+    paths = _dag_paths(routes, DYN_ROUTING_FLOW_MAX_PATHS)
+
+    nb_sub_amounts = max(2, min(DYN_ROUTING_FLOW_NB_SUB_AMOUNTS,
+                                DYN_ROUTING_FLOW_MAX_SIMULATIONS // len(paths)))
+
+    amounts = [amount_in // nb_sub_amounts] * (nb_sub_amounts-1)
+    amounts = [amount_in - sum(amounts)] + amounts
+    amounts = [a for a in amounts if a > 0]
+
+    pools_cache: Mapping[Tuple[str, str, str], AbstractPool] = {}
+
+    preload_pools(paths, pools_cache)
+
+    initial_pools = dict(pools_cache)
+
+    amount_per_route = _split_greedily(paths,
+                                       amounts,
+                                       pools_cache,
+                                       max_legs,
+                                       disjointed=False)
+
+    if amount_per_route is None or len(amount_per_route) < 2:
+        return None
+
+    pools_cache = dict(initial_pools)
+
+    evals = [evaluate_fixed_input_offline(route,
+                                          amount,
+                                          pools_cache,
+                                          update_reserves=True)
+             for route, amount in amount_per_route.items()]
+
+    if any((e is None for e in evals)):
+        return None
+
+    end = time()
+
+    logging.info(f'flow: {len(evals)} legs among {len(paths)} paths, '
+                 f'{len(amounts)} sub-amounts, computed in {end-start} seconds')
+
+    return DynamicRoutingSwapEvaluation(amount_in=amount_in,
+                                        estimated_gas=sum((e.estimated_gas)
+                                                          for e in evals),
+                                        evaluations=evals,
+                                        net_amount_out=sum((e.net_amount_out
+                                                            for e in evals)),
+                                        theorical_amount_out=sum((e.theorical_amount_out
+                                                                  for e in evals)),
+                                        token_in=evals[0].route.token_in,
+                                        token_out=evals[0].route.token_out)
+
+
+def _dag_paths(routes: List[SwapRoute], max_paths: int) -> List[SwapRoute]:
+    '''
+    Paths between the tokens of +routes+ through their hops (routes first),
+    with at most as many hops as the longest route.
+    '''
+    token_in = routes[0].token_in
+    token_out = routes[0].token_out
+    max_hops = max((len(r.hops) for r in routes))
+
+    def _key(hop: SwapHop) -> Tuple[str, str, str]:
+        return (hop.pool.sc_address, hop.token_in, hop.token_out)
+
+    hops_from: Dict[str, Dict[Tuple[str, str, str], SwapHop]] = {}
+
+    for route in routes:
+        for hop in route.hops:
+            hops_from.setdefault(hop.token_in, {}).setdefault(_key(hop), hop)
+
+    known_paths = {tuple(_key(h) for h in r.hops) for r in routes}
+    paths = list(routes)
+
+    def _walk(token: str, hops: List[SwapHop], visited: Tuple[str, ...]):
+        if len(paths) >= max_paths:
+            return
+
+        if token == token_out:
+            keys = tuple(_key(h) for h in hops)
+            if keys not in known_paths:
+                known_paths.add(keys)
+                paths.append(SwapRoute.model_construct(id_=hash(keys),
+                                                       hops=hops,
+                                                       token_in=token_in,
+                                                       token_out=token_out))
+            return
+
+        if len(hops) == max_hops:
+            return
+
+        for hop in hops_from.get(token, {}).values():
+            if hop.token_out not in visited:
+                _walk(hop.token_out, [*hops, hop], (*visited, hop.token_out))
+
+    _walk(token_in, [], (token_in,))
+
+    return paths
+
+
 def can_evaluate_offline(route: SwapRoute):
-    return all((h.pool.type not in [SC_TYPE_JEXCHANGE_ORDERBOOK]
-                for h in route.hops))
+    '''
+    Whether every hop of +route+ can be simulated: hops of
+    +SAMPLED_DEPTH_SC_TYPES+ need their depth in the current snapshot.
+    '''
+    keys = [(h.pool.sc_address, h.token_in, h.token_out)
+            for h in route.hops
+            if h.pool.type in SAMPLED_DEPTH_SC_TYPES]
+
+    if len(keys) == 0:
+        return True
+
+    pools = get_pools(keys)
+
+    return all((pools[k] is not None for k in keys))
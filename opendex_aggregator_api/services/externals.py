@@ -1,15 +1,54 @@
-
+import asyncio
 import base64
 import logging
-from typing import Any, List, Optional
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 
 import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
 from multiversx_sdk_core.serializer import args_to_strings
 
-from opendex_aggregator_api.utils.env import (mvx_gateway_url,
+from opendex_aggregator_api.utils.env import (gateway_max_connections,
+                                              gateway_timeout,
+                                              mvx_gateway_url,
                                               mvx_public_gateway_url)
 
+KEEPALIVE_TIMEOUT = 30  # seconds
+
+_ASYNC_CLIENTS: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+_SYNC_CLIENT = threading.local()
+
+
+def gateway_client() -> aiohttp.ClientSession:
+    """
+    Return the gateway client of the running event loop (created on first
+    use).
+
+    Connections are kept alive between queries and shared by every caller
+    of the loop, until +close_gateway_client+ is called.
+    """
+    loop = asyncio.get_running_loop()
+
+    client = _ASYNC_CLIENTS.get(loop, None)
+
+    if client is None or client.closed:
+        connector = aiohttp.TCPConnector(limit=gateway_max_connections(),
+                                         keepalive_timeout=KEEPALIVE_TIMEOUT)
+        client = aiohttp.ClientSession(mvx_gateway_url(),
+                                       connector=connector,
+                                       timeout=aiohttp.ClientTimeout(total=gateway_timeout()))
+        _ASYNC_CLIENTS[loop] = client
+
+    return client
+
+
+async def close_gateway_client():
+    client = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), None)
+
+    if client is not None:
+        await client.close()
+
 
 async def async_sc_query(http_client: aiohttp.ClientSession,
                          sc_address: str,
@@ -32,6 +71,20 @@ async def async_sc_query(http_client: aiohttp.ClientSession,
         return None
 
 
+async def async_sc_queries(queries: List[Tuple[str, str, List[Any]]]) -> List[Optional[List[str]]]:
+    """
+    Run +queries+ (sc_address, function, args) concurrently with the shared
+    gateway client (results in the same order).
+    """
+    http_client = gateway_client()
+
+    return await asyncio.gather(*[async_sc_query(http_client,
+                                                 sc_address,
+                                                 function,
+                                                 args)
+                                  for sc_address, function, args in queries])
+
+
 def sync_sc_query(sc_address: str,
                   function: str,
                   args: List[Any] = [],
@@ -44,8 +97,9 @@ def sync_sc_query(sc_address: str,
         url = f'{mvx_gateway_url()}/vm-values/query'
 
     try:
-        json_ = requests.post(url,
-                              json=query).json()
+        json_ = _sync_client().post(url,
+                                    json=query,
+                                    timeout=gateway_timeout()).json()
 
         return _decode_json(json_)
     except Exception as e:
@@ -55,6 +109,20 @@ def sync_sc_query(sc_address: str,
         return None
 
 
+def _sync_client() -> requests.Session:
+    # requests sessions are not thread safe: one per thread
+    client = getattr(_SYNC_CLIENT, 'session', None)
+
+    if client is None:
+        client = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=gateway_max_connections())
+        client.mount('http://', adapter)
+        client.mount('https://', adapter)
+        _SYNC_CLIENT.session = client
+
+    return client
+
+
 def _decode_json(json_) -> Optional[List[str]]:
     try:
         code = json_['code']
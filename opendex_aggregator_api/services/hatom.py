@@ -1,10 +1,7 @@
-import asyncio
 import logging
 from typing import Optional, Union
 
-import aiohttp
-
-from opendex_aggregator_api.services.externals import async_sc_query
+from opendex_aggregator_api.services.externals import async_sc_queries
 from opendex_aggregator_api.utils import env
 from opendex_aggregator_api.utils.convert import hex2dec
 
@@ -22,20 +19,14 @@ async def fetch_egld_and_usdc_prices() -> Union[Optional[float], Optional[float]
         usdc_usd_price = 1.0
         egld_usd_price = 10.0
     else:
-        async with aiohttp.ClientSession(env.mvx_gateway_url()) as http_client:
-            tasks = [async_sc_query(http_client,
-                                    sc_address=sc_address,
-                                    function='latestPriceFeed',
-                                    args=[id, 'USD'])
-                     for id in ['EGLD', 'USDC']]
-
-            [egld_result, usdc_result] = await asyncio.gather(*tasks)
+        [egld_result, usdc_result] = await async_sc_queries([(sc_address, 'latestPriceFeed', [id, 'USD'])
+                                                             for id in ['EGLD', 'USDC']])
 
-            egld_usd_price = hex2dec(
-                egld_result[4]) / PRECISION if egld_result else None
+        egld_usd_price = hex2dec(
+            egld_result[4]) / PRECISION if egld_result else None
 
-            usdc_usd_price = hex2dec(
-                usdc_result[4]) / PRECISION if usdc_result else None
+        usdc_usd_price = hex2dec(
+            usdc_result[4]) / PRECISION if usdc_result else None
 
     logging.info(f'EGLD price from Hatom: {egld_usd_price}')
     logging.info(f'USDC price from Hatom: {usdc_usd_price}')
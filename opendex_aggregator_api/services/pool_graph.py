@@ -0,0 +1,229 @@
+import hashlib
+from array import array
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from opendex_aggregator_api.data.datastore import (get_swap_pools,
+                                                   get_tokens_reachability)
+from opendex_aggregator_api.data.model import TokensReachability
+from opendex_aggregator_api.pools.model import SwapHop, SwapPool, SwapRoute
+
+CompactRoute = Tuple[int, ...]
+"""
+Route stored as the ids of its hops in a +PoolGraph+.
+"""
+
+
+class PoolGraph:
+    """
+    Immutable token -> outgoing hops index built from a swap pools snapshot.
+
+    Tokens and hops are numbered; a hop id identifies a (pool, token in,
+    token out) triple through the +hop_pool+, +hop_token_in+ and
+    +hop_token_out+ arrays, and routes are handled as tuples of hop ids
+    (see +CompactRoute+) until they are turned into +SwapRoute+ objects.
+
+    Hops of a token are kept in the order of the snapshot (pool order, then
+    output token order) so route enumeration stays deterministic.
+
+    Incoming hops of a token are indexed as well (with the position of the hop
+    among the outgoing hops of its input token) for backward searches.
+    """
+
+    def __init__(self, pools: List[SwapPool]):
+        token_index: Dict[str, int] = {}
+
+        def _index(token: str) -> int:
+            return token_index.setdefault(token, len(token_index))
+
+        hops = []
+        hop_pool = array('i')
+        hop_token_in = array('i')
+        hop_token_out = array('i')
+        hop_ids_from: Dict[int, List[int]] = {}
+
+        for pool_index, pool in enumerate(pools):
+            for token_in in pool.tokens_in:
+                token_in_index = _index(token_in)
+                hop_ids = hop_ids_from.setdefault(token_in_index, [])
+
+                for token_out in pool.tokens_out:
+                    if token_out == token_in:
+                        continue
+
+                    hop_ids.append(len(hops))
+                    hops.append(SwapHop(pool=pool,
+                                        token_in=token_in,
+                                        token_out=token_out))
+                    hop_pool.append(pool_index)
+                    hop_token_in.append(token_in_index)
+                    hop_token_out.append(_index(token_out))
+
+        hop_ids_to: Dict[int, List[Tuple[int, int]]] = {}
+
+        for hop_ids in hop_ids_from.values():
+            for position, hop_id in enumerate(hop_ids):
+                hop_ids_to.setdefault(hop_token_out[hop_id], []) \
+                    .append((hop_id, position))
+
+        self.pools: Tuple[SwapPool, ...] = tuple(pools)
+        self.version = swap_pools_version(pools)
+        self.token_ids: Tuple[str, ...] = tuple(token_index)
+        self.token_index: Dict[str, int] = token_index
+        self.hops: Tuple[SwapHop, ...] = tuple(hops)
+        self.hop_pool = hop_pool
+        self.hop_token_in = hop_token_in
+        self.hop_token_out = hop_token_out
+        self.hop_ids_by_token: Tuple[Tuple[int, ...], ...] = \
+            tuple(tuple(hop_ids_from.get(i, ())) for i in range(len(token_index)))
+        self.hop_ids_to_token: Tuple[Tuple[Tuple[int, int], ...], ...] = \
+            tuple(tuple(hop_ids_to.get(i, ())) for i in range(len(token_index)))
+        self._hop_digests = tuple(_hop_digest(h) for h in hops)
+
+    def hop_ids_from(self, token: int) -> Tuple[int, ...]:
+        return self.hop_ids_by_token[token]
+
+    def hop_ids_to(self, token: int) -> Tuple[Tuple[int, int], ...]:
+        """
+        :return: incoming hops of +token+ with their position in +hop_ids_from(hop token in)+
+        """
+        return self.hop_ids_to_token[token]
+
+    def route_hash(self, route: CompactRoute) -> int:
+        """
+        Content hash of a route (identical for the same hops on every snapshot).
+        """
+        hash_ = hashlib.blake2b(digest_size=8)
+
+        for hop_id in route:
+            hash_.update(self._hop_digests[hop_id])
+
+        return int.from_bytes(hash_.digest(), 'big') >> 1
+
+    def swap_route(self, route: CompactRoute) -> SwapRoute:
+        """
+        Build the +SwapRoute+ of a compact route.
+
+        Hops are shared with the graph and are not validated again.
+        """
+        return SwapRoute.model_construct(id_=self.route_hash(route),
+                                         hops=[self.hops[i] for i in route],
+                                         token_in=self.token_ids[self.hop_token_in[route[0]]],
+                                         token_out=self.token_ids[self.hop_token_out[route[-1]]])
+
+    def swap_routes(self, routes: Iterable[CompactRoute]) -> List[SwapRoute]:
+        return [self.swap_route(r) for r in routes]
+
+
+def build_tokens_reachability(graph: PoolGraph,
+                              hub_tokens: Iterable[str]) -> TokensReachability:
+    """
+    Compute the weakly connected components of the graph and the hop
+    distances from and to each hub token (breadth-first).
+    """
+    parents = list(range(len(graph.token_ids)))
+
+    def _root(token: int) -> int:
+        while parents[token] != token:
+            parents[token] = parents[parents[token]]
+            token = parents[token]
+        return token
+
+    for token_in, token_out in zip(graph.hop_token_in, graph.hop_token_out):
+        root_in, root_out = _root(token_in), _root(token_out)
+        if root_in != root_out:
+            parents[root_out] = root_in
+
+    def _distances(hub: int, next_tokens) -> Dict[str, int]:
+        distances = {hub: 0}
+        queue = deque((hub,))
+        while queue:
+            token = queue.popleft()
+            for next_token in next_tokens(token):
+                if next_token not in distances:
+                    distances[next_token] = distances[token] + 1
+                    queue.append(next_token)
+        return {graph.token_ids[t]: d for t, d in distances.items()}
+
+    def _next_tokens(token: int):
+        return (graph.hop_token_out[h] for h in graph.hop_ids_from(token))
+
+    def _prev_tokens(token: int):
+        return (graph.hop_token_in[h] for h, _ in graph.hop_ids_to(token))
+
+    hubs = [graph.token_index[t] for t in hub_tokens if t in graph.token_index]
+
+    return TokensReachability(components={t: _root(i) for i, t in enumerate(graph.token_ids)},
+                              distances_from_hubs=[_distances(h, _next_tokens)
+                                                   for h in hubs],
+                              distances_to_hubs=[_distances(h, _prev_tokens)
+                                                 for h in hubs])
+
+
+def _hop_digest(hop: SwapHop) -> bytes:
+    return hashlib.blake2b(f'{hop.pool.sc_address}_{hop.pool.type}_{hop.pool.name}_{hop.token_in}_{hop.token_out}'.encode(),
+                           digest_size=8).digest()
+
+
+def swap_pools_version(pools: List[SwapPool]) -> str:
+    """
+    Topology hash of a swap pools snapshot.
+
+    Only the pools (address, type) and their token lists are hashed, so the
+    version changes when a pool or a token list changes but not on reserves
+    updates. Identical on every worker (and in the sync task) for the same
+    topology.
+    """
+    hash_ = hashlib.blake2b(digest_size=8)
+
+    for pool in pools:
+        hash_.update(f'{pool.sc_address}|{pool.type}|'
+                     f'{",".join(pool.tokens_in)}|{",".join(pool.tokens_out)}\n'.encode())
+
+    return hash_.hexdigest()
+
+
+_GRAPH: Tuple[Optional[List[SwapPool]], Optional[PoolGraph]] = (None, None)
+
+
+def get_pool_graph() -> Optional[PoolGraph]:
+    """
+    Return the pool graph of the current swap pools snapshot.
+
+    The graph is rebuilt only when a snapshot with a new topology is loaded
+    and is shared by all requests of the worker.
+    """
+    global _GRAPH
+
+    pools = get_swap_pools()
+
+    if pools is None:
+        return None
+
+    known_pools, graph = _GRAPH
+
+    if known_pools is not pools:
+        if graph is None or graph.version != swap_pools_version(pools):
+            graph = PoolGraph(pools)
+        _GRAPH = (pools, graph)
+
+    return graph
+
+
+_REACHABILITY: Tuple[Optional[str], Optional[TokensReachability]] = (None, None)
+
+
+def get_reachability(graph: PoolGraph) -> Optional[TokensReachability]:
+    """
+    Return the reachability index published by the sync task for the
+    topology of +graph+ (None until it is published).
+    """
+    global _REACHABILITY
+
+    version, reachability = _REACHABILITY
+
+    if version != graph.version or reachability is None:
+        reachability = get_tokens_reachability(graph.version)
+        _REACHABILITY = (graph.version, reachability)
+
+    return reachability
@@ -0,0 +1,108 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+from opendex_aggregator_api.data.datastore import (get_dex_aggregator_pools,
+                                                   get_pools_snapshot_version,
+                                                   get_price_impact_curves)
+from opendex_aggregator_api.data.model import Esdt
+from opendex_aggregator_api.pools.pools import AbstractPool, PriceImpactCurve
+
+PoolKey = Tuple[str, str, str]
+
+_POOLS: Tuple[Optional[str],
+              Dict[PoolKey, Optional[Tuple[AbstractPool, str]]],
+              Dict[str, Esdt]] = (None, {}, {})
+
+_CURVES: Tuple[Optional[str],
+               Dict[PoolKey, Optional[PriceImpactCurve]]] = (None, {})
+
+
+def get_pools(keys: Iterable[PoolKey]) -> Dict[PoolKey, Optional[AbstractPool]]:
+    """
+    Return the pools (sc_address, token_in, token_out) of the current
+    snapshot (None for unknown pools).
+
+    Pools are cached by the worker until the sync task publishes a new
+    snapshot version, and are shared by all requests: they must not be
+    updated (see AbstractPool.with_updated_reserves). Pools of a snapshot
+    share their tokens.
+
+    The snapshot is dropped when its version expires (sync stalled): pools
+    are unknown until the next sync.
+    """
+    global _POOLS
+
+    keys = set(keys)
+
+    version = get_pools_snapshot_version()
+
+    if version is None:
+        _POOLS = (None, {}, {})
+        return {k: None for k in keys}
+
+    known_version, pools, tokens = _POOLS
+
+    if version != known_version:
+        pools = {}
+        tokens = {}
+        _POOLS = (version, pools, tokens)
+
+    missing_keys = [k for k in keys if k not in pools]
+
+    if len(missing_keys) > 0:
+        missing_pools = get_dex_aggregator_pools(missing_keys)
+
+        for pool_and_version in missing_pools.values():
+            if pool_and_version:
+                pool_and_version[0].intern_tokens(tokens)
+
+        pools.update(missing_pools)
+
+    return {k: pools[k][0] if pools[k] else None
+            for k in keys}
+
+
+def get_pool_version(key: PoolKey, pool: Optional[AbstractPool]) -> Optional[str]:
+    """
+    Return the version (digest of the synced state) of +pool+ if it is the
+    snapshot pool of +key+ (None for pools updated by an evaluation).
+    """
+    _, pools, _ = _POOLS
+
+    pool_and_version = pools.get(key, None)
+
+    if pool is None or pool_and_version is None or pool_and_version[0] is not pool:
+        return None
+
+    return pool_and_version[1]
+
+
+def get_pool_curves(keys: Iterable[PoolKey]) -> Dict[PoolKey, Optional[PriceImpactCurve]]:
+    """
+    Return the price impact curves of the pools (sc_address, token_in,
+    token_out) sampled by the sync task for the current snapshot (None for
+    unknown pools).
+
+    Curves are cached by the worker like pools (see get_pools).
+    """
+    global _CURVES
+
+    keys = set(keys)
+
+    version = get_pools_snapshot_version()
+
+    if version is None:
+        _CURVES = (None, {})
+        return {k: None for k in keys}
+
+    known_version, curves = _CURVES
+
+    if version != known_version:
+        curves = {}
+        _CURVES = (version, curves)
+
+    missing_keys = [k for k in keys if k not in curves]
+
+    if len(missing_keys) > 0:
+        curves.update(get_price_impact_curves(version, missing_keys))
+
+    return {k: curves[k] for k in keys}
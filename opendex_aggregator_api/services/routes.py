@@ -1,22 +1,46 @@
 
+import heapq
 import logging
+import math
 from time import time
-from typing import List
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
 
 from opendex_aggregator_api.data.constants import SC_TYPE_JEXCHANGE_ORDERBOOK
-from opendex_aggregator_api.data.datastore import get_swap_pools
-from opendex_aggregator_api.pools.model import SwapHop, SwapPool, SwapRoute
+from opendex_aggregator_api.data.datastore import (get_exchange_rates,
+                                                   get_tokens)
+from opendex_aggregator_api.data.model import (Esdt, ExchangeRate,
+                                               TokensReachability)
+from opendex_aggregator_api.services.pool_graph import (CompactRoute,
+                                                        PoolGraph,
+                                                        get_pool_graph)
+
+ROUTE_TABLE_MAX_HOPS = 3
+ROUTE_TABLE_MAX_ROUTES = 999
+
+BEST_ROUTES_MAX_ROUTES = 100
+BEST_ROUTES_BEAM_WIDTH = 200
+BEST_ROUTES_REFERENCE_AMOUNT_USD = 1_000
+BEST_ROUTES_UNKNOWN_RATE_PENALTY = 0.99
 
 
 def find_routes(token_in: str,
                 token_out: str,
                 max_hops: int,
                 max_hops2: int,
-                max_routes: int = 500) -> List[SwapRoute]:
+                max_routes: int = 500,
+                bidirectional: bool = False,
+                graph: Optional[PoolGraph] = None,
+                min_hops: int = 1) -> List[CompactRoute]:
     '''
     Find routes between token_in and token_out.
 
     :max_hops2: will be used if no routes are found with max_hops
+    :bidirectional: expand from both ends and join on intermediate tokens
+    (same routes, same order)
+    :graph: pool graph to search (default: graph of the current snapshot)
+    :min_hops: known lower bound of the number of hops, shorter routes are
+    not searched (bidirectional search only)
+    :return: routes as hop ids of +graph+
     '''
 
     logging.info(f'Find routes {token_in} -> {token_out}')
@@ -25,20 +49,33 @@ def find_routes(token_in: str,
 
     results = []
 
-    all_pools = get_swap_pools()
+    if graph is None:
+        graph = get_pool_graph()
 
-    if all_pools is None:
+    if graph is None or token_in not in graph.token_index:
         return []
 
-    _find_routes_inner(token_out,
-                       all_pools,
-                       max_hops,
-                       max_hops2,
-                       max_routes,
-                       [SwapRoute(hops=[],
-                                  token_in=token_in,
-                                  token_out='')],
-                       results)
+    token_in_index = graph.token_index[token_in]
+    token_out_index = graph.token_index.get(token_out, -1)
+
+    if bidirectional:
+        _find_routes_bidirectional(token_in_index,
+                                   token_out_index,
+                                   graph,
+                                   max_hops,
+                                   max_hops2,
+                                   max_routes,
+                                   results,
+                                   min_hops)
+    else:
+        _find_routes_inner(token_in_index,
+                           token_out_index,
+                           graph,
+                           max_hops,
+                           max_hops2,
+                           max_routes,
+                           [()],
+                           results)
 
     end = time()
 
@@ -48,27 +85,263 @@ def find_routes(token_in: str,
     return results
 
 
-def sort_routes(routes: List[SwapRoute]) -> List[SwapRoute]:
+def find_best_routes(token_in: str,
+                     token_out: str,
+                     max_hops: int,
+                     max_hops2: int,
+                     max_routes: int = BEST_ROUTES_MAX_ROUTES,
+                     beam_width: int = BEST_ROUTES_BEAM_WIDTH,
+                     graph: Optional[PoolGraph] = None,
+                     weights: Optional[Sequence[Optional[float]]] = None,
+                     reachability: Optional[TokensReachability] = None) -> List[CompactRoute]:
+    '''
+    Find the best routes between token_in and token_out, sorted by expected output.
+
+    Partial routes are expanded level by level (best-first) and only the
+    +beam_width+ cheapest ones are kept at each depth.
+    The cost of a route is the sum of the weights of its hops (see +hop_weights+).
+    Hops without weight are never used, use +find_routes+ for an exhaustive search.
+
+    :max_hops2: will be used if no routes are found with max_hops
+    :graph: pool graph to search (default: graph of the current snapshot)
+    :weights: hop weights (default: weights of the current rates)
+    :reachability: used to drop partial routes that can not reach token_out
+    within max_hops2
+    :return: routes as hop ids of +graph+
+    '''
+
+    logging.info(f'Find best routes {token_in} -> {token_out}')
+
+    start = time()
+
+    if graph is None:
+        graph = get_pool_graph()
+
+    if graph is None \
+            or token_in == token_out \
+            or token_in not in graph.token_index:
+        return []
+
+    if weights is None:
+        weights = get_hop_weights(graph)
+
+    token_out_index = graph.token_index.get(token_out, -1)
+    hop_token_out = graph.hop_token_out
+
+    remaining_hops = {}
+
+    def _can_reach_token_out(token: int, nb_hops: int) -> bool:
+        if reachability is None:
+            return True
+        if token not in remaining_hops:
+            remaining_hops[token] = reachability.min_hops(graph.token_ids[token],
+                                                          token_out)
+        min_hops = remaining_hops[token]
+        return min_hops is not None and nb_hops + min_hops <= max_hops2
+
+    results: List[Tuple[float, CompactRoute]] = []
+    beam: List[Tuple[float, Tuple[int, ...], CompactRoute]] = \
+        [(0.0, (graph.token_index[token_in],), ())]
+
+    for nb_hops in range(1, max_hops2 + 1):
+        if nb_hops > max_hops and len(results) > 0:
+            break
+
+        partials = []
+
+        for cost, visited, hops in beam:
+            for next_hop in graph.hop_ids_from(visited[-1]):
+                next_token = hop_token_out[next_hop]
+
+                if next_token in visited:
+                    continue
+
+                weight = weights[next_hop]
+                if weight is None:
+                    continue
+
+                if next_token == token_out_index:
+                    results.append((cost + weight, (*hops, next_hop)))
+                elif _can_reach_token_out(next_token, nb_hops):
+                    partials.append((cost + weight,
+                                     (*visited, next_token),
+                                     (*hops, next_hop)))
+
+        if len(partials) == 0:
+            break
+
+        beam = heapq.nsmallest(beam_width, partials, key=lambda x: x[0])
+
+    results = heapq.nsmallest(max_routes, results, key=lambda x: x[0])
+
+    end = time()
+
+    logging.info(
+        f'{token_in} -> {token_out} :: {len(results)} best routes found in {end-start} seconds')
+
+    return [hops for _, hops in results]
+
+
+def rank_routes(graph: PoolGraph,
+                routes: Iterable[CompactRoute],
+                max_routes: int = BEST_ROUTES_MAX_ROUTES,
+                weights: Optional[Sequence[Optional[float]]] = None) -> List[CompactRoute]:
+    '''
+    Sort +routes+ by expected output (sum of the weights of their hops, see
+    +hop_weights+) and keep the +max_routes+ best ones.
+
+    Routes with a hop without weight are kept after the others.
+
+    :weights: hop weights (default: weights of the current rates)
+    '''
+    if weights is None:
+        weights = get_hop_weights(graph)
+
+    def _cost(route: CompactRoute) -> Tuple[bool, float]:
+        route_weights = [weights[h] for h in route]
+
+        if any((w is None for w in route_weights)):
+            return (True, 0.0)
+
+        return (False, sum(route_weights))
+
+    # stable: routes without weight keep their order
+    return heapq.nsmallest(max_routes, routes, key=_cost)
 
-    def _hop_penalty(h: SwapHop):
-        if h.pool.type == SC_TYPE_JEXCHANGE_ORDERBOOK:
+
+def hop_weights(graph: PoolGraph,
+                rates: Iterable[ExchangeRate],
+                tokens: Iterable[Esdt]) -> List[Optional[float]]:
+    '''
+    Compute the weight (-log of the effective rate) of every hop of the graph.
+
+    The effective rate is the spot rate of the pool reduced by the price impact
+    of a trade worth +BEST_ROUTES_REFERENCE_AMOUNT_USD+ against the output
+    liquidity, so that dust pools rank behind liquid ones.
+    Hops without exchange rate (e.g. orderbooks) fall back on the USD prices
+    of their tokens with a penalty, hops without any price are left out.
+
+    :return: weights by hop id (None for hops left out)
+    '''
+
+    rates_by_hop = {}
+
+    for rate in rates:
+        rates_by_hop[(rate.sc_address, rate.base_token_id, rate.quote_token_id)] = \
+            (rate.rate, rate.quote_token_liquidity)
+        rates_by_hop.setdefault((rate.sc_address, rate.quote_token_id, rate.base_token_id),
+                                (rate.rate2, rate.base_token_liquidity))
+
+    tokens_by_id = {t.identifier: t for t in tokens}
+
+    weights = []
+
+    for hop in graph.hops:
+        key = (hop.pool.sc_address, hop.token_in, hop.token_out)
+        effective_rate = _effective_rate(rates_by_hop.get(key),
+                                         tokens_by_id.get(hop.token_in),
+                                         tokens_by_id.get(hop.token_out))
+
+        if effective_rate is not None and effective_rate > 0:
+            weights.append(-math.log(effective_rate))
+        else:
+            weights.append(None)
+
+    return weights
+
+
+def _effective_rate(rate_and_liquidity: Optional[Tuple[float, int]],
+                    token_in: Optional[Esdt],
+                    token_out: Optional[Esdt]) -> Optional[float]:
+    price_in = token_in.usd_price if token_in else None
+    price_out = token_out.usd_price if token_out else None
+
+    if rate_and_liquidity is None:
+        if not price_in or not price_out:
+            return None
+
+        return price_in / price_out * BEST_ROUTES_UNKNOWN_RATE_PENALTY
+
+    rate, liquidity_out = rate_and_liquidity
+
+    if token_out is None or (not price_in and not price_out):
+        return rate * BEST_ROUTES_UNKNOWN_RATE_PENALTY
+
+    liquidity_out = liquidity_out / 10**token_out.decimals
+
+    if price_out:
+        reference_amount_out = BEST_ROUTES_REFERENCE_AMOUNT_USD / price_out
+    else:
+        reference_amount_out = BEST_ROUTES_REFERENCE_AMOUNT_USD / price_in * rate
+
+    if liquidity_out + reference_amount_out <= 0:
+        return None
+
+    return rate * liquidity_out / (liquidity_out + reference_amount_out)
+
+
+_HOP_WEIGHTS: Tuple[Optional[tuple], List[Optional[float]]] = (None, [])
+
+
+def get_hop_weights(graph: PoolGraph) -> List[Optional[float]]:
+    '''
+    Return the hop weights of +graph+ for the current rates and token prices.
+
+    Weights are recomputed only when the graph, the rates or the tokens change.
+    '''
+    global _HOP_WEIGHTS
+
+    rates = get_exchange_rates()
+    tokens = get_tokens()
+
+    known_sources, weights = _HOP_WEIGHTS
+    sources = (graph, rates, tokens)
+
+    if known_sources is None or any(x is not y for x, y in zip(known_sources, sources)):
+        weights = hop_weights(graph, rates or [], tokens or [])
+        _HOP_WEIGHTS = (sources, weights)
+
+    return weights
+
+
+def sort_routes(graph: PoolGraph, routes: List[CompactRoute]) -> List[CompactRoute]:
+
+    def _hop_penalty(hop_id: int):
+        if graph.pools[graph.hop_pool[hop_id]].type == SC_TYPE_JEXCHANGE_ORDERBOOK:
             return 10
 
         return 1
 
-    def _route_penalty(r: SwapRoute):
-        return sum((_hop_penalty(h) for h in r.hops))
+    def _route_penalty(r: CompactRoute):
+        return sum((_hop_penalty(h) for h in r))
 
     return sorted(routes, key=lambda x: _route_penalty(x))
 
 
-def _find_routes_inner(token_out: str,
-                       all_pools: List[SwapPool],
+def build_route_table(graph: PoolGraph,
+                      pairs: Iterable[Tuple[str, str]]) -> Mapping[Tuple[str, str], List[CompactRoute]]:
+    """
+    Compute the k-best sorted routes of token pairs (with default max hops).
+    """
+    return {(token_in, token_out): sort_routes(graph,
+                                               find_routes(token_in,
+                                                           token_out,
+                                                           ROUTE_TABLE_MAX_HOPS,
+                                                           max_hops2=ROUTE_TABLE_MAX_HOPS+2,
+                                                           max_routes=9999,
+                                                           bidirectional=True,
+                                                           graph=graph))[:ROUTE_TABLE_MAX_ROUTES]
+            for token_in, token_out in pairs}
+
+
+def _find_routes_inner(token_in: int,
+                       token_out: int,
+                       graph: PoolGraph,
                        max_hops: int,
                        max_hops2: int,
                        max_routes: int,
-                       candidates: List[SwapRoute],
-                       results: List[SwapRoute]):
+                       candidates: List[CompactRoute],
+                       results: List[CompactRoute]):
 
     if max_hops == 0 and len(results) > 0:
         return
@@ -76,40 +349,115 @@ def _find_routes_inner(token_out: str,
     if max_hops2 == 0:
         return
 
+    hop_token_out = graph.hop_token_out
+
     new_candidates = []
 
-    for route in candidates:
-        if len(route.hops) > 0:
-            token_in = route.hops[-1].token_out
+    for hops in candidates:
+        if len(hops) > 0:
+            hop_token_in = hop_token_out[hops[-1]]
         else:
-            token_in = route.token_in
-
-        pools = [p for p in all_pools
-                 if token_in in p.tokens_in]
+            hop_token_in = token_in
 
-        for pool in pools:
+        for next_hop in graph.hop_ids_from(hop_token_in):
+            next_token = hop_token_out[next_hop]
 
-            next_hops = [SwapHop(pool=pool,
-                                 token_in=token_in,
-                                 token_out=t) for t in pool.tokens_out
-                         if t != token_in and t != route.token_in]
+            if next_token == token_in:
+                continue
 
-            for next_hop in next_hops:
-                next_route = SwapRoute(hops=[*route.hops, next_hop],
-                                       token_in=route.token_in,
-                                       token_out=next_hop.token_out)
-
-                if next_route.token_out == token_out:
-                    if len(results) < max_routes:
-                        results.append(next_route)
-                elif max_hops > 0:
-                    new_candidates.append(next_route)
+            if next_token == token_out:
+                if len(results) < max_routes:
+                    results.append((*hops, next_hop))
+            elif max_hops > 0:
+                new_candidates.append((*hops, next_hop))
 
     if len(new_candidates) > 0 and len(results) < max_routes:
-        _find_routes_inner(token_out,
-                           all_pools,
+        _find_routes_inner(token_in,
+                           token_out,
+                           graph,
                            max(max_hops-1, 0),
                            max(max_hops2-1, 0),
                            max_routes,
                            new_candidates,
                            results)
+
+
+def _find_routes_bidirectional(token_in: int,
+                               token_out: int,
+                               graph: PoolGraph,
+                               max_hops: int,
+                               max_hops2: int,
+                               max_routes: int,
+                               results: List[CompactRoute],
+                               min_hops: int = 1):
+    """
+    Meet-in-the-middle version of +_find_routes_inner+.
+
+    Routes of L hops are built by joining forward partial routes of
+    ceil(L/2) hops with backward partial routes of floor(L/2) hops on their
+    common intermediate token.
+    Routes are produced in the same order as the breadth-first enumeration
+    (lexicographic order of the hops positions in +graph.hop_ids_from+).
+    """
+
+    if token_in == token_out or token_out < 0:
+        return
+
+    hop_token_in = graph.hop_token_in
+    hop_token_out = graph.hop_token_out
+
+    forward_levels: List[List[CompactRoute]] = [[()]]
+    backward_levels: List[Dict[int, List[Tuple[Tuple[int, ...], CompactRoute]]]] = \
+        [{token_out: [((), ())]}]
+
+    def _forward(depth: int) -> List[CompactRoute]:
+        while len(forward_levels) <= depth:
+            partials = []
+            for hops in forward_levels[-1]:
+                token = hop_token_out[hops[-1]] if hops else token_in
+                for next_hop in graph.hop_ids_from(token):
+                    if hop_token_out[next_hop] not in (token_in, token_out):
+                        partials.append((*hops, next_hop))
+            forward_levels.append(partials)
+        return forward_levels[depth]
+
+    def _backward(depth: int) -> Dict[int, List[Tuple[Tuple[int, ...], CompactRoute]]]:
+        while len(backward_levels) <= depth:
+            partials_by_token = {}
+            for token, partials in backward_levels[-1].items():
+                for prev_hop, position in graph.hop_ids_to(token):
+                    prev_token = hop_token_in[prev_hop]
+                    if prev_token in (token_in, token_out):
+                        continue
+                    by_token = partials_by_token.setdefault(prev_token, [])
+                    by_token.extend(((position, *key), (prev_hop, *hops))
+                                    for key, hops in partials)
+            for partials in partials_by_token.values():
+                partials.sort(key=lambda x: x[0])
+            backward_levels.append(partials_by_token)
+        return backward_levels[depth]
+
+    for nb_hops in range(max(min_hops, 1), min(max_hops + 1, max_hops2) + 1):
+        if nb_hops > max_hops and len(results) > 0:
+            return
+
+        nb_forward_hops = (nb_hops + 1) // 2
+        nb_backward_hops = nb_hops - nb_forward_hops
+
+        if nb_backward_hops == 0:
+            for hops in _forward(nb_forward_hops - 1):
+                token = hop_token_out[hops[-1]] if hops else token_in
+                for next_hop in graph.hop_ids_from(token):
+                    if hop_token_out[next_hop] == token_out:
+                        results.append((*hops, next_hop))
+                        if len(results) >= max_routes:
+                            return
+            continue
+
+        backward = _backward(nb_backward_hops)
+
+        for hops in _forward(nb_forward_hops):
+            for _, backward_hops in backward.get(hop_token_out[hops[-1]], ()):
+                results.append((*hops, *backward_hops))
+                if len(results) >= max_routes:
+                    return
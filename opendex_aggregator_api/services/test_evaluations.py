@@ -0,0 +1,586 @@
+import asyncio
+import pickle
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pytest
+
+from opendex_aggregator_api.data.constants import (SC_TYPE_JEXCHANGE_ORDERBOOK,
+                                                   SC_TYPE_XEXCHANGE)
+from opendex_aggregator_api.data import datastore
+from opendex_aggregator_api.data.model import Esdt
+from opendex_aggregator_api.pools.jexchange import JexOrderbookPool
+from opendex_aggregator_api.pools.model import (SwapEvaluation, SwapHop,
+                                                SwapPool, SwapRoute)
+from opendex_aggregator_api.pools.pools import (AbstractPool,
+                                                ConstantProductPool,
+                                                StableSwapPool)
+from opendex_aggregator_api.services import evaluations as eval_svc
+from opendex_aggregator_api.services import pool_states
+from opendex_aggregator_api.services.pool_graph import PoolGraph
+from opendex_aggregator_api.services.routes import find_routes
+
+
+def _esdt(identifier: str, decimals: int) -> Esdt:
+    return Esdt(decimals=decimals,
+                identifier=identifier,
+                ticker=identifier.split('-')[0],
+                name=identifier.split('-')[0],
+                is_lp_token=False,
+                exchange='x')
+
+
+TOKENS = {t.identifier: t
+          for t in [_esdt('A-000000', 18),
+                    _esdt('B-000000', 18),
+                    _esdt('USDC-000000', 6),
+                    _esdt('USDT-000000', 6),
+                    _esdt('LP-000000', 18),
+                    _esdt('WEGLD-000000', 18)]}
+
+A, B, USDC, USDT, LP, WEGLD = TOKENS.values()
+
+
+def _cp_pool(first_token: Esdt, first_reserve: int,
+             second_token: Esdt, second_reserve: int) -> ConstantProductPool:
+    return ConstantProductPool(max_fee=10_000,
+                               total_fee=30,
+                               first_token=first_token,
+                               first_token_reserves=first_reserve,
+                               lp_token=LP,
+                               lp_token_supply=0,
+                               second_token=second_token,
+                               second_token_reserves=second_reserve)
+
+
+def _stable_pool(tokens: List[Esdt], reserves: List[int]) -> StableSwapPool:
+    return StableSwapPool(amp_factor=256,
+                          swap_fee=100,
+                          max_fee=1_000_000,
+                          tokens=tokens,
+                          reserves=reserves,
+                          underlying_prices=[10**18] * len(tokens),
+                          lp_token=LP,
+                          lp_token_supply=0)
+
+
+# sc address -> pool
+POOLS: Dict[str, AbstractPool] = {
+    'erd1ab': _cp_pool(A, 1_000 * 10**18, B, 2_000 * 10**18),
+    'erd1ab_dust': _cp_pool(A, 10 * 10**18, B, 21 * 10**18),
+    'erd1ausdc': _cp_pool(A, 5_000 * 10**18, USDC, 10_000 * 10**6),
+    'erd1ausdt': _cp_pool(A, 500 * 10**18, USDT, 1_050 * 10**6),
+    'erd1busdc': _cp_pool(B, 20_000 * 10**18, USDC, 10_000 * 10**6),
+    'erd1stable': _stable_pool([USDC, USDT], [50_000 * 10**6, 40_000 * 10**6]),
+    'erd1stable3': _stable_pool([USDC, USDT, B], [1_000 * 10**6, 1_000 * 10**6, 2_000 * 10**18]),
+    'erd1wegld': _cp_pool(WEGLD, 100 * 10**18, A, 4_000 * 10**18),
+}
+
+
+def _swap_pools() -> List[SwapPool]:
+    def _tokens(pool: AbstractPool) -> List[str]:
+        if isinstance(pool, StableSwapPool):
+            return [t.identifier for t in pool.tokens]
+        return [pool.first_token.identifier, pool.second_token.identifier]
+
+    return [SwapPool(name=sc_address,
+                     sc_address=sc_address,
+                     tokens_in=_tokens(pool),
+                     tokens_out=_tokens(pool),
+                     type=SC_TYPE_XEXCHANGE)
+            for sc_address, pool in POOLS.items()]
+
+
+def _pools_cache() -> Dict[Tuple[str, str, str], AbstractPool]:
+    return {(p.sc_address, token_in, token_out): POOLS[p.sc_address]
+            for p in _swap_pools()
+            for token_in in p.tokens_in
+            for token_out in p.tokens_out
+            if token_in != token_out}
+
+
+def _routes(token_in: str, token_out: str) -> List[SwapRoute]:
+    graph = PoolGraph(_swap_pools())
+
+    return graph.swap_routes(find_routes(token_in,
+                                         token_out,
+                                         3,
+                                         max_hops2=3,
+                                         max_routes=9999,
+                                         graph=graph))
+
+
+@pytest.fixture(autouse=True)
+def offline_snapshot(monkeypatch):
+    # tokens and pools of the test, no snapshot in Redis
+    pools_cache = _pools_cache()
+
+    monkeypatch.setattr(eval_svc, 'get_or_fetch_token', TOKENS.__getitem__)
+    monkeypatch.setattr(eval_svc, 'get_pools',
+                        lambda keys: {k: pools_cache.get(k, None) for k in keys})
+    monkeypatch.setattr(pool_states, 'get_pools_snapshot_version', lambda: None)
+
+
+@pytest.mark.parametrize('nb_finalists', [0, 1, 10])
+@pytest.mark.parametrize('token_in,token_out,amount_in', [
+    ('A-000000', 'B-000000', 10**18),
+    ('A-000000', 'B-000000', 300 * 10**18),
+    ('A-000000', 'USDT-000000', 50 * 10**18),
+    ('USDC-000000', 'B-000000', 2_000 * 10**6),
+])
+def test_evaluate_fixed_input_offline_batch_prune(monkeypatch,
+                                                  nb_finalists: int,
+                                                  token_in: str,
+                                                  token_out: str,
+                                                  amount_in: int):
+    monkeypatch.setattr(eval_svc, 'SCREENING_NB_FINALISTS', nb_finalists)
+
+    routes = _routes(token_in, token_out)
+
+    assert len(routes) > 2
+
+    evals = eval_svc.evaluate_fixed_input_offline_batch(routes,
+                                                        amount_in,
+                                                        False,
+                                                        _pools_cache())
+    pruned_evals = eval_svc.evaluate_fixed_input_offline_batch(routes,
+                                                               amount_in,
+                                                               True,
+                                                               _pools_cache())
+
+    best = max((e for e in evals if e is not None),
+               key=lambda e: e.net_amount_out)
+    pruned_best = max((e for e in pruned_evals if e is not None),
+                      key=lambda e: e.net_amount_out)
+
+    assert pruned_best.net_amount_out == best.net_amount_out
+    assert pruned_best.route is best.route
+
+    # evaluated routes are exact, the others are skipped
+    assert any((e is None for e in pruned_evals))
+
+    for e, pruned_e in zip(evals, pruned_evals):
+        if pruned_e is not None:
+            assert pruned_e.net_amount_out == e.net_amount_out
+
+
+def _evaluation_fields(evaluation: Optional[SwapEvaluation]) -> Optional[tuple]:
+    if evaluation is None:
+        return None
+
+    return (evaluation.amount_in,
+            evaluation.estimated_gas,
+            evaluation.fee_amount,
+            evaluation.fee_token,
+            evaluation.net_amount_out,
+            evaluation.theorical_amount_out)
+
+
+@pytest.mark.parametrize('token_in,token_out', [
+    ('A-000000', 'B-000000'),
+    ('A-000000', 'USDT-000000'),
+    ('USDC-000000', 'B-000000'),
+    ('WEGLD-000000', 'USDT-000000'),
+])
+@pytest.mark.parametrize('amount_ratio', [10**-6, 10**-2, 1, 100])
+def test_evaluate_fixed_input_offline_batch_prefixes(token_in: str,
+                                                     token_out: str,
+                                                     amount_ratio: float):
+    amount_in = int(10**TOKENS[token_in].decimals * 100 * amount_ratio)
+
+    routes = _routes(token_in, token_out)
+
+    # routes share prefixes
+    assert len({r.hops[0].pool.sc_address for r in routes}) < len(routes)
+
+    evals = eval_svc.evaluate_fixed_input_offline_batch(routes,
+                                                        amount_in,
+                                                        False,
+                                                        _pools_cache())
+
+    # each route evaluated on its own
+    expected_evals = [eval_svc._evaluate_fixed_input_offline(r,
+                                                             amount_in,
+                                                             _pools_cache(),
+                                                             False,
+                                                             None)
+                      for r in routes]
+
+    assert any((e is not None for e in evals))
+    assert [_evaluation_fields(e) for e in evals] \
+        == [_evaluation_fields(e) for e in expected_evals]
+    assert all((e.route is r for e, r in zip(evals, routes) if e is not None))
+
+
+@pytest.mark.parametrize('token_in,token_out,amount_in', [
+    ('A-000000', 'USDT-000000', 300 * 10**18),
+    ('USDC-000000', 'B-000000', 2_000 * 10**6),
+    ('WEGLD-000000', 'USDT-000000', 10 * 10**18),
+])
+def test_evaluate_fixed_input_offline_update_reserves(token_in: str,
+                                                      token_out: str,
+                                                      amount_in: int):
+    pools_cache = _pools_cache()
+    serialized_pools = {k: pickle.dumps(p) for k, p in POOLS.items()}
+
+    nb_evaluated = 0
+
+    for route in _routes(token_in, token_out):
+        evaluation = eval_svc.evaluate_fixed_input_offline(route,
+                                                           amount_in,
+                                                           dict(pools_cache),
+                                                           update_reserves=False)
+
+        updated_pools_cache = dict(pools_cache)
+
+        updated_evaluation = eval_svc.evaluate_fixed_input_offline(route,
+                                                                   amount_in,
+                                                                   updated_pools_cache,
+                                                                   update_reserves=True)
+
+        assert _evaluation_fields(updated_evaluation) == _evaluation_fields(evaluation)
+
+        if evaluation is None:
+            continue
+
+        nb_evaluated += 1
+
+        # pools of the route are updated copies
+        for hop in route.hops:
+            key = (hop.pool.sc_address, hop.token_in, hop.token_out)
+            assert updated_pools_cache[key] is not pools_cache[key]
+
+        # shared pools are left untouched
+        assert {k: pickle.dumps(p) for k, p in POOLS.items()} == serialized_pools
+
+    assert nb_evaluated > 0
+
+
+def _cp_output(in_reserve: int, out_reserve: int) -> Callable[[int], int]:
+    return lambda amount: out_reserve * amount // (in_reserve + amount)
+
+
+@pytest.mark.parametrize('reserves', [
+    [(1_000, 2_000), (10_000, 20_000)],
+    [(1_000, 2_000), (1_000, 2_100), (50, 200)],
+    [(10**21, 10**9), (10**20, 2 * 10**8), (10**24, 10**11)],
+])
+@pytest.mark.parametrize('amount_in_ratio', [0.001, 0.1, 1, 10])
+@pytest.mark.parametrize('marginal_hint_ratio', [None, 0.9, 1.02])
+def test_equalize_marginal_outputs(reserves: List[Tuple[int, int]],
+                                   amount_in_ratio: float,
+                                   marginal_hint_ratio: Optional[float]):
+    outputs = [_cp_output(*r) for r in reserves]
+    amount_in = int(reserves[0][0] * amount_in_ratio)
+
+    marginal_hint = None
+
+    if marginal_hint_ratio is not None:
+        # around the marginal output of the split without hint
+        amounts = eval_svc._equalize_marginal_outputs(outputs, amount_in, 10_000)
+        unit = max(1, amount_in // 10_000)
+        i = max(range(len(amounts)), key=lambda i: amounts[i])
+        marginal_hint = int((outputs[i](amounts[i]) - outputs[i](amounts[i] - unit))
+                            * marginal_hint_ratio)
+
+    amounts = eval_svc._equalize_marginal_outputs(outputs,
+                                                  amount_in,
+                                                  10_000,
+                                                  marginal_hint)
+
+    assert sum(amounts) == amount_in
+    assert all((a >= 0 for a in amounts))
+    assert sum((o(a) for o, a in zip(outputs, amounts))) \
+        >= max((o(amount_in) for o in outputs))
+
+
+@pytest.mark.parametrize('find_best_dynamic_routing,max_routes', [
+    (eval_svc.find_best_dynamic_routing_algo4, 3),
+    (eval_svc.find_best_dynamic_routing_flow, 6),
+])
+@pytest.mark.parametrize('token_in,token_out,amount_in', [
+    ('A-000000', 'B-000000', 2_000 * 10**18),
+    ('A-000000', 'USDT-000000', 300 * 10**18),
+    ('A-000000', 'USDC-000000', 50 * 10**18),
+    ('A-000000', 'USDC-000000', 2_000 * 10**18),
+])
+def test_find_best_dynamic_routing(find_best_dynamic_routing,
+                                   max_routes: int,
+                                   token_in: str,
+                                   token_out: str,
+                                   amount_in: int):
+    evals = eval_svc.evaluate_fixed_input_offline_batch(_routes(token_in, token_out),
+                                                        amount_in,
+                                                        False,
+                                                        _pools_cache())
+    evals = sorted((e for e in evals if e is not None),
+                   key=lambda e: e.net_amount_out,
+                   reverse=True)
+
+    dyn_eval = find_best_dynamic_routing(evals, amount_in, max_routes)
+
+    assert dyn_eval is not None
+    assert len(dyn_eval.evaluations) > 1
+    assert sum((e.amount_in for e in dyn_eval.evaluations)) == amount_in
+    assert dyn_eval.net_amount_out == sum((e.net_amount_out
+                                           for e in dyn_eval.evaluations))
+    assert dyn_eval.net_amount_out >= evals[0].net_amount_out
+
+
+@pytest.mark.parametrize('max_simulations', [0, 30, 10_000])
+def test_find_best_dynamic_routing_flow_max_simulations(monkeypatch, max_simulations: int):
+    amount_in = 2_000 * 10**18
+
+    evals = eval_svc.evaluate_fixed_input_offline_batch(_routes('A-000000', 'USDC-000000'),
+                                                        amount_in,
+                                                        False,
+                                                        _pools_cache())
+    evals = sorted((e for e in evals if e is not None),
+                   key=lambda e: e.net_amount_out,
+                   reverse=True)
+
+    routes = [e.route for e in evals][:eval_svc.DYN_ROUTING_FLOW_NB_ROUTES]
+    nb_paths = len(eval_svc._dag_paths(routes, eval_svc.DYN_ROUTING_FLOW_MAX_PATHS))
+    nb_sub_amounts = max(2, min(eval_svc.DYN_ROUTING_FLOW_NB_SUB_AMOUNTS,
+                                max_simulations // nb_paths))
+
+    nb_simulations = 0
+    evaluate = eval_svc._evaluate_fixed_input_offline
+
+    def _evaluate_fixed_input_offline(*args):
+        nonlocal nb_simulations
+        nb_simulations += 1
+        return evaluate(*args)
+
+    monkeypatch.setattr(eval_svc, 'DYN_ROUTING_FLOW_MAX_SIMULATIONS', max_simulations)
+    monkeypatch.setattr(eval_svc, '_evaluate_fixed_input_offline', _evaluate_fixed_input_offline)
+
+    dyn_eval = eval_svc.find_best_dynamic_routing_flow(evals, amount_in, 6)
+
+    nb_legs = len(dyn_eval.evaluations) if dyn_eval is not None else 0
+
+    # paths of each sub-amount, its swap and the final legs
+    assert nb_simulations <= (nb_sub_amounts + 2) * (nb_paths + 1) + nb_legs
+
+    if dyn_eval is not None:
+        assert sum((e.amount_in for e in dyn_eval.evaluations)) == amount_in
+
+
+@pytest.mark.parametrize('with_depth', [False, True])
+def test_can_evaluate_offline(monkeypatch, with_depth: bool):
+    orderbook = SwapPool(name='erd1orderbook',
+                         sc_address='erd1orderbook',
+                         tokens_in=['USDC-000000', 'B-000000'],
+                         tokens_out=['USDC-000000', 'B-000000'],
+                         type=SC_TYPE_JEXCHANGE_ORDERBOOK)
+
+    pools_cache = _pools_cache()
+
+    if with_depth:
+        pools_cache[('erd1orderbook', 'USDC-000000', 'B-000000')] = \
+            JexOrderbookPool(token_in=USDC,
+                             token_out=B,
+                             amounts_in=[0, 1_000 * 10**6],
+                             amounts_out=[0, 1_900 * 10**18])
+
+    monkeypatch.setattr(eval_svc, 'get_pools',
+                        lambda keys: {k: pools_cache.get(k, None) for k in keys})
+
+    amm_route = _routes('A-000000', 'USDC-000000')[0]
+
+    route = SwapRoute(hops=amm_route.hops + [SwapHop(pool=orderbook,
+                                                     token_in='USDC-000000',
+                                                     token_out='B-000000')],
+                      token_in='A-000000',
+                      token_out='B-000000')
+
+    # orderbooks without sampled depth are evaluated online
+    assert eval_svc.can_evaluate_offline(amm_route)
+    assert eval_svc.can_evaluate_offline(route) == with_depth
+
+
+ORDERBOOK_SC_ADDRESSES = [
+    'erd1qqqqqqqqqqqqqpgqxerzmkr80xc0qwa8vvm5ug9h8e2y7jgsqk2svevje0',
+    'erd1qqqqqqqqqqqqqpgqxmn4jlazsjp6gnec95423egatwcdfcjm78ss5q550k',
+    'erd1qqqqqqqqqqqqqpgqkrgsvct7hfx7ru30mfzk3uy6pxzxn6jj78ss84aldu',
+    'erd1qqqqqqqqqqqqqpgqvxn0cl35r74tlw2a8d794v795jrzfxyf78sstg8pjr',
+    'erd1qqqqqqqqqqqqqpgqta0tv8d5pjzmwzshrtw62n4nww9kxtl278ssspxpxu',
+]
+
+
+def _orderbook_route(sc_address: str) -> SwapRoute:
+    pool = SwapPool(name=sc_address,
+                    sc_address=sc_address,
+                    tokens_in=['USDC-000000', 'B-000000'],
+                    tokens_out=['USDC-000000', 'B-000000'],
+                    type=SC_TYPE_JEXCHANGE_ORDERBOOK)
+
+    return SwapRoute(hops=[SwapHop(pool=pool,
+                                   token_in='USDC-000000',
+                                   token_out='B-000000')],
+                     token_in='USDC-000000',
+                     token_out='B-000000')
+
+
+def test_evaluate_fixed_input_online_batch(monkeypatch):
+    # seconds per pool, the last one is later than the deadline
+    delays = dict(zip(ORDERBOOK_SC_ADDRESSES, [0.01, 0.02, 0.01, 0.03, 10]))
+
+    nb_queries = 0
+    nb_in_flight = 0
+    max_in_flight = 0
+    cancelled = []
+
+    async def _evaluate_online(amount_in, route, http_client):
+        nonlocal nb_queries, nb_in_flight, max_in_flight
+
+        nb_queries += 1
+        nb_in_flight += 1
+        max_in_flight = max(max_in_flight, nb_in_flight)
+
+        sc_address = route.hops[0].pool.sc_address
+
+        try:
+            await asyncio.sleep(delays[sc_address])
+        except asyncio.CancelledError:
+            cancelled.append(sc_address)
+            raise
+        finally:
+            nb_in_flight -= 1
+
+        return SwapEvaluation(amount_in=amount_in,
+                              estimated_gas=route.estimated_gas(),
+                              fee_amount=0,
+                              fee_token=None,
+                              net_amount_out=ORDERBOOK_SC_ADDRESSES.index(sc_address) + 1,
+                              route=route,
+                              theorical_amount_out=0)
+
+    monkeypatch.setattr(eval_svc, 'evaluate_fixed_input_online', _evaluate_online)
+
+    # identical routes are queried once
+    routes = [_orderbook_route(a) for a in ORDERBOOK_SC_ADDRESSES] \
+        + [_orderbook_route(ORDERBOOK_SC_ADDRESSES[0])]
+
+    evals = asyncio.run(eval_svc.evaluate_fixed_input_online_batch(routes,
+                                                                   10**6,
+                                                                   None,
+                                                                   timeout=0.5))
+
+    assert nb_queries == len(ORDERBOOK_SC_ADDRESSES)
+    assert max_in_flight <= eval_svc.ONLINE_EVALUATIONS_CONCURRENCY
+    assert cancelled == [ORDERBOOK_SC_ADDRESSES[-1]]
+
+    assert [e.net_amount_out if e else None for e in evals] == [1, 2, 3, 4, None, 1]
+    assert all((e.route is r for e, r in zip(evals, routes) if e is not None))
+
+
+@pytest.mark.parametrize('error', [asyncio.CancelledError, asyncio.TimeoutError, ValueError])
+def test_evaluate_fixed_input_online_errors(monkeypatch, error):
+    async def _sc_query(**kwargs):
+        raise error()
+
+    monkeypatch.setattr(eval_svc, 'async_sc_query', _sc_query)
+    monkeypatch.setattr(eval_svc, 'sc_address_aggregator', lambda: ORDERBOOK_SC_ADDRESSES[0])
+
+    route = _orderbook_route(ORDERBOOK_SC_ADDRESSES[1])
+
+    evaluation = eval_svc.evaluate_fixed_input_online(10**6, route, None)
+
+    # cancellations are propagated to the batch, errors are failed evaluations
+    if error is asyncio.CancelledError:
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(evaluation)
+    else:
+        assert asyncio.run(evaluation) is None
+
+
+@pytest.fixture
+def pools_snapshot(monkeypatch, redis_store):
+    # pools published in a snapshot of the in-memory store, with an empty
+    # evaluations cache
+    monkeypatch.setattr(pool_states, '_POOLS', (None, {}, {}))
+    monkeypatch.setattr(pool_states, 'get_pools_snapshot_version',
+                        datastore.get_pools_snapshot_version)
+    monkeypatch.setattr(eval_svc, 'get_pools', pool_states.get_pools)
+    monkeypatch.setattr(eval_svc, '_EVALUATIONS_CACHE', {})
+
+    def _publish(version: str, pools: Dict[Tuple[str, str, str], AbstractPool]):
+        for key, pool in pools.items():
+            datastore.set_dex_aggregator_pool(*key, pool)
+
+        datastore.set_pools_snapshot_version(version)
+
+    return _publish
+
+
+def test_cached_evaluation(monkeypatch, pools_snapshot):
+    nb_evaluations = 0
+    evaluate = eval_svc._evaluate_fixed_input_offline
+
+    def _evaluate_fixed_input_offline(*args):
+        nonlocal nb_evaluations
+        nb_evaluations += 1
+        return evaluate(*args)
+
+    monkeypatch.setattr(eval_svc, '_evaluate_fixed_input_offline', _evaluate_fixed_input_offline)
+
+    def _route() -> SwapRoute:
+        return next((r for r in _routes('A-000000', 'USDT-000000')
+                     if [h.pool.sc_address for h in r.hops] == ['erd1ausdc', 'erd1stable']))
+
+    route = _route()
+    amount_in = 50 * 10**18
+
+    def _evaluate(pools_cache: Dict[Tuple[str, str, str], AbstractPool],
+                  update_reserves: bool = False,
+                  route: SwapRoute = route) -> SwapEvaluation:
+        eval_svc.preload_pools([route], pools_cache)
+        return eval_svc.evaluate_fixed_input_offline(route,
+                                                     amount_in,
+                                                     pools_cache,
+                                                     update_reserves=update_reserves)
+
+    pools_snapshot('v1', _pools_cache())
+
+    evaluation = _evaluate({})
+
+    assert nb_evaluations == 1
+    assert _evaluation_fields(_evaluate({})) == _evaluation_fields(evaluation)
+    assert nb_evaluations == 1
+
+    # same hops, other route
+    other_route = _route()
+    assert _evaluate({}, route=other_route).route is other_route
+    assert nb_evaluations == 1
+
+    # new snapshot with the same pool states
+    pools_snapshot('v2', _pools_cache())
+
+    assert _evaluation_fields(_evaluate({})) == _evaluation_fields(evaluation)
+    assert nb_evaluations == 1
+
+    # a pool of the route is re-synced with new reserves
+    pools = _pools_cache()
+    pools[('erd1stable', 'USDC-000000', 'USDT-000000')] = \
+        _stable_pool([USDC, USDT], [40_000 * 10**6, 50_000 * 10**6])
+    pools_snapshot('v3', pools)
+
+    resynced_evaluation = _evaluate({})
+
+    assert nb_evaluations == 2
+    assert resynced_evaluation.net_amount_out != evaluation.net_amount_out
+
+    # copy-on-write pools (updated by the request) are kept out of the cache
+    nb_cached = len(eval_svc._EVALUATIONS_CACHE)
+    pools_cache = {}
+
+    assert _evaluation_fields(_evaluate(pools_cache, update_reserves=True)) \
+        == _evaluation_fields(resynced_evaluation)
+    assert nb_evaluations == 3
+
+    updated_evaluation = _evaluate(pools_cache)
+
+    assert updated_evaluation.net_amount_out < resynced_evaluation.net_amount_out
+    assert _evaluation_fields(_evaluate(pools_cache)) == _evaluation_fields(updated_evaluation)
+    assert nb_evaluations == 5
+    assert len(eval_svc._EVALUATIONS_CACHE) == nb_cached
@@ -0,0 +1,144 @@
+from typing import Dict
+
+import pytest
+
+from opendex_aggregator_api.data import datastore
+from opendex_aggregator_api.data.model import Esdt
+from opendex_aggregator_api.pools.pools import AbstractPool, ConstantProductPool
+from opendex_aggregator_api.services import pool_states
+from opendex_aggregator_api.services.pool_states import PoolKey
+
+
+def _esdt(identifier: str) -> Esdt:
+    return Esdt(decimals=18,
+                identifier=identifier,
+                ticker=identifier.split('-')[0],
+                name=identifier.split('-')[0],
+                is_lp_token=False,
+                exchange='x')
+
+
+A, B, C, LP = (_esdt(x) for x in ['A-000000', 'B-000000', 'C-000000', 'LP-000000'])
+
+
+def _cp_pool(first_token: Esdt, first_reserve: int,
+             second_token: Esdt, second_reserve: int) -> ConstantProductPool:
+    return ConstantProductPool(max_fee=10_000,
+                               total_fee=30,
+                               first_token=first_token,
+                               first_token_reserves=first_reserve,
+                               lp_token=LP,
+                               lp_token_supply=0,
+                               second_token=second_token,
+                               second_token_reserves=second_reserve)
+
+
+KEY_AB = ('erd1ab', 'A-000000', 'B-000000')
+KEY_BC = ('erd1bc', 'B-000000', 'C-000000')
+KEY_UNKNOWN = ('erd1unknown', 'A-000000', 'C-000000')
+
+
+def _publish(version: str, pools: Dict[PoolKey, AbstractPool]):
+    for key, pool in pools.items():
+        datastore.set_dex_aggregator_pool(*key, pool)
+
+    datastore.set_pools_snapshot_version(version)
+
+
+@pytest.fixture(autouse=True)
+def snapshot(monkeypatch, redis_store) -> dict:
+    monkeypatch.setattr(pool_states, '_POOLS', (None, {}, {}))
+
+    nb_reads = []
+
+    def _get_dex_aggregator_pools(keys):
+        nb_reads.append(1)
+        return datastore.get_dex_aggregator_pools(keys)
+
+    monkeypatch.setattr(pool_states, 'get_dex_aggregator_pools', _get_dex_aggregator_pools)
+
+    return {'store': redis_store, 'nb_reads': nb_reads}
+
+
+def test_get_pools_version_swap(snapshot):
+    _publish('v1', {KEY_AB: _cp_pool(A, 10**21, B, 2 * 10**21),
+                    KEY_BC: _cp_pool(B, 10**21, C, 3 * 10**21)})
+
+    pools = pool_states.get_pools([KEY_AB, KEY_BC, KEY_UNKNOWN])
+
+    assert pools[KEY_AB].first_token_reserves == 10**21
+    assert pools[KEY_BC].second_token_reserves == 3 * 10**21
+    assert pools[KEY_UNKNOWN] is None
+
+    # pools of a snapshot share their tokens
+    assert pools[KEY_AB].second_token is pools[KEY_BC].first_token
+
+    # same version: pools (and unknown ones) are not read again
+    assert pool_states.get_pools([KEY_AB, KEY_BC, KEY_UNKNOWN]) == pools
+    assert pool_states.get_pools([KEY_AB])[KEY_AB] is pools[KEY_AB]
+    assert len(snapshot['nb_reads']) == 1
+
+    versions = {k: pool_states.get_pool_version(k, pools[k])
+                for k in [KEY_AB, KEY_BC]}
+
+    assert all((v is not None for v in versions.values()))
+
+    # new version: pools are read again, the synced state of a pool is its
+    # version
+    _publish('v2', {KEY_AB: _cp_pool(A, 10**21, B, 2 * 10**21),
+                    KEY_BC: _cp_pool(B, 10**21, C, 4 * 10**21)})
+
+    new_pools = pool_states.get_pools([KEY_AB, KEY_BC])
+
+    assert len(snapshot['nb_reads']) == 2
+    assert new_pools[KEY_AB] is not pools[KEY_AB]
+    assert new_pools[KEY_BC].second_token_reserves == 4 * 10**21
+
+    assert pool_states.get_pool_version(KEY_AB, new_pools[KEY_AB]) == versions[KEY_AB]
+    assert pool_states.get_pool_version(KEY_BC, new_pools[KEY_BC]) != versions[KEY_BC]
+
+    # pools of the previous snapshot have no version
+    assert pool_states.get_pool_version(KEY_AB, pools[KEY_AB]) is None
+    assert pool_states.get_pool_version(KEY_BC, pools[KEY_BC]) is None
+
+
+def test_get_pools_expired_snapshot(snapshot):
+    _publish('v1', {KEY_AB: _cp_pool(A, 10**21, B, 2 * 10**21)})
+
+    pool = pool_states.get_pools([KEY_AB])[KEY_AB]
+
+    assert pool is not None
+
+    # sync stalled: the version expired, the snapshot is dropped
+    del snapshot['store']['pools_version']
+
+    assert pool_states.get_pools([KEY_AB, KEY_UNKNOWN]) == {KEY_AB: None,
+                                                            KEY_UNKNOWN: None}
+    assert pool_states.get_pool_version(KEY_AB, pool) is None
+    assert len(snapshot['nb_reads']) == 1
+
+    _publish('v1', {KEY_AB: _cp_pool(A, 10**21, B, 2 * 10**21)})
+
+    new_pool = pool_states.get_pools([KEY_AB])[KEY_AB]
+
+    assert new_pool is not pool
+    assert pool_states.get_pool_version(KEY_AB, new_pool) is not None
+    assert len(snapshot['nb_reads']) == 2
+
+
+def test_get_pool_version():
+    _publish('v1', {KEY_AB: _cp_pool(A, 10**21, B, 2 * 10**21)})
+
+    pool = pool_states.get_pools([KEY_AB])[KEY_AB]
+
+    assert pool_states.get_pool_version(KEY_AB, pool) is not None
+
+    # only the snapshot object of its own key has a version
+    assert pool_states.get_pool_version(KEY_AB, None) is None
+    assert pool_states.get_pool_version(KEY_BC, pool) is None
+    assert pool_states.get_pool_version(KEY_AB, pool.deep_copy()) is None
+    assert pool_states.get_pool_version(KEY_AB,
+                                        pool.with_updated_reserves(A, 10**18, B, 10**18)) is None
+
+    # the snapshot pool itself is left untouched by copies on write
+    assert pool.first_token_reserves == 10**21
@@ -0,0 +1,261 @@
+import random
+from collections import deque
+from typing import List, Optional
+
+import pytest
+
+from opendex_aggregator_api.pools.model import SwapPool
+from opendex_aggregator_api.services.pool_graph import (CompactRoute, PoolGraph,
+                                                        build_tokens_reachability)
+from opendex_aggregator_api.services.routes import find_best_routes, find_routes
+
+
+def _pool(name: str,
+          tokens_in: List[str],
+          tokens_out: List[str],
+          sc_address: str = None) -> SwapPool:
+    return SwapPool(name=name,
+                    sc_address=sc_address or f'erd1{name}',
+                    tokens_in=tokens_in,
+                    tokens_out=tokens_out,
+                    type='x')
+
+
+def _reference_routes(graph: PoolGraph,
+                      token_in: str,
+                      token_out: str,
+                      max_hops: int,
+                      max_hops2: int,
+                      max_routes: int) -> List[CompactRoute]:
+    """
+    Enumerate routes by number of hops, in the order of the hops of each
+    token (routes never go back to token_in and stop at token_out).
+    """
+    token_in_index = graph.token_index[token_in]
+    token_out_index = graph.token_index.get(token_out, -1)
+
+    results = []
+    partials = [()]
+
+    for nb_hops in range(1, min(max_hops + 1, max_hops2) + 1):
+        if nb_hops > max_hops and len(results) > 0:
+            break
+
+        next_partials = []
+
+        for hops in partials:
+            token = graph.hop_token_out[hops[-1]] if hops else token_in_index
+
+            for hop in graph.hop_ids_from(token):
+                next_token = graph.hop_token_out[hop]
+
+                if next_token == token_in_index:
+                    continue
+
+                if next_token == token_out_index:
+                    results.append((*hops, hop))
+                else:
+                    next_partials.append((*hops, hop))
+
+        partials = next_partials
+
+    return results[:max_routes]
+
+
+def _random_pools(seed: int) -> List[SwapPool]:
+    rng = random.Random(seed)
+    tokens = [f'T{i}' for i in range(6)]
+
+    pools = []
+
+    for i in range(8):
+        pool_tokens = rng.sample(tokens, rng.choice([2, 2, 3]))
+
+        if rng.random() < 0.2:
+            # one way pool (e.g. staking)
+            pools.append(_pool(f'p{i}', pool_tokens[:1], pool_tokens[1:]))
+        else:
+            pools.append(_pool(f'p{i}', pool_tokens, pool_tokens))
+
+    return pools
+
+
+GRAPHS = {
+    'cycle': [_pool('ab', ['A', 'B'], ['A', 'B']),
+              _pool('bc', ['B', 'C'], ['B', 'C']),
+              _pool('ca', ['C', 'A'], ['C', 'A']),
+              _pool('cd', ['C', 'D'], ['C', 'D'])],
+    'duplicate_pools': [_pool('ab', ['A', 'B'], ['A', 'B']),
+                        _pool('ab2', ['A', 'B'], ['A', 'B']),
+                        _pool('ab', ['A', 'B'], ['A', 'B'], sc_address='erd1ab'),
+                        _pool('bc', ['B', 'C'], ['B', 'C']),
+                        _pool('bc2', ['B', 'C'], ['B', 'C'])],
+    'components': [_pool('ab', ['A', 'B'], ['A', 'B']),
+                   _pool('bc', ['B'], ['C']),
+                   _pool('cd', ['C'], ['D']),
+                   _pool('ef', ['E', 'F'], ['E', 'F'])],
+    'multi_tokens': [_pool('abc', ['A', 'B', 'C'], ['A', 'B', 'C']),
+                     _pool('cd', ['C', 'D'], ['C', 'D']),
+                     _pool('bd', ['B'], ['D']),
+                     _pool('da', ['D', 'A'], ['D', 'A'])],
+    **{f'random{seed}': _random_pools(seed) for seed in range(5)},
+}
+
+
+@pytest.mark.parametrize('graph_name', list(GRAPHS))
+@pytest.mark.parametrize('bidirectional', [False, True])
+def test_find_routes(graph_name: str, bidirectional: bool):
+    graph = PoolGraph(GRAPHS[graph_name])
+
+    for token_in in graph.token_ids:
+        for token_out in (*graph.token_ids, 'UNKNOWN'):
+            for max_hops in [1, 2, 3]:
+                for max_hops2 in [max_hops + 1, max_hops + 2]:
+                    for max_routes in [3, 9999]:
+                        expected = _reference_routes(graph,
+                                                     token_in,
+                                                     token_out,
+                                                     max_hops,
+                                                     max_hops2,
+                                                     max_routes)
+
+                        assert find_routes(token_in,
+                                           token_out,
+                                           max_hops,
+                                           max_hops2,
+                                           max_routes=max_routes,
+                                           bidirectional=bidirectional,
+                                           graph=graph) == expected
+
+
+@pytest.mark.parametrize('graph_name', list(GRAPHS))
+def test_find_routes_min_hops(graph_name: str):
+    graph = PoolGraph(GRAPHS[graph_name])
+
+    for token_in in graph.token_ids:
+        for token_out in graph.token_ids:
+            expected = _reference_routes(graph, token_in, token_out, 3, 5, 9999)
+
+            if len(expected) == 0:
+                continue
+
+            # shortest route length: a valid lower bound
+            min_hops = min(len(r) for r in expected)
+
+            assert find_routes(token_in,
+                               token_out,
+                               3,
+                               5,
+                               max_routes=9999,
+                               bidirectional=True,
+                               graph=graph,
+                               min_hops=min_hops) == expected
+
+
+def _shortest_hops(graph: PoolGraph, token_in: str, token_out: str) -> Optional[int]:
+    distances = {graph.token_index[token_in]: 0}
+    queue = deque(distances)
+
+    while queue:
+        token = queue.popleft()
+        for hop in graph.hop_ids_from(token):
+            next_token = graph.hop_token_out[hop]
+            if next_token not in distances:
+                distances[next_token] = distances[token] + 1
+                queue.append(next_token)
+
+    return distances.get(graph.token_index.get(token_out, -1), None)
+
+
+@pytest.mark.parametrize('graph_name', list(GRAPHS))
+@pytest.mark.parametrize('nb_hubs', [0, 1, 3, 99])
+def test_tokens_reachability(graph_name: str, nb_hubs: int):
+    graph = PoolGraph(GRAPHS[graph_name])
+    reachability = build_tokens_reachability(graph, graph.token_ids[:nb_hubs])
+
+    for token_in in graph.token_ids:
+        assert reachability.min_hops(token_in, 'UNKNOWN') is None
+        assert reachability.min_hops('UNKNOWN', token_in) is None
+
+        for token_out in graph.token_ids:
+            if token_in == token_out:
+                continue
+
+            min_hops = reachability.min_hops(token_in, token_out)
+            shortest_hops = _shortest_hops(graph, token_in, token_out)
+
+            # None only for unreachable pairs, otherwise a lower bound
+            if min_hops is None:
+                assert shortest_hops is None
+            elif shortest_hops is not None:
+                assert 1 <= min_hops <= shortest_hops
+
+            # exact with every token as hub
+            if nb_hubs >= len(graph.token_ids):
+                assert min_hops == shortest_hops
+
+
+def test_tokens_reachability_components():
+    graph = PoolGraph(GRAPHS['components'])
+
+    # different components, without hubs
+    reachability = build_tokens_reachability(graph, [])
+
+    assert reachability.min_hops('A', 'E') is None
+    assert reachability.min_hops('F', 'D') is None
+    assert reachability.min_hops('D', 'A') == 1
+
+    # one way pools, from and to a hub
+    reachability = build_tokens_reachability(graph, ['A'])
+
+    assert reachability.min_hops('D', 'A') is None
+    assert reachability.min_hops('C', 'B') is None
+    assert reachability.min_hops('A', 'D') == 3
+
+
+@pytest.mark.parametrize('graph_name', list(GRAPHS))
+@pytest.mark.parametrize('nb_hubs', [1, 3])
+def test_find_routes_reachability(graph_name: str, nb_hubs: int):
+    graph = PoolGraph(GRAPHS[graph_name])
+    reachability = build_tokens_reachability(graph, graph.token_ids[:nb_hubs])
+    weights = [1.0] * len(graph.hop_token_out)
+
+    for token_in in graph.token_ids:
+        for token_out in graph.token_ids:
+            min_hops = reachability.min_hops(token_in, token_out)
+
+            for max_hops in [1, 2, 3]:
+                expected = _reference_routes(graph,
+                                             token_in,
+                                             token_out,
+                                             max_hops,
+                                             max_hops + 2,
+                                             9999)
+
+                # unreachable pairs are answered without searching
+                if min_hops is None:
+                    assert expected == []
+                    continue
+
+                assert find_routes(token_in,
+                                   token_out,
+                                   max_hops,
+                                   max_hops + 2,
+                                   max_routes=9999,
+                                   bidirectional=True,
+                                   graph=graph,
+                                   min_hops=min_hops) == expected
+
+                assert find_best_routes(token_in,
+                                        token_out,
+                                        max_hops,
+                                        max_hops + 1,
+                                        graph=graph,
+                                        weights=weights,
+                                        reachability=reachability) \
+                    == find_best_routes(token_in,
+                                        token_out,
+                                        max_hops,
+                                        max_hops + 1,
+                                        graph=graph,
+                                        weights=weights)
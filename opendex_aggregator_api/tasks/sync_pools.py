@@ -5,10 +5,11 @@ import json
 import logging
 import random
 import sys
+import uuid
 from datetime import datetime, timedelta
-from itertools import product
+from itertools import permutations, product
 from time import sleep
-from typing import Callable, List, Mapping, Optional, Set, Tuple
+from typing import Callable, Dict, List, Mapping, Optional, Set, Tuple
 
 import aiohttp
 from multiversx_sdk_core import Address
@@ -18,12 +19,16 @@ from opendex_aggregator_api.data.constants import (
     SC_TYPE_ASHSWAP_STABLEPOOL, SC_TYPE_ASHSWAP_V2,
     SC_TYPE_HATOM_MONEY_MARKET_MINT, SC_TYPE_HATOM_MONEY_MARKET_REDEEM,
     SC_TYPE_HATOM_STAKE, SC_TYPE_HATOM_UNSTAKE, SC_TYPE_JEXCHANGE_LP,
-    SC_TYPE_JEXCHANGE_LP_DEPOSIT, SC_TYPE_JEXCHANGE_STABLEPOOL,
+    SC_TYPE_JEXCHANGE_LP_DEPOSIT, SC_TYPE_JEXCHANGE_ORDERBOOK,
+    SC_TYPE_JEXCHANGE_STABLEPOOL,
     SC_TYPE_JEXCHANGE_STABLEPOOL_DEPOSIT, SC_TYPE_ONEDEX, SC_TYPE_OPENDEX_LP,
     SC_TYPE_XEXCHANGE, SC_TYPE_XOXNO_STAKE)
-from opendex_aggregator_api.data.datastore import (set_dex_aggregator_pool,
-                                                   set_exchange_rates,
-                                                   set_swap_pools, set_tokens)
+from opendex_aggregator_api.data.datastore import (
+    delete_dex_aggregator_pool, get_most_requested_route_pairs,
+    get_route_table_pairs, set_dex_aggregator_pool, set_exchange_rates,
+    set_pools_snapshot_version, set_price_impact_curves,
+    set_route_table_routes, set_swap_pools, set_tokens,
+    set_tokens_reachability)
 from opendex_aggregator_api.data.model import (Esdt, ExchangeRate,
                                                JexStablePoolStatus,
                                                LpTokenComposition, OneDexPair,
@@ -35,14 +40,19 @@ from opendex_aggregator_api.pools.ashswap import (AshSwapPoolV2,
                                                   AshSwapStableSwapPool)
 from opendex_aggregator_api.pools.hatom import HatomConstantPricePool
 from opendex_aggregator_api.pools.jexchange import (
-    JexConstantProductDepositPool, JexConstantProductPool, JexStableSwapPool,
-    JexStableSwapPoolDeposit)
-from opendex_aggregator_api.pools.model import SwapPool
+    JexConstantProductDepositPool, JexConstantProductPool, JexOrderbookPool,
+    JexStableSwapPool, JexStableSwapPoolDeposit)
+from opendex_aggregator_api.pools.model import SwapHop, SwapPool, SwapRoute
 from opendex_aggregator_api.pools.onedex import OneDexConstantProductPool
+from opendex_aggregator_api.pools.pools import AbstractPool, PriceImpactCurve
 from opendex_aggregator_api.pools.opendex import OpendexConstantProductPool
 from opendex_aggregator_api.pools.xexchange import XExchangeConstantProductPool
 from opendex_aggregator_api.pools.xoxno import XoxnoConstantPricePool
-from opendex_aggregator_api.services.externals import async_sc_query
+from opendex_aggregator_api.services import routes as routes_svc
+from opendex_aggregator_api.services.evaluations import \
+    evaluate_fixed_input_online
+from opendex_aggregator_api.services.externals import (
+    async_sc_query, close_gateway_client, gateway_client)
 from opendex_aggregator_api.services.parsers.ashswap import (
     parse_ashswap_stablepool_status, parse_ashswap_v2_pool_status)
 from opendex_aggregator_api.services.parsers.common import parse_address
@@ -53,24 +63,37 @@ from opendex_aggregator_api.services.parsers.onedex import parse_onedex_pair
 from opendex_aggregator_api.services.parsers.opendex import parse_opendex_pool
 from opendex_aggregator_api.services.parsers.xexchange import \
     parse_xexchange_pool_status
+from opendex_aggregator_api.services.pool_graph import (
+    PoolGraph, build_tokens_reachability)
 from opendex_aggregator_api.token_constants import (JEX_IDENTIFIER,
                                                     USDC_IDENTIFIER,
                                                     WEGLD_IDENTIFIER)
 from opendex_aggregator_api.services.tokens import get_or_fetch_token
 from opendex_aggregator_api.utils.convert import hex2dec, hex2str
 from opendex_aggregator_api.utils.env import (
-    mvx_gateway_url, router_pools_dir, sc_address_aggregator,
+    router_pools_dir, sc_address_aggregator,
     sc_address_hatom_staking_segld, sc_address_hatom_staking_tao,
     sc_address_jex_lp_deployer, sc_address_onedex_swap,
     sc_address_xoxno_liquid_staking_egld,
     sc_address_xoxno_liquid_staking_xoxno, sc_addresses_opendex_deployers)
 from opendex_aggregator_api.utils.redis_utils import redis_lock_and_do
 
+ROUTE_TABLE_NB_HUB_TOKENS = 6
+ROUTE_TABLE_NB_REQUESTED_PAIRS = 50
+
+REACHABILITY_NB_HUB_TOKENS = 10
+
+ORDERBOOK_DEPTH_FIRST_AMOUNT_DIVISOR = 1000
+ORDERBOOK_DEPTH_STEP = 4
+ORDERBOOK_DEPTH_NB_POINTS = 20
+ORDERBOOK_DEPTH_CONCURRENCY = 4
+
 _must_stop = False
 _ready = False
 _all_tokens: Mapping[str, Esdt] = dict()
 _all_rates: Set[ExchangeRate] = set()
 _all_lp_tokens_compositions: List[LpTokenComposition] = []
+_all_pools: Dict[Tuple[str, str, str], AbstractPool] = dict()
 
 
 def is_ready() -> bool:
@@ -88,6 +111,9 @@ def loop():
 
     global _ready
 
+    # same event loop for every sync: gateway connections are kept alive
+    event_loop = asyncio.new_event_loop()
+
     delta = timedelta(seconds=30)
     start = datetime.min
     while not _must_stop:
@@ -95,8 +121,8 @@ def loop():
         if now - start > delta:
 
             redis_lock_and_do('sync_pools',
-                              lambda: asyncio.run(
-                                  _sync_all_pools(), debug=False),
+                              lambda: event_loop.run_until_complete(
+                                  _sync_all_pools()),
                               task_ttl=timedelta(seconds=10),
                               lock_ttl=timedelta(seconds=60))
 
@@ -106,12 +132,16 @@ def loop():
 
         sleep(1)
 
+    event_loop.run_until_complete(close_gateway_client())
+    event_loop.close()
+
     logging.info('Stopping pools sync')
 
 
 async def _sync_all_pools():
     _all_rates.clear()
     _all_lp_tokens_compositions.clear()
+    _all_pools.clear()
     _all_pools_map: dict[str, List[SwapPool]] = dict()
 
     functions = [
@@ -148,12 +178,35 @@ async def _sync_all_pools():
     swap_pools.extend(itertools.chain(*_all_pools_map.values()))
 
     set_swap_pools(swap_pools)
+
+    version = uuid.uuid4().hex
+
+    # curves are published before the snapshot they belong to
+    try:
+        _sync_price_impact_curves(version)
+    except:
+        logging.exception('Error while computing price impact curves')
+
+    set_pools_snapshot_version(version)
     set_exchange_rates([x for x in _all_rates])
 
     all_tokens_set = set(_all_tokens.values())
-    set_tokens(await prices_svc.fill_tokens_usd_price(all_tokens_set,
-                                                      _all_rates,
-                                                      _all_lp_tokens_compositions))
+    all_tokens_set = await prices_svc.fill_tokens_usd_price(all_tokens_set,
+                                                            _all_rates,
+                                                            _all_lp_tokens_compositions)
+    set_tokens(all_tokens_set)
+
+    graph = PoolGraph(swap_pools)
+
+    try:
+        _sync_route_table(graph, all_tokens_set)
+    except:
+        logging.exception('Error while computing route table')
+
+    try:
+        _sync_reachability(graph, all_tokens_set)
+    except:
+        logging.exception('Error while computing reachability index')
 
     logging.info(f'Nb swap pools: {len(swap_pools)} (total)')
     logging.info(f'Nb tokens: {len(_all_tokens)} (total)')
@@ -161,6 +214,100 @@ async def _sync_all_pools():
 
     _all_rates.clear()
     _all_lp_tokens_compositions.clear()
+    _all_pools.clear()
+
+
+def _set_dex_aggregator_pool(sc_address: str, token_in: str, token_out: str, pool: AbstractPool):
+    set_dex_aggregator_pool(sc_address, token_in, token_out, pool)
+
+    _all_pools[(sc_address, token_in, token_out)] = pool
+
+
+def _delete_dex_aggregator_pool(sc_address: str, token_in: str, token_out: str):
+    delete_dex_aggregator_pool(sc_address, token_in, token_out)
+
+    _all_pools.pop((sc_address, token_in, token_out), None)
+
+
+def _sync_price_impact_curves(version: str):
+    curves: Dict[Tuple[str, str, str], PriceImpactCurve] = {}
+
+    for key, pool in _all_pools.items():
+        _, token_in, token_out = key
+
+        try:
+            curve = pool.price_impact_curve(get_or_fetch_token(token_in),
+                                            get_or_fetch_token(token_out))
+        except:
+            logging.exception(f'Error while sampling pool {key}')
+            continue
+
+        if curve is not None:
+            curves[key] = curve
+
+    set_price_impact_curves(version, curves)
+
+    logging.info(f'Price impact curves: {len(curves)}/{len(_all_pools)}')
+
+
+def _sync_route_table(graph: PoolGraph, tokens: Set[Esdt]):
+    """
+    Precompute sorted routes of hub token pairs and of most requested pairs.
+
+    The table is versioned with the topology of the swap pools snapshot, so
+    pairs are only computed again when the topology changes.
+    """
+    start = datetime.now()
+
+    hub_tokens = _liquid_token_ids(tokens, ROUTE_TABLE_NB_HUB_TOKENS)
+
+    pairs = set(permutations(hub_tokens, 2))
+    pairs.update(get_most_requested_route_pairs(ROUTE_TABLE_NB_REQUESTED_PAIRS))
+
+    known_pairs = set(get_route_table_pairs(graph.version))
+
+    missing_pairs = sorted(p for p in pairs if p not in known_pairs)
+
+    set_route_table_routes(graph.version,
+                           routes_svc.build_route_table(graph, missing_pairs))
+
+    logging.info(f'Route table {graph.version}: {len(missing_pairs)} new pairs '
+                 f'({len(pairs)} total) computed in {datetime.now() - start}')
+
+
+def _sync_reachability(graph: PoolGraph, tokens: Set[Esdt]):
+    """
+    Publish connected components and hop distances from/to the most liquid
+    tokens, used to answer unreachable pairs without searching.
+    """
+    start = datetime.now()
+
+    hub_tokens = _liquid_token_ids(tokens, REACHABILITY_NB_HUB_TOKENS)
+
+    set_tokens_reachability(graph.version,
+                            build_tokens_reachability(graph, hub_tokens))
+
+    logging.info(f'Reachability index {graph.version}: {len(hub_tokens)} hubs '
+                 f'computed in {datetime.now() - start}')
+
+
+def _liquid_token_ids(tokens: Set[Esdt], count: int) -> List[str]:
+    liquidity_per_token: dict[str, float] = dict()
+
+    for rate in _all_rates:
+        liquidity_per_token[rate.base_token_id] = \
+            liquidity_per_token.get(rate.base_token_id, 0) + rate.base_token_liquidity
+
+    def _usd_liquidity(token: Esdt) -> float:
+        return liquidity_per_token.get(token.identifier, 0) \
+            * token.usd_price / 10**token.decimals
+
+    liquid_tokens = sorted((t for t in tokens
+                            if t.usd_price and not t.is_lp_token),
+                           key=_usd_liquidity,
+                           reverse=True)
+
+    return [t.identifier for t in liquid_tokens[:count]]
 
 
 async def _safely_do(function_: Callable[..., None]) -> List[SwapPool]:
@@ -175,37 +322,37 @@ async def _sync_xexchange_pools() -> List[SwapPool]:
 
     lp_statuses: List[XExchangePoolStatus] = []
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
+    http_client = gateway_client()
 
-        done = False
-        from_ = 0
-        size = 500
+    done = False
+    from_ = 0
+    size = 500
 
-        while not done:
-            logging.info(f'Loading xExchange pools ({from_},{size})')
+    while not done:
+        logging.info(f'Loading xExchange pools ({from_},{size})')
 
-            res = await async_sc_query(http_client,
-                                       sc_address_aggregator(),
-                                       'getXExchangePoolsV2',
-                                       [from_, size])
+        res = await async_sc_query(http_client,
+                                   sc_address_aggregator(),
+                                   'getXExchangePoolsV2',
+                                   [from_, size])
 
-            if res is None:
-                logging.error(
-                    f'Error calling "getXExchangePoolsV2" ({from_},{size}) from aggregator SC')
-                return None
+        if res is None:
+            logging.error(
+                f'Error calling "getXExchangePoolsV2" ({from_},{size}) from aggregator SC')
+            return None
 
-            has_more = res[-1] == '01'
-            res = res[:-1]
+        has_more = res[-1] == '01'
+        res = res[:-1]
 
-            lp_statuses.extend([x for x in
-                                [parse_xexchange_pool_status(r)
-                                    for r in res]
-                                if x])
+        lp_statuses.extend([x for x in
+                            [parse_xexchange_pool_status(r)
+                                for r in res]
+                            if x])
 
-            if not has_more:
-                done = True
+        if not has_more:
+            done = True
 
-            from_ += size
+        from_ += size
 
     logging.info(f'xExchange: pairs before filter {len(lp_statuses)}')
 
@@ -255,9 +402,9 @@ async def _sync_xexchange_pools() -> List[SwapPool]:
                                                second_token.identifier],
                                    type=SC_TYPE_XEXCHANGE))
 
-        set_dex_aggregator_pool(
+        _set_dex_aggregator_pool(
             lp_status.sc_address, first_token.identifier, second_token.identifier, pool)
-        set_dex_aggregator_pool(
+        _set_dex_aggregator_pool(
             lp_status.sc_address, second_token.identifier, first_token.identifier, pool)
 
     logging.info('Loading xExchange pools - done')
@@ -275,56 +422,56 @@ async def _sync_onedex_pools() -> List[SwapPool]:
 
     pairs = []
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
+    http_client = gateway_client()
 
-        res = await async_sc_query(http_client,
-                                   sc_address,
-                                   function='getMainPairTokens',
-                                   args=[])
-        if res is not None:
-            main_pair_tokens = [hex2str(r) for r in res]
-        else:
-            logging.error('Error calling "getMainPairTokens" from OneDex SC')
-            return []
+    res = await async_sc_query(http_client,
+                               sc_address,
+                               function='getMainPairTokens',
+                               args=[])
+    if res is not None:
+        main_pair_tokens = [hex2str(r) for r in res]
+    else:
+        logging.error('Error calling "getMainPairTokens" from OneDex SC')
+        return []
 
-        res = await async_sc_query(http_client,
-                                   sc_address,
-                                   function='getLastPairId',
-                                   args=[])
-        if res is not None and len(res) > 0:
-            last_pair_id = hex2dec(res[0])
-        else:
-            logging.error('Error calling "getLastPairId" from OneDex SC')
-            return []
+    res = await async_sc_query(http_client,
+                               sc_address,
+                               function='getLastPairId',
+                               args=[])
+    if res is not None and len(res) > 0:
+        last_pair_id = hex2dec(res[0])
+    else:
+        logging.error('Error calling "getLastPairId" from OneDex SC')
+        return []
 
-        logging.info(f'OneDex: pairs to load {last_pair_id}')
+    logging.info(f'OneDex: pairs to load {last_pair_id}')
 
-        all_pairs: List[OneDexPair] = []
-        from_ = 0
-        size = 250
+    all_pairs: List[OneDexPair] = []
+    from_ = 0
+    size = 250
 
-        while from_ < last_pair_id:
+    while from_ < last_pair_id:
 
-            res = await async_sc_query(http_client,
-                                       sc_address,
-                                       function='viewPairsPaginated',
-                                       args=[from_, size])
+        res = await async_sc_query(http_client,
+                                   sc_address,
+                                   function='viewPairsPaginated',
+                                   args=[from_, size])
 
-            if res is not None and len(res) > 0:
-                pairs = [parse_onedex_pair(r) for r in res]
-                all_pairs.extend(pairs)
+        if res is not None and len(res) > 0:
+            pairs = [parse_onedex_pair(r) for r in res]
+            all_pairs.extend(pairs)
 
-            from_ += size
+        from_ += size
 
-        logging.info(f'OneDex: pairs before {len(all_pairs)}')
+    logging.info(f'OneDex: pairs before {len(all_pairs)}')
 
-        all_pairs = [p for p in all_pairs
-                     if p.state == 1
-                     and _is_pair_valid([(p.first_token_identifier, p.first_token_reserve),
-                                         (p.second_token_identifier, p.second_token_reserve)],
-                                        sc_address)]
+    all_pairs = [p for p in all_pairs
+                 if p.state == 1
+                 and _is_pair_valid([(p.first_token_identifier, p.first_token_reserve),
+                                     (p.second_token_identifier, p.second_token_reserve)],
+                                    sc_address)]
 
-        logging.info(f'OneDex: pairs after {len(all_pairs)}')
+    logging.info(f'OneDex: pairs after {len(all_pairs)}')
 
     swap_pools = []
 
@@ -364,9 +511,9 @@ async def _sync_onedex_pools() -> List[SwapPool]:
                                                second_token.identifier],
                                    type=SC_TYPE_ONEDEX))
 
-        set_dex_aggregator_pool(
+        _set_dex_aggregator_pool(
             sc_address, pair.first_token_identifier, pair.second_token_identifier, pool)
-        set_dex_aggregator_pool(
+        _set_dex_aggregator_pool(
             sc_address, pair.second_token_identifier, pair.first_token_identifier, pool)
 
     logging.info('Loading OneDex pools - done')
@@ -381,68 +528,68 @@ async def _sync_ashswap_stable_pools() -> List[SwapPool]:
 
     swap_pools = []
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
+    http_client = gateway_client()
 
-        res = await async_sc_query(http_client,
-                                   agg_sc,
-                                   'getAshSwapStablePools')
+    res = await async_sc_query(http_client,
+                               agg_sc,
+                               'getAshSwapStablePools')
+
+    pools = []
 
-        pools = []
+    if res is not None:
+        stablepools_statuses = [parse_ashswap_stablepool_status(r)
+                                for r in res]
 
-        if res is not None:
-            stablepools_statuses = [parse_ashswap_stablepool_status(r)
-                                    for r in res]
-
-            stablepools_statuses = [s for s in stablepools_statuses
-                                    if s.state == 1
-                                    and _is_pair_valid([(t, r) for t, r in zip(s.tokens, s.reserves)],
-                                                       s.sc_address)]
-
-            for status in stablepools_statuses:
-
-                tokens = [_get_or_fetch_token(x)
-                          for x in status.tokens]
-
-                lp_token_name = f"LP {'/'.join((t.ticker for t in tokens))} (AshSwap)"
-                lp_token = _get_or_fetch_token(status.lp_token_id,
-                                               is_lp_token=True,
-                                               exchange='ashswap',
-                                               custom_name=lp_token_name)
-
-                for token in tokens:
-                    _all_tokens[token.identifier] = token
-                _all_tokens[lp_token.identifier] = lp_token
-
-                if tokens.count(None) > 0:
-                    continue
-
-                pool = AshSwapStableSwapPool(amp_factor=status.amp_factor,
-                                             swap_fee=status.swap_fee_percent,
-                                             tokens=tokens,
-                                             reserves=status.reserves,
-                                             underlying_prices=status.underlying_prices,
-                                             lp_token=lp_token,
-                                             lp_token_supply=status.lp_token_supply)
-                pools.append(pool)
-
-                _all_lp_tokens_compositions.append(pool.lp_token_composition())
-
-                _all_rates.update(pool.exchange_rates(
-                    sc_address=status.sc_address))
-
-                token_ids = [t.identifier for t in tokens]
-                swap_pools.append(SwapPool(name=f"AshSwap: {'/'.join([t.name for t in tokens])}",
-                                           sc_address=status.sc_address,
-                                           tokens_in=token_ids,
-                                           tokens_out=token_ids,
-                                           type=SC_TYPE_ASHSWAP_STABLEPOOL))
-
-                for t1, t2 in product(tokens, tokens):
-                    if t1.identifier != t2.identifier:
-                        set_dex_aggregator_pool(status.sc_address,
-                                                t1.identifier,
-                                                t2.identifier,
-                                                pool)
+        stablepools_statuses = [s for s in stablepools_statuses
+                                if s.state == 1
+                                and _is_pair_valid([(t, r) for t, r in zip(s.tokens, s.reserves)],
+                                                   s.sc_address)]
+
+        for status in stablepools_statuses:
+
+            tokens = [_get_or_fetch_token(x)
+                      for x in status.tokens]
+
+            lp_token_name = f"LP {'/'.join((t.ticker for t in tokens))} (AshSwap)"
+            lp_token = _get_or_fetch_token(status.lp_token_id,
+                                           is_lp_token=True,
+                                           exchange='ashswap',
+                                           custom_name=lp_token_name)
+
+            for token in tokens:
+                _all_tokens[token.identifier] = token
+            _all_tokens[lp_token.identifier] = lp_token
+
+            if tokens.count(None) > 0:
+                continue
+
+            pool = AshSwapStableSwapPool(amp_factor=status.amp_factor,
+                                         swap_fee=status.swap_fee_percent,
+                                         tokens=tokens,
+                                         reserves=status.reserves,
+                                         underlying_prices=status.underlying_prices,
+                                         lp_token=lp_token,
+                                         lp_token_supply=status.lp_token_supply)
+            pools.append(pool)
+
+            _all_lp_tokens_compositions.append(pool.lp_token_composition())
+
+            _all_rates.update(pool.exchange_rates(
+                sc_address=status.sc_address))
+
+            token_ids = [t.identifier for t in tokens]
+            swap_pools.append(SwapPool(name=f"AshSwap: {'/'.join([t.name for t in tokens])}",
+                                       sc_address=status.sc_address,
+                                       tokens_in=token_ids,
+                                       tokens_out=token_ids,
+                                       type=SC_TYPE_ASHSWAP_STABLEPOOL))
+
+            for t1, t2 in product(tokens, tokens):
+                if t1.identifier != t2.identifier:
+                    _set_dex_aggregator_pool(status.sc_address,
+                                             t1.identifier,
+                                             t2.identifier,
+                                             pool)
 
     logging.info(f'AshSwap stable pools: {len(pools)}')
 
@@ -458,71 +605,71 @@ async def _sync_ashswap_v2_pools() -> List[SwapPool]:
 
     swap_pools = []
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
-        pools = []
+    http_client = gateway_client()
+    pools = []
+
+    res = await async_sc_query(http_client,
+                               agg_sc,
+                               'getAshSwapV2Pools')
 
-        res = await async_sc_query(http_client,
-                                   agg_sc,
-                                   'getAshSwapV2Pools')
+    if res is not None:
+        v2_pools_statuses = [
+            parse_ashswap_v2_pool_status(r) for r in res]
 
-        if res is not None:
-            v2_pools_statuses = [
-                parse_ashswap_v2_pool_status(r) for r in res]
-
-            v2_pools_statuses = [s for s in v2_pools_statuses
-                                 if s.state == 1
-                                 and _is_pair_valid([(t, r) for t, r in zip(s.tokens, s.reserves)],
-                                                    s.sc_address)]
-
-            for status in v2_pools_statuses:
-
-                tokens = [_get_or_fetch_token(x)
-                          for x in status.tokens]
-                lp_token = _get_or_fetch_token(status.lp_token_id,
-                                               is_lp_token=True,
-                                               exchange='ashswap',
-                                               custom_name=f'LP {tokens[0].ticker}/{tokens[1].ticker} (AshSwap)')
-
-                for token in tokens:
-                    _all_tokens[token.identifier] = token
-                _all_tokens[lp_token.identifier] = lp_token
-
-                if tokens.count(None) > 0:
-                    continue
-
-                pool = AshSwapPoolV2(amp=status.amp_factor,
-                                     d=status.d,
-                                     fee_gamma=status.fee_gamma,
-                                     future_a_gamma_time=status.future_a_gamma_time,
-                                     gamma=status.gamma,
-                                     mid_fee=status.mid_fee,
-                                     out_fee=status.out_fee,
-                                     price_scale=status.price_scale,
-                                     reserves=status.reserves,
-                                     tokens=tokens,
-                                     xp=status.xp,
-                                     lp_token=lp_token,
-                                     lp_token_supply=status.lp_token_supply)
-                pools.append(pool)
-
-                _all_rates.update(pool.exchange_rates(
-                    sc_address=status.sc_address))
-
-                _all_lp_tokens_compositions.append(pool.lp_token_composition())
-
-                token_ids = [t.identifier for t in tokens]
-                swap_pools.append(SwapPool(name=f"AshSwap: {'/'.join([t.name for t in tokens])}",
-                                           sc_address=status.sc_address,
-                                           tokens_in=token_ids,
-                                           tokens_out=token_ids,
-                                           type=SC_TYPE_ASHSWAP_V2))
-
-                for t1, t2 in product(tokens, tokens):
-                    if t1.identifier != t2.identifier:
-                        set_dex_aggregator_pool(status.sc_address,
-                                                t1.identifier,
-                                                t2.identifier,
-                                                pool)
+        v2_pools_statuses = [s for s in v2_pools_statuses
+                             if s.state == 1
+                             and _is_pair_valid([(t, r) for t, r in zip(s.tokens, s.reserves)],
+                                                s.sc_address)]
+
+        for status in v2_pools_statuses:
+
+            tokens = [_get_or_fetch_token(x)
+                      for x in status.tokens]
+            lp_token = _get_or_fetch_token(status.lp_token_id,
+                                           is_lp_token=True,
+                                           exchange='ashswap',
+                                           custom_name=f'LP {tokens[0].ticker}/{tokens[1].ticker} (AshSwap)')
+
+            for token in tokens:
+                _all_tokens[token.identifier] = token
+            _all_tokens[lp_token.identifier] = lp_token
+
+            if tokens.count(None) > 0:
+                continue
+
+            pool = AshSwapPoolV2(amp=status.amp_factor,
+                                 d=status.d,
+                                 fee_gamma=status.fee_gamma,
+                                 future_a_gamma_time=status.future_a_gamma_time,
+                                 gamma=status.gamma,
+                                 mid_fee=status.mid_fee,
+                                 out_fee=status.out_fee,
+                                 price_scale=status.price_scale,
+                                 reserves=status.reserves,
+                                 tokens=tokens,
+                                 xp=status.xp,
+                                 lp_token=lp_token,
+                                 lp_token_supply=status.lp_token_supply)
+            pools.append(pool)
+
+            _all_rates.update(pool.exchange_rates(
+                sc_address=status.sc_address))
+
+            _all_lp_tokens_compositions.append(pool.lp_token_composition())
+
+            token_ids = [t.identifier for t in tokens]
+            swap_pools.append(SwapPool(name=f"AshSwap: {'/'.join([t.name for t in tokens])}",
+                                       sc_address=status.sc_address,
+                                       tokens_in=token_ids,
+                                       tokens_out=token_ids,
+                                       type=SC_TYPE_ASHSWAP_V2))
+
+            for t1, t2 in product(tokens, tokens):
+                if t1.identifier != t2.identifier:
+                    _set_dex_aggregator_pool(status.sc_address,
+                                             t1.identifier,
+                                             t2.identifier,
+                                             pool)
 
     logging.info(f'AshSwap V2 pools: {len(pools)}')
 
@@ -536,115 +683,115 @@ async def _sync_jex_cp_pools() -> List[SwapPool]:
 
     swap_pools = []
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
+    http_client = gateway_client()
 
-        res = await async_sc_query(http_client,
-                                   sc_address_aggregator(),
-                                   'getJexCpPools')
+    res = await async_sc_query(http_client,
+                               sc_address_aggregator(),
+                               'getJexCpPools')
 
-        if res is None:
-            logging.error('Error fetching JEX CP pools')
-            return []
+    if res is None:
+        logging.error('Error fetching JEX CP pools')
+        return []
 
-        sc_addresses = [parse_address(x)[0] for i, x in enumerate(res)
-                        if i % 2 == 0]
+    sc_addresses = [parse_address(x)[0] for i, x in enumerate(res)
+                    if i % 2 == 0]
 
-        lp_statuses = [x for i, x in enumerate(res)
-                       if i % 2 == 1]
+    lp_statuses = [x for i, x in enumerate(res)
+                   if i % 2 == 1]
 
-        lp_statuses = [parse_jex_cp_lp_status(sc_addresses[i].bech32(), x)
-                       for i, x in enumerate(lp_statuses)]
+    lp_statuses = [parse_jex_cp_lp_status(sc_addresses[i].bech32(), x)
+                   for i, x in enumerate(lp_statuses)]
 
-        nb_pools = 0
+    nb_pools = 0
 
-        for lp_status in lp_statuses:
+    for lp_status in lp_statuses:
 
-            lp_fees_percent_base_pts = lp_status.lp_fees
-            platform_fees_percent_base_pts = lp_status.platform_fees
-            first_token = _get_or_fetch_token(lp_status.first_token_identifier)
-            first_token_reserves = int(lp_status.first_token_reserve)
-            second_token = _get_or_fetch_token(
-                lp_status.second_token_identifier)
-            second_token_reserves = int(lp_status.second_token_reserve)
-            lp_token_supply = int(lp_status.lp_token_supply)
+        lp_fees_percent_base_pts = lp_status.lp_fees
+        platform_fees_percent_base_pts = lp_status.platform_fees
+        first_token = _get_or_fetch_token(lp_status.first_token_identifier)
+        first_token_reserves = int(lp_status.first_token_reserve)
+        second_token = _get_or_fetch_token(
+            lp_status.second_token_identifier)
+        second_token_reserves = int(lp_status.second_token_reserve)
+        lp_token_supply = int(lp_status.lp_token_supply)
+
+        if not lp_status.paused:
+            custom_name = f'LP {first_token.ticker}/{second_token.ticker} (JEXchange)'
+        else:
+            custom_name = None
 
-            if not lp_status.paused:
-                custom_name = f'LP {first_token.ticker}/{second_token.ticker} (JEXchange)'
-            else:
-                custom_name = None
+        _all_tokens[first_token.identifier] = first_token
+        _all_tokens[second_token.identifier] = second_token
 
-            _all_tokens[first_token.identifier] = first_token
-            _all_tokens[second_token.identifier] = second_token
+        if not lp_status.lp_token_identifier:
+            continue
 
-            if not lp_status.lp_token_identifier:
-                continue
+        lp_token = _get_or_fetch_token(lp_status.lp_token_identifier,
+                                       is_lp_token=True,
+                                       exchange='jexchange',
+                                       custom_name=custom_name)
 
-            lp_token = _get_or_fetch_token(lp_status.lp_token_identifier,
-                                           is_lp_token=True,
-                                           exchange='jexchange',
-                                           custom_name=custom_name)
+        _all_tokens[lp_token.identifier] = lp_token
 
-            _all_tokens[lp_token.identifier] = lp_token
+        if lp_status.paused:
+            continue
 
-            if lp_status.paused:
-                continue
+        pool = JexConstantProductPool(
+            lp_fee=lp_fees_percent_base_pts,
+            platform_fee=platform_fees_percent_base_pts,
+            first_token=first_token,
+            first_token_reserves=first_token_reserves,
+            lp_token=lp_token,
+            lp_token_supply=lp_token_supply,
+            second_token=second_token,
+            second_token_reserves=second_token_reserves)
 
-            pool = JexConstantProductPool(
-                lp_fee=lp_fees_percent_base_pts,
-                platform_fee=platform_fees_percent_base_pts,
-                first_token=first_token,
-                first_token_reserves=first_token_reserves,
-                lp_token=lp_token,
-                lp_token_supply=lp_token_supply,
-                second_token=second_token,
-                second_token_reserves=second_token_reserves)
+        _all_rates.update(pool.exchange_rates(
+            sc_address=lp_status.sc_address))
 
-            _all_rates.update(pool.exchange_rates(
-                sc_address=lp_status.sc_address))
+        _all_lp_tokens_compositions.append(pool.lp_token_composition())
 
-            _all_lp_tokens_compositions.append(pool.lp_token_composition())
+        if not _is_pair_valid([(first_token.identifier, first_token_reserves),
+                               (second_token.identifier, second_token_reserves)],
+                              lp_status.sc_address):
+            continue
 
-            if not _is_pair_valid([(first_token.identifier, first_token_reserves),
-                                   (second_token.identifier, second_token_reserves)],
-                                  lp_status.sc_address):
-                continue
+        _set_dex_aggregator_pool(
+            lp_status.sc_address, first_token.identifier, second_token.identifier, pool)
+        _set_dex_aggregator_pool(
+            lp_status.sc_address, second_token.identifier, first_token.identifier, pool)
+
+        swap_pools.append(SwapPool(name=f'JEX: {first_token.name}/{second_token.name}',
+                                   sc_address=lp_status.sc_address,
+                                   tokens_in=[first_token.identifier,
+                                              second_token.identifier],
+                                   tokens_out=[first_token.identifier,
+                                               second_token.identifier],
+                                   type=SC_TYPE_JEXCHANGE_LP))
+
+        deposit_pool = JexConstantProductDepositPool(
+            lp_fee=lp_fees_percent_base_pts,
+            platform_fee=platform_fees_percent_base_pts,
+            first_token=first_token,
+            first_token_reserves=first_token_reserves,
+            lp_token=lp_token,
+            lp_token_supply=lp_token_supply,
+            second_token=second_token,
+            second_token_reserves=second_token_reserves)
+
+        _set_dex_aggregator_pool(lp_status.sc_address, first_token.identifier,
+                                 lp_status.lp_token_identifier, deposit_pool)
+        _set_dex_aggregator_pool(lp_status.sc_address, second_token.identifier,
+                                 lp_status.lp_token_identifier, deposit_pool)
+
+        swap_pools.append(SwapPool(name=f'JEX: {first_token.name}/{second_token.name} (D)',
+                                   sc_address=lp_status.sc_address,
+                                   tokens_in=[first_token.identifier,
+                                              second_token.identifier],
+                                   tokens_out=[lp_token.identifier],
+                                   type=SC_TYPE_JEXCHANGE_LP_DEPOSIT))
 
-            set_dex_aggregator_pool(
-                lp_status.sc_address, first_token.identifier, second_token.identifier, pool)
-            set_dex_aggregator_pool(
-                lp_status.sc_address, second_token.identifier, first_token.identifier, pool)
-
-            swap_pools.append(SwapPool(name=f'JEX: {first_token.name}/{second_token.name}',
-                                       sc_address=lp_status.sc_address,
-                                       tokens_in=[first_token.identifier,
-                                                  second_token.identifier],
-                                       tokens_out=[first_token.identifier,
-                                                   second_token.identifier],
-                                       type=SC_TYPE_JEXCHANGE_LP))
-
-            deposit_pool = JexConstantProductDepositPool(
-                lp_fee=lp_fees_percent_base_pts,
-                platform_fee=platform_fees_percent_base_pts,
-                first_token=first_token,
-                first_token_reserves=first_token_reserves,
-                lp_token=lp_token,
-                lp_token_supply=lp_token_supply,
-                second_token=second_token,
-                second_token_reserves=second_token_reserves)
-
-            set_dex_aggregator_pool(lp_status.sc_address, first_token.identifier,
-                                    lp_status.lp_token_identifier, deposit_pool)
-            set_dex_aggregator_pool(lp_status.sc_address, second_token.identifier,
-                                    lp_status.lp_token_identifier, deposit_pool)
-
-            swap_pools.append(SwapPool(name=f'JEX: {first_token.name}/{second_token.name} (D)',
-                                       sc_address=lp_status.sc_address,
-                                       tokens_in=[first_token.identifier,
-                                                  second_token.identifier],
-                                       tokens_out=[lp_token.identifier],
-                                       type=SC_TYPE_JEXCHANGE_LP_DEPOSIT))
-
-            nb_pools += 1
+        nb_pools += 1
 
     logging.info(f'JEX CP pools: {nb_pools}')
 
@@ -663,106 +810,106 @@ async def _sync_jex_stablepools() -> List[SwapPool]:
 
     swap_pools = []
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
+    http_client = gateway_client()
+
+    lp_statuses: List[JexStablePoolStatus] = []
+    done = False
+    from_ = 0
+    size = 500
 
-        lp_statuses: List[JexStablePoolStatus] = []
-        done = False
-        from_ = 0
-        size = 500
+    while not done:
+        logging.info(f'Loading JEX stable pools ({from_},{size})')
+
+        res = await async_sc_query(http_client,
+                                   sc_address_aggregator(),
+                                   'getJexStablePools',
+                                   [from_, size])
 
-        while not done:
-            logging.info(f'Loading JEX stable pools ({from_},{size})')
+        if res is None:
+            logging.error(f'Error calling getJexStablePools ({from_},{size})'
+                          ' from aggregator SC')
+            return []
 
-            res = await async_sc_query(http_client,
-                                       sc_address_aggregator(),
-                                       'getJexStablePools',
-                                       [from_, size])
+        has_more = res[-1] == '01'
+        res = res[:-1]
 
-            if res is None:
-                logging.error(f'Error calling getJexStablePools ({from_},{size})'
-                              ' from aggregator SC')
-                return []
+        new_lp_statuses = [parse_jex_stablepool_status(x)
+                           for x in res]
 
-            has_more = res[-1] == '01'
-            res = res[:-1]
+        lp_statuses.extend(new_lp_statuses)
 
-            new_lp_statuses = [parse_jex_stablepool_status(x)
-                               for x in res]
+        from_ += size
 
-            lp_statuses.extend(new_lp_statuses)
+        if not has_more:
+            done = True
 
-            from_ += size
+    nb_pools = 0
 
-            if not has_more:
-                done = True
+    for lp_status in lp_statuses:
 
-        nb_pools = 0
+        if lp_status.paused:
+            continue
 
-        for lp_status in lp_statuses:
+        tokens = [_get_or_fetch_token(x)
+                  for x in lp_status.tokens]
+        reserves = [int(x) for x in lp_status.reserves]
+        underlying_prices = [int(x) for x in lp_status.underlying_prices]
 
-            if lp_status.paused:
-                continue
+        lp_token_name = f"LP {'/'.join((t.ticker for t in tokens))} (JEX)"
+        lp_token = _get_or_fetch_token(lp_status.lp_token_identifier,
+                                       is_lp_token=True,
+                                       exchange='jexchange',
+                                       custom_name=lp_token_name)
 
-            tokens = [_get_or_fetch_token(x)
-                      for x in lp_status.tokens]
-            reserves = [int(x) for x in lp_status.reserves]
-            underlying_prices = [int(x) for x in lp_status.underlying_prices]
+        for token in tokens:
+            _all_tokens[token.identifier] = token
+        _all_tokens[lp_token.identifier] = lp_token
 
-            lp_token_name = f"LP {'/'.join((t.ticker for t in tokens))} (JEX)"
-            lp_token = _get_or_fetch_token(lp_status.lp_token_identifier,
-                                           is_lp_token=True,
-                                           exchange='jexchange',
-                                           custom_name=lp_token_name)
+        lp_token_supply = int(lp_status.lp_token_supply)
 
-            for token in tokens:
-                _all_tokens[token.identifier] = token
-            _all_tokens[lp_token.identifier] = lp_token
+        pool = JexStableSwapPool(amp_factor=lp_status.amp_factor,
+                                 swap_fee=lp_status.swap_fee,
+                                 lp_token=lp_token,
+                                 lp_token_supply=lp_token_supply,
+                                 tokens=tokens,
+                                 reserves=reserves,
+                                 underlying_prices=underlying_prices)
 
-            lp_token_supply = int(lp_status.lp_token_supply)
+        _all_lp_tokens_compositions.append(pool.lp_token_composition())
 
-            pool = JexStableSwapPool(amp_factor=lp_status.amp_factor,
-                                     swap_fee=lp_status.swap_fee,
-                                     lp_token=lp_token,
-                                     lp_token_supply=lp_token_supply,
-                                     tokens=tokens,
-                                     reserves=reserves,
-                                     underlying_prices=underlying_prices)
+        token_ids = [t.identifier for t in tokens]
+        swap_pools.append(SwapPool(name=f"JEX: {'/'.join([t.name for t in tokens])}",
+                                   sc_address=lp_status.sc_address,
+                                   tokens_in=token_ids,
+                                   tokens_out=token_ids,
+                                   type=SC_TYPE_JEXCHANGE_STABLEPOOL))
 
-            _all_lp_tokens_compositions.append(pool.lp_token_composition())
+        deposit_pool = JexStableSwapPoolDeposit(amp_factor=lp_status.amp_factor,
+                                                total_fees=lp_status.swap_fee,
+                                                tokens=tokens,
+                                                lp_token=lp_token,
+                                                lp_token_supply=lp_token_supply,
+                                                reserves=reserves,
+                                                underlying_prices=underlying_prices)
 
-            token_ids = [t.identifier for t in tokens]
-            swap_pools.append(SwapPool(name=f"JEX: {'/'.join([t.name for t in tokens])}",
-                                       sc_address=lp_status.sc_address,
-                                       tokens_in=token_ids,
-                                       tokens_out=token_ids,
-                                       type=SC_TYPE_JEXCHANGE_STABLEPOOL))
-
-            deposit_pool = JexStableSwapPoolDeposit(amp_factor=lp_status.amp_factor,
-                                                    total_fees=lp_status.swap_fee,
-                                                    tokens=tokens,
-                                                    lp_token=lp_token,
-                                                    lp_token_supply=lp_token_supply,
-                                                    reserves=reserves,
-                                                    underlying_prices=underlying_prices)
-
-            swap_pools.append(SwapPool(name=f"JEX: {'/'.join([t.name for t in tokens])} (D)",
-                                       sc_address=lp_status.sc_address,
-                                       tokens_in=token_ids,
-                                       tokens_out=[
-                                           lp_status.lp_token_identifier],
-                                       type=SC_TYPE_JEXCHANGE_STABLEPOOL_DEPOSIT))
+        swap_pools.append(SwapPool(name=f"JEX: {'/'.join([t.name for t in tokens])} (D)",
+                                   sc_address=lp_status.sc_address,
+                                   tokens_in=token_ids,
+                                   tokens_out=[
+                                       lp_status.lp_token_identifier],
+                                   type=SC_TYPE_JEXCHANGE_STABLEPOOL_DEPOSIT))
 
-            for t1, t2 in product(lp_status.tokens, lp_status.tokens):
-                if t1 != t2:
-                    set_dex_aggregator_pool(lp_status.sc_address, t1, t2, pool)
+        for t1, t2 in product(lp_status.tokens, lp_status.tokens):
+            if t1 != t2:
+                _set_dex_aggregator_pool(lp_status.sc_address, t1, t2, pool)
 
-            for t in lp_status.tokens:
-                set_dex_aggregator_pool(lp_status.sc_address,
-                                        t,
-                                        lp_status.lp_token_identifier,
-                                        deposit_pool)
+        for t in lp_status.tokens:
+            _set_dex_aggregator_pool(lp_status.sc_address,
+                                     t,
+                                     lp_status.lp_token_identifier,
+                                     deposit_pool)
 
-            nb_pools += 1
+        nb_pools += 1
 
     logging.info(f'JEX stable pools: {nb_pools}')
 
@@ -795,67 +942,67 @@ async def _sync_hatom_staking_pool(sc_address: str,
                                    exchange_rate_view='getExchangeRate') -> List[SwapPool]:
     swap_pools = []
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
+    http_client = gateway_client()
 
-        res = await async_sc_query(http_client,
-                                   sc_address,
-                                   function=exchange_rate_view)
+    res = await async_sc_query(http_client,
+                               sc_address,
+                               function=exchange_rate_view)
 
-        if res is None:
-            return []
+    if res is None:
+        return []
 
-        exchange_rate = hex2dec(res[0])
+    exchange_rate = hex2dec(res[0])
 
-        token = _get_or_fetch_token(token_id)
-        ls_token = _get_or_fetch_token(ls_token_id)
+    token = _get_or_fetch_token(token_id)
+    ls_token = _get_or_fetch_token(ls_token_id)
 
-        _all_tokens[token.identifier] = token
-        _all_tokens[ls_token.identifier] = ls_token
+    _all_tokens[token.identifier] = token
+    _all_tokens[ls_token.identifier] = ls_token
 
-        stake_pool = HatomConstantPricePool(exchange_rate,
-                                            token_in=token,
-                                            token_out=ls_token,
-                                            token_out_reserve=99999*10**ls_token.decimals)
+    stake_pool = HatomConstantPricePool(exchange_rate,
+                                        token_in=token,
+                                        token_out=ls_token,
+                                        token_out_reserve=99999*10**ls_token.decimals)
 
-        swap_pools.append(SwapPool(name=f'Hatom (stake)',
-                                   sc_address=sc_address,
-                                   tokens_in=[token.identifier],
-                                   tokens_out=[ls_token.identifier],
-                                   type=SC_TYPE_HATOM_STAKE))
+    swap_pools.append(SwapPool(name=f'Hatom (stake)',
+                               sc_address=sc_address,
+                               tokens_in=[token.identifier],
+                               tokens_out=[ls_token.identifier],
+                               type=SC_TYPE_HATOM_STAKE))
 
-        _all_rates.update(stake_pool.exchange_rates(sc_address=sc_address))
+    _all_rates.update(stake_pool.exchange_rates(sc_address=sc_address))
 
-        set_dex_aggregator_pool(sc_address,
-                                token.identifier,
-                                ls_token.identifier,
-                                stake_pool)
+    _set_dex_aggregator_pool(sc_address,
+                             token.identifier,
+                             ls_token.identifier,
+                             stake_pool)
 
-        if allow_unstake:
-            # get cash reserves
-            res = await async_sc_query(http_client,
-                                       sc_address,
-                                       function='getCash')
+    if allow_unstake:
+        # get cash reserves
+        res = await async_sc_query(http_client,
+                                   sc_address,
+                                   function='getCash')
 
-            if res is not None:
-                cash_reserve = hex2dec(res[0])
+        if res is not None:
+            cash_reserve = hex2dec(res[0])
 
-                unstake_rate = 10**18 * 10**18 // exchange_rate
+            unstake_rate = 10**18 * 10**18 // exchange_rate
 
-                unstake_pool = HatomConstantPricePool(unstake_rate,
-                                                      token_in=ls_token,
-                                                      token_out=token,
-                                                      token_out_reserve=cash_reserve)
+            unstake_pool = HatomConstantPricePool(unstake_rate,
+                                                  token_in=ls_token,
+                                                  token_out=token,
+                                                  token_out_reserve=cash_reserve)
 
-                swap_pools.append(SwapPool(name=f'Hatom (unstake)',
-                                           sc_address=sc_address,
-                                           tokens_in=[ls_token.identifier],
-                                           tokens_out=[token.identifier],
-                                           type=SC_TYPE_HATOM_UNSTAKE))
+            swap_pools.append(SwapPool(name=f'Hatom (unstake)',
+                                       sc_address=sc_address,
+                                       tokens_in=[ls_token.identifier],
+                                       tokens_out=[token.identifier],
+                                       type=SC_TYPE_HATOM_UNSTAKE))
 
-                set_dex_aggregator_pool(sc_address,
-                                        ls_token.identifier,
-                                        token.identifier,
-                                        unstake_pool)
+            _set_dex_aggregator_pool(sc_address,
+                                     ls_token.identifier,
+                                     token.identifier,
+                                     unstake_pool)
 
     return swap_pools
 
@@ -867,104 +1014,104 @@ async def _sync_hatom_money_markets() -> List[SwapPool]:
 
     swap_pools = []
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
-        def _addr(x): return Address.from_bech32(x).pubkey
-
-        args = [
-            _addr('erd1qqqqqqqqqqqqqpgqxerzmkr80xc0qwa8vvm5ug9h8e2y7jgsqk2svevje0'),
-            10**18,  # HTM
-            _addr('erd1qqqqqqqqqqqqqpgqxmn4jlazsjp6gnec95423egatwcdfcjm78ss5q550k'),
-            10**18,  # SEGLD
-            _addr('erd1qqqqqqqqqqqqqpgqkrgsvct7hfx7ru30mfzk3uy6pxzxn6jj78ss84aldu'),
-            1_000000,  # USDC
-            _addr('erd1qqqqqqqqqqqqqpgqvxn0cl35r74tlw2a8d794v795jrzfxyf78sstg8pjr'),
-            1_000000,  # USDT
-            _addr('erd1qqqqqqqqqqqqqpgqta0tv8d5pjzmwzshrtw62n4nww9kxtl278ssspxpxu'),
-            10**18,  # UTK
-            _addr('erd1qqqqqqqqqqqqqpgqg47t8v5nwzvdxgf6g5jkxleuplu8y4f678ssfcg5gy'),
-            10**8,  # WBTC
-            _addr('erd1qqqqqqqqqqqqqpgq8h8upp38fe9p4ny9ecvsett0usu2ep7978ssypgmrs'),
-            10**18,  # WETH
-            _addr('erd1qqqqqqqqqqqqqpgq2rnjnp543m5d8fac8v2ltkr5w2quh0v978ssswj939'),
-            10**18,  # MEX
-            _addr('erd1qqqqqqqqqqqqqpgq35qkf34a8svu4r2zmfzuztmeltqclapv78ss5jleq3'),
-            10**18  # EGLD
-        ]
+    http_client = gateway_client()
+    def _addr(x): return Address.from_bech32(x).pubkey
+
+    args = [
+        _addr('erd1qqqqqqqqqqqqqpgqxerzmkr80xc0qwa8vvm5ug9h8e2y7jgsqk2svevje0'),
+        10**18,  # HTM
+        _addr('erd1qqqqqqqqqqqqqpgqxmn4jlazsjp6gnec95423egatwcdfcjm78ss5q550k'),
+        10**18,  # SEGLD
+        _addr('erd1qqqqqqqqqqqqqpgqkrgsvct7hfx7ru30mfzk3uy6pxzxn6jj78ss84aldu'),
+        1_000000,  # USDC
+        _addr('erd1qqqqqqqqqqqqqpgqvxn0cl35r74tlw2a8d794v795jrzfxyf78sstg8pjr'),
+        1_000000,  # USDT
+        _addr('erd1qqqqqqqqqqqqqpgqta0tv8d5pjzmwzshrtw62n4nww9kxtl278ssspxpxu'),
+        10**18,  # UTK
+        _addr('erd1qqqqqqqqqqqqqpgqg47t8v5nwzvdxgf6g5jkxleuplu8y4f678ssfcg5gy'),
+        10**8,  # WBTC
+        _addr('erd1qqqqqqqqqqqqqpgq8h8upp38fe9p4ny9ecvsett0usu2ep7978ssypgmrs'),
+        10**18,  # WETH
+        _addr('erd1qqqqqqqqqqqqqpgq2rnjnp543m5d8fac8v2ltkr5w2quh0v978ssswj939'),
+        10**18,  # MEX
+        _addr('erd1qqqqqqqqqqqqqpgq35qkf34a8svu4r2zmfzuztmeltqclapv78ss5jleq3'),
+        10**18  # EGLD
+    ]
 
-        res = await async_sc_query(http_client,
-                                   agg_sc,
-                                   'getHatomMoneyMarkets',
-                                   args)
+    res = await async_sc_query(http_client,
+                               agg_sc,
+                               'getHatomMoneyMarkets',
+                               args)
 
-        if res is not None:
-            money_markets = [parse_hatom_mm(r) for r in res]
-        else:
-            logging.error('Error getting Hatom money markets')
-            money_markets = []
+    if res is not None:
+        money_markets = [parse_hatom_mm(r) for r in res]
+    else:
+        logging.error('Error getting Hatom money markets')
+        money_markets = []
 
-        nb_mms = 0
+    nb_mms = 0
 
-        for mm in money_markets:
-            h_token = _get_or_fetch_token(mm.hatom_token_id)
+    for mm in money_markets:
+        h_token = _get_or_fetch_token(mm.hatom_token_id)
 
-            if mm.underlying_id == 'EGLD':
-                underlying_token = _get_or_fetch_token(WEGLD_IDENTIFIER)
-                underlying_token_name = 'EGLD'
-            else:
-                underlying_token = _get_or_fetch_token(mm.underlying_id)
-                underlying_token_name = underlying_token.name
+        if mm.underlying_id == 'EGLD':
+            underlying_token = _get_or_fetch_token(WEGLD_IDENTIFIER)
+            underlying_token_name = 'EGLD'
+        else:
+            underlying_token = _get_or_fetch_token(mm.underlying_id)
+            underlying_token_name = underlying_token.name
 
-            _all_tokens[h_token.identifier] = h_token
-            _all_tokens[underlying_token.identifier] = underlying_token
+        _all_tokens[h_token.identifier] = h_token
+        _all_tokens[underlying_token.identifier] = underlying_token
 
-            if h_token is None or underlying_token is None:
-                continue
+        if h_token is None or underlying_token is None:
+            continue
 
-            # deposit (infinite amount)
-            deposit_price = mm.ratio_tokens_to_underlying * \
-                10**(18-underlying_token.decimals)
+        # deposit (infinite amount)
+        deposit_price = mm.ratio_tokens_to_underlying * \
+            10**(18-underlying_token.decimals)
 
-            deposit_pool = HatomConstantPricePool(deposit_price,
-                                                  underlying_token,
-                                                  h_token,
-                                                  sys.maxsize)
+        deposit_pool = HatomConstantPricePool(deposit_price,
+                                              underlying_token,
+                                              h_token,
+                                              sys.maxsize)
 
-            swap_pools.append(SwapPool(name=f'Hatom: {underlying_token_name} market',
-                                       sc_address=mm.sc_address,
-                                       tokens_in=[underlying_token.identifier],
-                                       tokens_out=[h_token.identifier],
-                                       type=SC_TYPE_HATOM_MONEY_MARKET_MINT))
+        swap_pools.append(SwapPool(name=f'Hatom: {underlying_token_name} market',
+                                   sc_address=mm.sc_address,
+                                   tokens_in=[underlying_token.identifier],
+                                   tokens_out=[h_token.identifier],
+                                   type=SC_TYPE_HATOM_MONEY_MARKET_MINT))
 
-            # redeem
-            redeem_price = mm.ratio_underlying_to_tokens * \
-                10**(18-h_token.decimals)
+        # redeem
+        redeem_price = mm.ratio_underlying_to_tokens * \
+            10**(18-h_token.decimals)
 
-            redeem_pool = HatomConstantPricePool(redeem_price,
-                                                 h_token,
-                                                 underlying_token,
-                                                 mm.cash)
+        redeem_pool = HatomConstantPricePool(redeem_price,
+                                             h_token,
+                                             underlying_token,
+                                             mm.cash)
 
-            swap_pools.append(SwapPool(name=f'Hatom: {underlying_token_name} market',
-                                       sc_address=mm.sc_address,
-                                       tokens_in=[h_token.identifier],
-                                       tokens_out=[
-                                           underlying_token.identifier],
-                                       type=SC_TYPE_HATOM_MONEY_MARKET_REDEEM))
+        swap_pools.append(SwapPool(name=f'Hatom: {underlying_token_name} market',
+                                   sc_address=mm.sc_address,
+                                   tokens_in=[h_token.identifier],
+                                   tokens_out=[
+                                       underlying_token.identifier],
+                                   type=SC_TYPE_HATOM_MONEY_MARKET_REDEEM))
 
-            _all_rates.update(deposit_pool.exchange_rates(
-                sc_address=mm.sc_address))
+        _all_rates.update(deposit_pool.exchange_rates(
+            sc_address=mm.sc_address))
 
-            set_dex_aggregator_pool(mm.sc_address,
-                                    underlying_token.identifier,
-                                    h_token.identifier,
-                                    deposit_pool)
+        _set_dex_aggregator_pool(mm.sc_address,
+                                 underlying_token.identifier,
+                                 h_token.identifier,
+                                 deposit_pool)
 
-            set_dex_aggregator_pool(mm.sc_address,
-                                    h_token.identifier,
-                                    underlying_token.identifier,
-                                    redeem_pool)
+        _set_dex_aggregator_pool(mm.sc_address,
+                                 h_token.identifier,
+                                 underlying_token.identifier,
+                                 redeem_pool)
 
-            nb_mms += 1
+        nb_mms += 1
 
     logging.info(f'Hatom money markets: {nb_mms}')
 
@@ -996,11 +1143,128 @@ async def _sync_other_router_pools() -> List[SwapPool]:
             for token in tokens:
                 _all_tokens[token.identifier] = token
 
+    orderbooks = [p for p in swap_pools
+                  if p.type == SC_TYPE_JEXCHANGE_ORDERBOOK]
+
+    if len(orderbooks) > 0:
+        await _sync_jex_orderbooks(orderbooks)
+
     logging.info('Loading pools from jex-router-pools - done')
 
     return swap_pools
 
 
+async def _sync_jex_orderbooks(swap_pools: List[SwapPool]):
+    logging.info('Loading JEX orderbooks depth')
+
+    hops = [SwapHop(pool=p, token_in=token_in, token_out=token_out)
+            for p in swap_pools
+            for token_in, token_out in product(p.tokens_in, p.tokens_out)
+            if token_in != token_out]
+
+    http_client = gateway_client()
+    semaphore = asyncio.Semaphore(ORDERBOOK_DEPTH_CONCURRENCY)
+
+    async def _sync(hop: SwapHop) -> Optional[JexOrderbookPool]:
+        async with semaphore:
+            return await _sync_jex_orderbook(http_client, hop)
+
+    orderbooks = await asyncio.gather(*[_sync(h) for h in hops])
+
+    nb_orderbooks = 0
+
+    for hop, orderbook in zip(hops, orderbooks):
+        if orderbook is None:
+            logging.info(
+                f'JEX orderbook {hop.pool.sc_address} {hop.token_in}->{hop.token_out}: no depth')
+
+            # routes through the orderbook are evaluated online
+            _delete_dex_aggregator_pool(hop.pool.sc_address,
+                                        hop.token_in,
+                                        hop.token_out)
+            continue
+
+        _all_rates.update(orderbook.exchange_rates(
+            sc_address=hop.pool.sc_address))
+
+        _set_dex_aggregator_pool(hop.pool.sc_address,
+                                 hop.token_in,
+                                 hop.token_out,
+                                 orderbook)
+
+        nb_orderbooks += 1
+
+    logging.info(f'JEX orderbooks: {nb_orderbooks}/{len(hops)}')
+
+    logging.info('Loading JEX orderbooks depth - done')
+
+
+async def _sync_jex_orderbook(http_client: aiohttp.ClientSession,
+                              hop: SwapHop) -> Optional[JexOrderbookPool]:
+    """
+    Sample the depth of an orderbook (one direction) by evaluating
+    increasing amounts with the aggregator SC, until the book is exhausted.
+
+    The depth is sampled again at every sync: any level may have been filled
+    since the previous one.
+    """
+    token_in = _get_or_fetch_token(hop.token_in)
+    token_out = _get_or_fetch_token(hop.token_out)
+
+    route = SwapRoute(hops=[hop],
+                      token_in=hop.token_in,
+                      token_out=hop.token_out)
+
+    amount = max(1, 10**token_in.decimals // ORDERBOOK_DEPTH_FIRST_AMOUNT_DIVISOR)
+
+    amounts_in = [0]
+    amounts_out = [0]
+
+    for _ in range(ORDERBOOK_DEPTH_NB_POINTS):
+        point = await _sample_jex_orderbook(http_client, route, amount)
+
+        if point is None:
+            break
+
+        amount_in, amount_out = point
+
+        if amount_in <= amounts_in[-1] or amount_out <= amounts_out[-1]:
+            break
+
+        amounts_in.append(amount_in)
+        amounts_out.append(amount_out)
+
+        amount *= ORDERBOOK_DEPTH_STEP
+
+    if len(amounts_in) < 2:
+        return None
+
+    return JexOrderbookPool(token_in=token_in,
+                            token_out=token_out,
+                            amounts_in=amounts_in,
+                            amounts_out=amounts_out)
+
+
+async def _sample_jex_orderbook(http_client: aiohttp.ClientSession,
+                                route: SwapRoute,
+                                amount: int) -> Optional[Tuple[int, int]]:
+    """
+    :return: amounts in and out of the orderbook for +amount+, without the
+    aggregator fee (None if the amount can not be swapped)
+    """
+    evaluation = await evaluate_fixed_input_online(amount,
+                                                   route,
+                                                   http_client)
+
+    if evaluation is None:
+        return None
+
+    if evaluation.fee_token == route.token_in:
+        return amount - evaluation.fee_amount, evaluation.net_amount_out
+
+    return amount, evaluation.net_amount_out + evaluation.fee_amount
+
+
 async def _sync_opendex_pools() -> List[SwapPool]:
     logging.info('Loading pools from opendex instances')
 
@@ -1033,30 +1297,30 @@ async def _sync_opendex_pools_from_deployer(deployer_sc_address: str) -> List[Sw
 
     op_pairs: List[OpendexPair] = []
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
+    http_client = gateway_client()
 
-        from_ = 0
-        size = 100
-        done = False
+    from_ = 0
+    size = 100
+    done = False
 
-        while not done:
-            res = await async_sc_query(http_client,
-                                       deployer_sc_address,
-                                       function='getPairs',
-                                       args=[from_, size])
+    while not done:
+        res = await async_sc_query(http_client,
+                                   deployer_sc_address,
+                                   function='getPairs',
+                                   args=[from_, size])
 
-            if res is None:
-                logging.error(
-                    f'Error fetching Opendex pools ({deployer_sc_address})')
-                done = True
-                break
+        if res is None:
+            logging.error(
+                f'Error fetching Opendex pools ({deployer_sc_address})')
+            done = True
+            break
 
-            opendex_pairs = [parse_opendex_pool(x) for x in res]
+        opendex_pairs = [parse_opendex_pool(x) for x in res]
 
-            op_pairs.extend(opendex_pairs)
+        op_pairs.extend(opendex_pairs)
 
-            if len(opendex_pairs) < size:
-                done = True
+        if len(opendex_pairs) < size:
+            done = True
 
     logging.info(f'Opendex: pairs before filter {len(op_pairs)}')
 
@@ -1114,9 +1378,9 @@ async def _sync_opendex_pools_from_deployer(deployer_sc_address: str) -> List[Sw
                                    tokens_out=token_ids,
                                    type=SC_TYPE_OPENDEX_LP))
 
-        set_dex_aggregator_pool(
+        _set_dex_aggregator_pool(
             pair.sc_address, first_token.identifier, second_token.identifier, pool)
-        set_dex_aggregator_pool(
+        _set_dex_aggregator_pool(
             pair.sc_address, second_token.identifier, first_token.identifier, pool)
 
     return swap_pools
@@ -1146,59 +1410,59 @@ async def _sync_xoxno_liquid_staking_pool(sc_address: str,
 
     swap_pools = []
 
-    async with aiohttp.ClientSession(mvx_gateway_url()) as http_client:
-        res = await async_sc_query(http_client=http_client,
-                                   sc_address=sc_address,
-                                   function='getExchangeRate')
-
-        if res is None:
-            logging.error(f'Error fetching Xoxno liquid staking info (rate)')
-
-        rate = hex2dec(res[0])
-
-        if main_token_id is None:
-            res = await async_sc_query(http_client=http_client,
-                                       sc_address=sc_address,
-                                       function='getMainToken')
+    http_client = gateway_client()
+    res = await async_sc_query(http_client=http_client,
+                               sc_address=sc_address,
+                               function='getExchangeRate')
 
-            if res is None:
-                logging.error(
-                    f'Error fetching Xoxno liquid staking info (main token)')
+    if res is None:
+        logging.error(f'Error fetching Xoxno liquid staking info (rate)')
 
-            main_token_id = hex2str(res[0])
+    rate = hex2dec(res[0])
 
+    if main_token_id is None:
         res = await async_sc_query(http_client=http_client,
                                    sc_address=sc_address,
-                                   function='getLsTokenId')
+                                   function='getMainToken')
 
         if res is None:
             logging.error(
-                f'Error fetching Xoxno liquid staking info (LS token ID)')
+                f'Error fetching Xoxno liquid staking info (main token)')
 
-        ls_token_id = hex2str(res[0])
+        main_token_id = hex2str(res[0])
 
-        token_in = _get_or_fetch_token(main_token_id)
-        token_out = _get_or_fetch_token(ls_token_id)
+    res = await async_sc_query(http_client=http_client,
+                               sc_address=sc_address,
+                               function='getLsTokenId')
 
-        _all_tokens[token_in.identifier] = token_in
-        _all_tokens[token_out.identifier] = token_out
-        pool = XoxnoConstantPricePool(price=rate,
-                                      token_in=token_in,
-                                      token_out=token_out,
-                                      token_out_reserve=99999999999*10**token_out.decimals)
+    if res is None:
+        logging.error(
+            f'Error fetching Xoxno liquid staking info (LS token ID)')
 
-        swap_pools.append(SwapPool(name=f'Xoxno (stake)',
-                                   sc_address=sc_address,
-                                   tokens_in=[main_token_id],
-                                   tokens_out=[ls_token_id],
-                                   type=SC_TYPE_XOXNO_STAKE))
+    ls_token_id = hex2str(res[0])
 
-        _all_rates.update(pool.exchange_rates(sc_address=sc_address))
+    token_in = _get_or_fetch_token(main_token_id)
+    token_out = _get_or_fetch_token(ls_token_id)
+
+    _all_tokens[token_in.identifier] = token_in
+    _all_tokens[token_out.identifier] = token_out
+    pool = XoxnoConstantPricePool(price=rate,
+                                  token_in=token_in,
+                                  token_out=token_out,
+                                  token_out_reserve=99999999999*10**token_out.decimals)
+
+    swap_pools.append(SwapPool(name=f'Xoxno (stake)',
+                               sc_address=sc_address,
+                               tokens_in=[main_token_id],
+                               tokens_out=[ls_token_id],
+                               type=SC_TYPE_XOXNO_STAKE))
+
+    _all_rates.update(pool.exchange_rates(sc_address=sc_address))
 
-        set_dex_aggregator_pool(sc_address,
-                                token_in.identifier,
-                                token_out.identifier,
-                                pool)
+    _set_dex_aggregator_pool(sc_address,
+                             token_in.identifier,
+                             token_out.identifier,
+                             pool)
 
     return swap_pools
 
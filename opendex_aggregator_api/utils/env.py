@@ -63,3 +63,15 @@ def sc_address_xoxno_liquid_staking_egld():
 
 def sc_address_xoxno_liquid_staking_xoxno():
     return os.environ.get('SC_ADDRESS_XOXNO_LIQUID_STAKING_XOXNO', '')
+
+
+def evaluation_processes() -> int:
+    return int(os.environ.get('EVALUATION_PROCESSES', 0))
+
+
+def gateway_max_connections() -> int:
+    return int(os.environ.get('GATEWAY_MAX_CONNECTIONS', 100))
+
+
+def gateway_timeout() -> float:
+    return float(os.environ.get('GATEWAY_TIMEOUT', 10))
@@ -1,2 +1,19 @@
+import bisect
+from typing import List
+
+
 def ceildiv(a, b):
     return -(a // -b)
+
+
+def interpolate(xs: List[int], ys: List[int], x: int) -> int:
+    """
+    Linear interpolation (rounded down) of the points (+xs+, +ys+), +xs+
+    being increasing and +x+ between its bounds.
+    """
+    i = bisect.bisect_left(xs, x)
+
+    if xs[i] == x:
+        return ys[i]
+
+    return ys[i - 1] + ((x - xs[i - 1]) * (ys[i] - ys[i - 1])) // (xs[i] - xs[i - 1])
@@ -3,7 +3,7 @@ import json
 import logging
 import os
 from datetime import timedelta
-from typing import Any, Callable, Optional
+from typing import Any, Callable, List, Mapping, Optional
 
 from fastapi.encoders import jsonable_encoder
 from redis import Redis
@@ -27,6 +27,21 @@ def redis_get(raw_key: str,
     return default
 
 
+def redis_mget(raw_keys: List[str],
+               parse: Callable[[dict], Any],
+               default: Any = None) -> List[Any]:
+    """
+    Get many keys in a single round-trip.
+    """
+    if len(raw_keys) == 0:
+        return []
+
+    fmt_keys = [_format_cache_key(k) for k in raw_keys]
+
+    return [parse(json.loads(cached)) if cached else default
+            for cached in REDIS.mget(fmt_keys)]
+
+
 def redis_set(raw_key: str,
               obj: Any,
               cache_ttl: timedelta):
@@ -39,6 +54,85 @@ def redis_set(raw_key: str,
                 serialized)
 
 
+def redis_delete(raw_key: str):
+    REDIS.delete(_format_cache_key(raw_key))
+
+
+def redis_hget(raw_key: str,
+               field: str,
+               parse: Callable[[dict], Any],
+               default: Any = None) -> Any:
+    fmt_key = _format_cache_key(raw_key)
+
+    cached = REDIS.hget(fmt_key, field)
+    if cached:
+        json_ = json.loads(cached)
+        return parse(json_)
+
+    return default
+
+
+def redis_hmget(raw_key: str,
+                fields: List[str],
+                parse: Callable[[dict], Any],
+                default: Any = None) -> List[Any]:
+    """
+    Get many fields of a hash in a single round-trip.
+    """
+    if len(fields) == 0:
+        return []
+
+    fmt_key = _format_cache_key(raw_key)
+
+    return [parse(json.loads(cached)) if cached else default
+            for cached in REDIS.hmget(fmt_key, fields)]
+
+
+def redis_hkeys(raw_key: str) -> List[str]:
+    fmt_key = _format_cache_key(raw_key)
+
+    return [x.decode() for x in REDIS.hkeys(fmt_key)]
+
+
+def redis_hset_many(raw_key: str,
+                    objs: Mapping[str, Any],
+                    cache_ttl: timedelta):
+    fmt_key = _format_cache_key(raw_key)
+
+    pipeline = REDIS.pipeline()
+
+    if len(objs) > 0:
+        pipeline.hset(fmt_key,
+                      mapping={k: json.dumps(jsonable_encoder(v))
+                               for k, v in objs.items()})
+    pipeline.expire(fmt_key, cache_ttl)
+    pipeline.execute()
+
+
+def redis_zincrby_many(raw_key: str,
+                       increments: Mapping[str, int],
+                       cache_ttl: timedelta):
+    fmt_key = _format_cache_key(raw_key)
+
+    pipeline = REDIS.pipeline()
+    for member, increment in increments.items():
+        pipeline.zincrby(fmt_key, increment, member)
+    pipeline.expire(fmt_key, cache_ttl)
+    pipeline.execute()
+
+
+def redis_zscores_many(raw_keys: List[str]) -> List[Mapping[str, float]]:
+    """
+    Get the members and scores of many sorted sets in a single round-trip.
+    """
+    pipeline = REDIS.pipeline()
+    for raw_key in raw_keys:
+        pipeline.zrange(_format_cache_key(raw_key), 0, -1, withscores=True)
+
+    return [{member.decode(): score for member, score in members}
+            for members in pipeline.execute()]
+
+
 def redis_get_or_set_cache(raw_key: str,
                            cache_ttl: timedelta,
                            task: Callable[[], Any],